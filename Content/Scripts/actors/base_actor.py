@@ -1,4 +1,5 @@
 import unreal_engine as ue
+from tools.actor_pool import bind_event
 from tools.utils import as_dict
 
 
@@ -37,11 +38,14 @@ class BaseActor():
         self.set_rotation(self.rotation)
         self.hidden = False
 
-        # manage OnActorBeginOverlap events
+        # manage OnActorBeginOverlap events, the actors reused from the
+        # pool only report to their current wrapper (see
+        # tools.actor_pool)
         if self.warning and self.overlap:
-            self.actor.bind_event('OnActorBeginOverlap', self.on_actor_overlap)
+            bind_event(
+                self.actor, 'OnActorBeginOverlap', self.on_actor_overlap)
         if self.warning and not self.overlap:
-            self.actor.bind_event('OnActorHit', self.on_actor_hit)
+            bind_event(self.actor, 'OnActorHit', self.on_actor_hit)
 
     def get_actor(self):
         # this getter is important : in the recursive instance, it's
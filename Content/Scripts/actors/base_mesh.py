@@ -1,9 +1,9 @@
 # coding: utf-8
 
-import unreal_engine as ue
 from unreal_engine.classes import Material, StaticMesh, Friction
 
 from actors.base_actor import BaseActor
+from tools.assets import find_class, load_object
 from tools.utils import as_dict
 
 
@@ -79,31 +79,34 @@ class BaseMesh(BaseActor):
     set_mesh sets the mesh, enable collision, set the material and the scale
     """
     def set_mesh(self):
-        self.mesh = self.get_actor().get_actor_component_by_type(
-            ue.find_class('StaticMeshComponent'))
+        self.mesh = self.get_mesh()
 
         # # enable collisions
         # self.mesh.call('SetCollisionProfileName BlockAll')
         # self.actor.SetActorEnableCollision(True)
 
         # setup mesh and material
-        self.mesh.SetStaticMesh(ue.load_object(StaticMesh, self.mesh_str))
+        self.mesh.SetStaticMesh(load_object(StaticMesh, self.mesh_str))
         self.mesh.set_material(0, self.material)
         self.actor.set_actor_scale(self.scale)
 
     def get_mesh(self):
-        return self.get_actor().get_actor_component_by_type(
-            ue.find_class('StaticMeshComponent'))
+        # the component is looked up once, get_mesh is called at each
+        # tick by the moving actors
+        if getattr(self, 'mesh', None) is None:
+            self.mesh = self.get_actor().get_actor_component_by_type(
+                find_class('StaticMeshComponent'))
+        return self.mesh
 
     """
     set_mesh_str change the current mesh by another
     """
     def set_mesh_str(self, mesh_str):
         self.mesh_str = mesh_str
-        self.mesh.SetStaticMesh(ue.load_object(StaticMesh, self.mesh_str))
+        self.mesh.SetStaticMesh(load_object(StaticMesh, self.mesh_str))
 
     def set_material(self, material_str):
-        self.material = ue.load_object(Material, material_str)
+        self.material = load_object(Material, material_str)
         self.mesh.set_material(0, self.material)
 
     def set_scale(self, scale):
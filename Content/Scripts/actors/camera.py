@@ -1,4 +1,3 @@
-import unreal_engine as ue
 from unreal_engine import FVector, FRotator
 from unreal_engine.classes import CameraComponent
 from unreal_engine.enums import ECameraProjectionMode
@@ -6,6 +5,7 @@ from unreal_engine.classes import GameplayStatics
 
 from actors.base_actor import BaseActor
 from actors.parameters import CameraParams
+from tools.assets import load_class
 
 
 class Camera(BaseActor):
@@ -27,7 +27,7 @@ class Camera(BaseActor):
     def __init__(self, world=None, params=CameraParams()):
         if world is not None:
             super().__init__(world.actor_spawn(
-                ue.load_class('/Game/Camera.Camera_C')))
+                load_class('/Game/Camera.Camera_C')))
 
             self.get_parameters(params)
             self.set_parameters(world)
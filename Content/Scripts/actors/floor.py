@@ -1,11 +1,12 @@
 # coding: utf-8
 
-import unreal_engine as ue
 from unreal_engine import FVector, FRotator
 from unreal_engine.classes import Material
 
 from actors.base_mesh import BaseMesh
 from actors.parameters import FloorParams
+from tools.actor_pool import spawn_actor
+from tools.assets import load_object
 
 # Ok here we go: This is a recursive instantiate class.  The general
 # principle is to instantiate a class twice to avoid making two
@@ -59,7 +60,7 @@ class Floor(BaseMesh):
     def __init__(self, world=None, params=FloorParams()):
         if world is not None:
             super().__init__(
-                world.actor_spawn(ue.load_class('/Game/Floor.Floor_C')))
+                spawn_actor(world, '/Game/Floor.Floor_C'))
             self.get_parameters(params)
             self.set_parameters()
         else:
@@ -76,7 +77,7 @@ class Floor(BaseMesh):
             params.friction, params.restitution, False, False,
             '/Game/Meshes/Floor_400x400')
 
-        self.material = ue.load_object(Material, params.material)
+        self.material = load_object(Material, params.material)
 
     def set_parameters(self):
         super().set_parameters()
@@ -4,6 +4,7 @@ import unreal_engine as ue
 
 from actors.base_actor import BaseActor
 from actors.parameters import LightParams
+from tools.actor_pool import spawn_actor
 
 
 class Light(BaseActor):
@@ -30,7 +31,7 @@ class Light(BaseActor):
 
         if world is not None:
             super().__init__(
-                world.actor_spawn(ue.load_class(types[params.type])))
+                spawn_actor(world, types[params.type]))
 
             # the position does not affect sky light
             if params.type != 'SkyLight':
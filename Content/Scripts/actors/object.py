@@ -1,10 +1,11 @@
 # coding: utf-8
 
-import unreal_engine as ue
 from unreal_engine.classes import Material
 
 from actors.base_mesh import BaseMesh
 from actors.parameters import ObjectParams
+from tools.actor_pool import spawn_actor
+from tools.assets import load_object
 from tools.utils import as_dict
 
 
@@ -61,7 +62,7 @@ class Object(BaseMesh):
     def __init__(self, world=None, params=ObjectParams()):
         if world is not None:
             super().__init__(
-                world.actor_spawn(ue.load_class('/Game/Object.Object_C')))
+                spawn_actor(world, '/Game/Object.Object_C'))
             self.get_parameters(params)
             self.set_parameters()
         else:
@@ -85,7 +86,7 @@ class Object(BaseMesh):
             False, True,
             self.shape[params.mesh])
 
-        self.material = ue.load_object(Material, params.material)
+        self.material = load_object(Material, params.material)
         self.mass = params.mass
         self.force = params.force
 
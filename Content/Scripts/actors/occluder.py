@@ -1,9 +1,10 @@
 # coding: utf-8
 
-import unreal_engine as ue
 from unreal_engine.classes import Material
 from actors.base_mesh import BaseMesh
 from actors.parameters import OccluderParams
+from tools.actor_pool import spawn_actor
+from tools.assets import load_object
 
 
 """
@@ -54,7 +55,7 @@ class Occluder(BaseMesh):
     def __init__(self, world=None, params=OccluderParams()):
         if world is not None:
             super().__init__(
-                world.actor_spawn(ue.load_class('/Game/Occluder.Occluder_C')))
+                spawn_actor(world, '/Game/Occluder.Occluder_C'))
             self.get_parameters(params)
             self.set_parameters()
         else:
@@ -69,7 +70,7 @@ class Occluder(BaseMesh):
             params.restitution,
             False, True,
             '/Game/Meshes/OccluderWall')
-        self.material = ue.load_object(Material, params.material)
+        self.material = load_object(Material, params.material)
         self.speed = params.speed
         self.moves = params.moves
 
@@ -1,9 +1,10 @@
 # coding: utf-8
 
-import unreal_engine as ue
 from unreal_engine import FVector, FRotator
 from unreal_engine.classes import Material
 from actors.base_mesh import BaseMesh
+from tools.actor_pool import spawn_actor
+from tools.assets import load_object
 
 """
 Ok here we go:
@@ -67,7 +68,7 @@ class Wall(BaseMesh):
             'Right': self.right
         }
         if (world is not None):
-            super().__init__(world.actor_spawn(ue.load_class('/Game/Wall.Wall_C')))
+            super().__init__(spawn_actor(world, '/Game/Wall.Wall_C'))
             self.get_parameters(side, length, depth,
                                 height, material, overlap, warning)
             self.set_parameters()
@@ -85,7 +86,7 @@ class Wall(BaseMesh):
         super().get_parameters(self.location, self.rotation, self.scale,
                                0.5, 0.5, overlap, warning,
                                '/Game/Meshes/Wall_400x400')
-        self.material = ue.load_object(Material, material)
+        self.material = load_object(Material, material)
 
     def set_parameters(self):
         super().set_parameters()
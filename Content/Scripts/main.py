@@ -1,9 +1,15 @@
+import json
 import os
 import random
 import unreal_engine as ue
 
+from tools.dataset import NIMAGES, get_capture_options
 from tools.director import Director
-from tools.utils import parse_scenes_json, exit_ue, set_game_resolution
+from tools.scene_queue import SceneList, SceneQueue
+from tools.scenes_json import load_scenes_json
+from tools.server import SceneServer
+from tools.telemetry import Telemetry
+from tools.utils import exit_ue, set_game_resolution
 
 # the default game resolution, for both scene rendering and saved
 # images (width * height in pixels)
@@ -19,18 +25,29 @@ class Main:
         # all other actors are paused)
         self.uobject.SetTickableWhenPaused(True)
 
+        # in daemon mode, wait for batches of scenes on a local socket
+        try:
+            server = SceneServer(os.environ['INTPHYS_SOCKET'])
+        except KeyError:
+            server = None
+
         # load the specifications of scenes we are going to generate
+        # (optional in daemon mode)
         try:
             scenes_json = os.environ['INTPHYS_SCENES']
         except KeyError:
-            exit_ue(world, 'fatal error, INTPHYS_SCENES not defined, exiting')
+            scenes_json = None
+            if server is None:
+                exit_ue(
+                    world, 'fatal error, INTPHYS_SCENES not defined, exiting')
 
-        # init random number generator
+        # init the random seed, each scene has its own random number
+        # generator derived from it
         try:
             seed = os.environ['INTPHYS_SEED']
         except KeyError:
-            seed = None
-        random.seed(seed)
+            seed = str(random.SystemRandom().randrange(2**32))
+            ue.log(f'INTPHYS_SEED not defined, using seed {seed}')
 
         # setup screen resolution
         try:
@@ -47,11 +64,42 @@ class Main:
             output_dir = None
             ue.log_warning('INTPHYS_OUTPUTDIR not defined, capture disabled')
 
+        # the scenes are pulled from a queue shared with other game
+        # instances if INTPHYS_QUEUE is defined, else they are read
+        # from the scenes JSON file, optionally restricted to the
+        # subset of scenes listed in INTPHYS_SUBSET
+        try:
+            scenes = SceneQueue(os.environ['INTPHYS_QUEUE'])
+        except KeyError:
+            try:
+                subset = json.load(open(os.environ['INTPHYS_SUBSET'], 'r'))
+            except KeyError:
+                subset = None
+            scenes = SceneList(
+                [] if scenes_json is None else load_scenes_json(scenes_json),
+                subset)
+
+        # the options of the capture are given as a JSON dict in
+        # INTPHYS_CAPTURE, if defined
+        try:
+            capture = get_capture_options(
+                json.loads(os.environ.get('INTPHYS_CAPTURE', '{}')))
+        except ValueError as err:
+            exit_ue(world, f'fatal error, invalid INTPHYS_CAPTURE: {err}')
+            capture = get_capture_options()
+
+        # report the rendering progress to INTPHYS_TELEMETRY, if defined
+        telemetry = Telemetry(os.environ.get('INTPHYS_TELEMETRY'))
+
         # setup the director with the list of scenes to generate, 100
-        # images per video at the game resolution
-        scenes = parse_scenes_json(world, scenes_json)
-        size = (resolution[0], resolution[1], 100)
-        self.director = Director(world, scenes, size, output_dir)
+        # images per video at the game resolution, a capture every
+        # 'substeps' game ticks
+        size = (resolution[0], resolution[1], NIMAGES)
+        self.director = Director(
+            world, scenes, size, seed, output_dir,
+            tick_interval=capture['substeps'],
+            resume='INTPHYS_RESUME' in os.environ, server=server,
+            telemetry=telemetry, capture=capture)
 
     def tick(self, dt):
         # delegate ticking to the director
@@ -1,5 +1,3 @@
-import random
-
 from unreal_engine import FVector, FRotator
 
 from scenario import base_scenario
@@ -14,25 +12,25 @@ class O1Base(object):
 
 
 class O1Train(O1Base, base_scenario.BaseTrain):
-    def random_location(self, index, side=None):
+    def random_location(self, index, rng, side=None):
         if side is None:
-            side = 'left' if random.random() < 0.5 else 'right'
+            side = 'left' if rng.random() < 0.5 else 'right'
 
         return FVector(
             550 + 150 * float(index - 1),
             -500 if side == 'left' else 500,
-            70 + 200 * random.random())
+            70 + 200 * rng.random())
 
-    def generate_parameters(self):
-        params = super().generate_parameters()
+    def generate_parameters(self, rng):
+        params = super().generate_parameters(rng)
 
-        nobjects = 1  # random.randint(1, 3)
+        nobjects = 1  # rng.randint(1, 3)
         for n in range(1, nobjects + 1):
-            scale = 1.5 + random.random()
+            scale = 1.5 + rng.random()
             params[f'object_{n}'] = ObjectParams(
                 mesh='Sphere',
-                material=get_random_material('Object'),
-                location=FVector(2000, 0, 0),  # self.random_location(n),
+                material=get_random_material('Object', rng),
+                location=FVector(2000, 0, 0),  # self.random_location(n, rng),
                 rotation=FRotator(0, 0, 0),
                 scale=FVector(scale, scale, scale),
                 mass=100)
@@ -46,25 +44,25 @@ class O1TestStatic(O1Base, base_scenario.BaseTest):
     def get_nchecks(self):
         return 1 if self.is_occluded else 0
 
-    def generate_parameters(self):
-        params = super().generate_parameters()
+    def generate_parameters(self, rng):
+        params = super().generate_parameters(rng)
 
         locations = [FVector(1000, 500 * y, 0) for y in (-1, 0, 1)]
-        random.shuffle(locations)
+        rng.shuffle(locations)
 
-        nobjects = random.randint(1, 3)
+        nobjects = rng.randint(1, 3)
         for n in range(nobjects):
             # scale in [1, 1.5]
-            scale = 1 + random.random() * 0.5
+            scale = 1 + rng.random() * 0.5
 
             # full random rotation (does not matter on spheres, except
             # for texture variations)
             rotation = FRotator(
-                360*random.random(), 360*random.random(), 360*random.random())
+                360*rng.random(), 360*rng.random(), 360*rng.random())
 
             params[f'object_{n+1}'] = ObjectParams(
                 mesh='Sphere',
-                material=get_random_material('Object'),
+                material=get_random_material('Object', rng),
                 location=locations[n],
                 rotation=rotation,
                 scale=FVector(scale, scale, scale),
@@ -72,7 +70,7 @@ class O1TestStatic(O1Base, base_scenario.BaseTest):
 
         if self.is_occluded:
             params['occluder'] = OccluderParams(
-                material=get_random_material('Wall'),
+                material=get_random_material('Wall', rng),
                 location=FVector(400, -500, 0),
                 rotation=FRotator(0, 0, 90),
                 scale=FVector(1, 1, 1),
@@ -80,8 +78,8 @@ class O1TestStatic(O1Base, base_scenario.BaseTest):
                 speed=1)
 
         params['magic'] = {
-            'actor': f'object_{random.randint(1, nobjects)}',
-            'tick': random.randint(10, 90)}
+            'actor': f'object_{rng.randint(1, nobjects)}',
+            'tick': rng.randint(10, 90)}
 
         return params
 
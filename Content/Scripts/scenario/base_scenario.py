@@ -1,5 +1,4 @@
 import abc
-import random
 
 from unreal_engine import FVector, FRotator
 
@@ -54,18 +53,19 @@ class Base(object):
 
         return status
 
-    def generate_parameters(self):
+    def generate_parameters(self, rng):
         """Return a the common paramaters for all the scenarios
 
         This method should be specialized in child classes. At the
         base level only the floor, background walls and lights are
-        considered.
+        considered. All the random parameters are drawn from `rng`,
+        an instance of random.Random.
 
         """
         params = {}
 
         params['floor'] = FloorParams(
-            material=get_random_material('Floor'))
+            material=get_random_material('Floor', rng))
 
         params['light'] = LightParams(
             type='SkyLight',
@@ -74,12 +74,12 @@ class Base(object):
 
         # the probability to have background walls
         prob_walls = 1
-        if random.uniform(0, 1) <= prob_walls:
+        if rng.uniform(0, 1) <= prob_walls:
             params['walls'] = WallsParams(
-                material=get_random_material('Wall'),
-                height=random.uniform(1, 10),
-                length=random.uniform(2000, 5000),
-                depth=random.uniform(1500, 5000))
+                material=get_random_material('Wall', rng),
+                height=rng.uniform(1, 10),
+                length=rng.uniform(2000, 5000),
+                depth=rng.uniform(1500, 5000))
 
         return params
 
@@ -0,0 +1,123 @@
+"""Reuse the Unreal Engine actors from a scene to the next one
+
+Spawning an actor instantiates its Python component twice (see
+actors/base_mesh.py) and destroying it leaves garbage to the engine,
+for each actor of each scene. Instead, the actors of a cleared scene
+are released to a pool where they wait hidden, without collision nor
+physics, far below the floor. The next scenes take them back from the
+pool before spawning new ones, their Python wrapper then
+parameterizes them as new actors (mesh, material, scale, location,
+physics).
+
+The pool is shared by all the scenes rendered in the game's world.
+
+"""
+
+from unreal_engine import FVector
+
+from tools.assets import find_class, load_class
+
+
+# where the released actors wait, out of the view
+PARK_LOCATION = FVector(0, 0, -100000)
+
+# the released actors, class path -> list of actors
+_FREE_ACTORS = {}
+
+# the class path of the actors spawned by the pool, actor name -> path
+_ACTORS_CLASS = {}
+
+# the events already bound, as (actor name, event)
+_BOUND_EVENTS = set()
+
+# the handlers of the bound events for the current wrapper of the
+# actors, actor name -> event -> handler
+_HANDLERS = {}
+
+# the number of actors spawned and reused since the game's start
+_STATS = {'spawned': 0, 'reused': 0}
+
+
+def spawn_actor(world, class_path):
+    """Return an actor of the class `class_path`, reused if possible
+
+    The actor is taken from the pool, visible and with collision
+    enabled, or spawned in `world` if no such actor is free.
+
+    """
+    free = _FREE_ACTORS.get(class_path)
+    if free:
+        actor = free.pop()
+        actor.SetActorHiddenInGame(False)
+        actor.SetActorEnableCollision(True)
+        _STATS['reused'] += 1
+        return actor
+
+    actor = world.actor_spawn(load_class(class_path))
+    _ACTORS_CLASS[actor.get_name()] = class_path
+    _STATS['spawned'] += 1
+    return actor
+
+
+def release_actor(actor):
+    """Give back an `actor` to the pool
+
+    The actor is stopped, hidden and parked at PARK_LOCATION, its
+    event handlers are unset (see bind_event). The actors not spawned
+    by the pool are destroyed.
+
+    """
+    name = actor.get_name()
+    _HANDLERS.pop(name, None)
+
+    class_path = _ACTORS_CLASS.get(name)
+    if class_path is None:
+        # the name of a destroyed actor can be given to a new one
+        for key in [k for k in _BOUND_EVENTS if k[0] == name]:
+            _BOUND_EVENTS.discard(key)
+        actor.actor_destroy()
+        return
+
+    # stop the physics and restore the default mass scale, so that
+    # the actor is parameterized as a new one
+    mesh = actor.get_actor_component_by_type(
+        find_class('StaticMeshComponent'))
+    if mesh is not None:
+        if mesh.IsSimulatingPhysics():
+            mesh.SetPhysicsLinearVelocity(FVector(0, 0, 0))
+            mesh.SetPhysicsAngularVelocity(FVector(0, 0, 0))
+            mesh.set_simulate_physics(False)
+        mesh.SetMassScale(BoneName='None', InMassScale=1.0)
+
+    actor.SetActorHiddenInGame(True)
+    actor.SetActorEnableCollision(False)
+    actor.set_actor_location(PARK_LOCATION, False)
+    _FREE_ACTORS.setdefault(class_path, []).append(actor)
+
+
+def bind_event(actor, event, handler):
+    """Bind the `handler` to the `event` of `actor`
+
+    The event is bound once per actor to a dispatcher calling the
+    handler set by the current wrapper of the actor, so that a reused
+    actor does not call the handlers of its previous wrappers. The
+    handlers are unset when the actor is released.
+
+    """
+    name = actor.get_name()
+    _HANDLERS.setdefault(name, {})[event] = handler
+
+    if (name, event) not in _BOUND_EVENTS:
+        def dispatch(*args):
+            handler = _HANDLERS.get(name, {}).get(event)
+            if handler is not None:
+                handler(*args)
+
+        actor.bind_event(event, dispatch)
+        _BOUND_EVENTS.add((name, event))
+
+
+def get_pool_stats():
+    """Return the number of actors 'spawned', 'reused' and 'free'"""
+    return dict(
+        _STATS, free=sum(len(actors) for actors in _FREE_ACTORS.values()))
@@ -0,0 +1,79 @@
+"""Cache the Unreal Engine classes and assets loaded by the actors
+
+The actors load the same dozen classes, meshes and materials for each
+scene, and look up their classes by name. Those lookups go through
+this module which keeps the loaded objects by path, so that each one
+is resolved once per game. An object collected by the engine since it
+was cached is loaded again.
+
+The hits and misses of the cache are counted (see get_cache_stats).
+
+The materials and meshes can be loaded at the game's start, their
+textures being streamed in once for all (see warm_up), so that the
+runs do not wait for them (see is_streaming_done).
+
+"""
+
+import unreal_engine as ue
+from unreal_engine.classes import AssetsStreaming, Material, StaticMesh
+
+
+# the loaded objects, (kind, path) -> object
+_CACHE = {}
+
+# the number of lookups served from the cache or loaded
+_STATS = {'hits': 0, 'misses': 0}
+
+
+def _cached(key, load):
+    value = _CACHE.get(key)
+    if value is not None and value.is_valid():
+        _STATS['hits'] += 1
+        return value
+
+    _STATS['misses'] += 1
+    value = load()
+    if value is not None:
+        _CACHE[key] = value
+    return value
+
+
+def load_class(path):
+    """Return the class at `path`, as ue.load_class"""
+    return _cached(('class', path), lambda: ue.load_class(path))
+
+
+def find_class(name):
+    """Return the class named `name`, as ue.find_class"""
+    return _cached(('class_name', name), lambda: ue.find_class(name))
+
+
+def load_object(cls, path):
+    """Return the object of class `cls` at `path`, as ue.load_object"""
+    return _cached(
+        (cls.get_name(), path), lambda: ue.load_object(cls, path))
+
+
+def get_cache_stats():
+    """Return the number of cache 'hits' and 'misses', and its 'size'"""
+    return dict(_STATS, size=len(_CACHE))
+
+
+def warm_up(materials, meshes, timeout=10):
+    """Load the `materials` and `meshes` and stream their textures in
+
+    The textures of the materials are forced to stay resident. Wait
+    at most `timeout` seconds for the streaming, return True if all
+    the resources are streamed in.
+
+    """
+    for mesh in meshes:
+        load_object(StaticMesh, mesh)
+    return AssetsStreaming.WarmUp(
+        [load_object(Material, material) for material in materials],
+        timeout)
+
+
+def is_streaming_done():
+    """Return True if no resource is waiting to be streamed in"""
+    return AssetsStreaming.GetNumPendingResources() == 0
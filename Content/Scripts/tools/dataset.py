@@ -0,0 +1,431 @@
+"""Layout of the generated data on disk
+
+A dataset is a directory with one subdirectory per scene, named
+after the scene's global index, type and scenario (for exemple
+'027_test_O1' or '028_train_O1'). Train scenes are a single run,
+test scenes have a subdirectory per run (1, 2, 3 and 4). A run is made
+of the 'scene', 'depth' and 'masks' images subdirectories and a
+'status.json' file (or 'status.jsonl', see tools.status), written
+last. With the 'pack' format, a run is
+a single 'run.pack' file instead (see tools.runfile). With a raw
+depth format, the depth images are saved as floats in a 'depth.npy'
+file (or in the 'run.pack' file), see load_depth. With an indexed
+masks format, the masks pixels are the global ids of the actors (see
+get_mask_id and load_masks).
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game.
+
+"""
+
+import os
+
+from tools.runfile import PACK_FILENAME, RunFile, decode_rle
+from tools.status import (
+    STATUS_FILENAMES, STATUS_FORMATS, decode_status, get_columns)
+
+
+# the images subdirectories of a run
+STREAMS = ('scene', 'depth', 'masks')
+
+# the number of images captured in a run
+NIMAGES = 100
+
+# the zlib compression levels of the PNG images by name, from 0 (no
+# compression) to 9 (smallest files)
+PNG_COMPRESSION = {'fast': 1, 'default': 6, 'best': 9}
+
+# the formats of a saved run: PNG images and a JSON status, or a single
+# packed file
+FORMATS = ('png', 'pack')
+
+# the formats of the depth images: 8 bits PNG normalized by the max
+# depth of the run, or raw floats in half or single precision
+DEPTH_FORMATS = ('png', 'float16', 'float32')
+
+# the name of the raw depth file of a run in the 'png' format
+DEPTH_FILENAME = 'depth.npy'
+
+# the formats of the masks images: gray levels spread over [0, 255] in
+# each run, or the global ids of the actors, as 8 bits images or
+# run-length encoded
+MASKS_FORMATS = ('gray', 'indexed', 'rle')
+
+# the ids of the actors in the indexed masks, the same in all the runs
+# of all the scenes. The occluders and objects are numbered from 1 in
+# the scenes ('occluder_1', 'object_2', ...) and their ids are taken
+# from a range ([start, stop)) with their number as offset.
+MASKS_IDS = {'sky': 0, 'floor': 1, 'walls': 2}
+MASKS_IDS_RANGES = {'occluder': (10, 100), 'object': (100, 255)}
+
+# the time steps of the game: the engine's clock following the wall
+# clock, a fixed time step, or a fixed time step without vertical
+# synchronization so that the game runs as fast as possible
+TIMESTEP_MODES = ('realtime', 'fixed', 'max-speed')
+
+# the default fixed time step and the maximal one, in seconds, beyond
+# which the physics engine clamps its time step (MaxPhysicsDeltaTime in
+# Config/DefaultEngine.ini)
+DELTA_SECONDS = 1 / 60
+MAX_DELTA_SECONDS = 1 / 30
+
+
+def get_capture_options(options=None):
+    """Return the options of the capture, completed with default values
+
+    Parameters
+    ----------
+    options : dict, optional
+        The options of the capture, any missing option takes its
+        default value:
+
+        - 'png_compression' is the zlib compression level of the PNG
+          images, either a level in [0, 9] or a name in
+          PNG_COMPRESSION. Default to 'default'.
+        - 'format' is the format of the saved runs, in FORMATS.
+          Default to 'png'.
+        - 'depth' is the format of the depth images, in
+          DEPTH_FORMATS. Default to 'png'.
+        - 'masks' is the format of the masks images, in
+          MASKS_FORMATS. Default to 'gray'.
+        - 'depth_stride' and 'masks_stride' capture the depth and
+          masks images at one pixel every stride pixels of the scene
+          images, in both dimensions, each pixel being the one at the
+          center of its block (nearest neighbour). For exemple a
+          stride of 4 captures 72x72 images for a 288x288
+          resolution. Default to 1.
+        - 'streams' are the captured streams, a subset of STREAMS
+          as a list or a comma separated string. The other streams
+          are neither captured nor saved. Default to all the streams.
+        - 'stream_queue' when positive writes the frames to disk as
+          they are captured, at most 'stream_queue' frames waiting in
+          memory, instead of storing the whole run. A frame must then
+          be saved without the rest of its run, this requires raw
+          depth and indexed masks (if captured). Default to 0.
+        - 'status' is the format of the run's status, in
+          STATUS_FORMATS. Default to 'json'.
+        - 'timestep' is how the game's time advances, in
+          TIMESTEP_MODES. Default to 'realtime'.
+        - 'delta_seconds' is the duration of a game's tick with a
+          fixed time step, in ]0, MAX_DELTA_SECONDS]. Default to
+          DELTA_SECONDS.
+        - 'substeps' is the number of game's ticks between two
+          captures. Default to 2.
+
+    Returns
+    -------
+    options : dict
+        The capture options with 'png_compression' as a level in [0,
+        9] and 'streams' as a list ordered as in STREAMS.
+
+    Raises
+    ------
+    ValueError
+        If an option is unknown or has an invalid value.
+
+    """
+    options = dict(options or {})
+    unknown = set(options) - {
+        'png_compression', 'format', 'depth', 'masks',
+        'depth_stride', 'masks_stride', 'streams', 'stream_queue',
+        'status', 'timestep', 'delta_seconds', 'substeps'}
+    if unknown:
+        raise ValueError(
+            f'unknown capture options: {", ".join(sorted(unknown))}')
+
+    level = options.get('png_compression', 'default')
+    level = PNG_COMPRESSION.get(level, level)
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        level = None
+    if level is None or not 0 <= level <= 9:
+        raise ValueError(
+            f'png compression must be in {", ".join(PNG_COMPRESSION)} '
+            f'or in [0, 9], it is {options["png_compression"]}')
+    options['png_compression'] = level
+
+    for name, choices in (
+            ('format', FORMATS),
+            ('depth', DEPTH_FORMATS),
+            ('masks', MASKS_FORMATS),
+            ('status', STATUS_FORMATS),
+            ('timestep', TIMESTEP_MODES)):
+        options.setdefault(name, choices[0])
+        if options[name] not in choices:
+            raise ValueError(
+                f'{name} must be in {", ".join(choices)}, '
+                f'it is {options[name]}')
+
+    for name, default in (
+            ('depth_stride', 1), ('masks_stride', 1), ('substeps', 2)):
+        value = options.setdefault(name, default)
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(
+                f'{name} must be a positive integer, it is {value}')
+
+    delta = options.setdefault('delta_seconds', DELTA_SECONDS)
+    if (not isinstance(delta, (int, float))
+            or not 0 < delta <= MAX_DELTA_SECONDS):
+        raise ValueError(
+            f'delta_seconds must be in ]0, {MAX_DELTA_SECONDS:.4f}], '
+            f'it is {delta}')
+
+    streams = options.get('streams', STREAMS)
+    if isinstance(streams, str):
+        streams = streams.split(',')
+    unknown = set(streams) - set(STREAMS)
+    if unknown or not streams:
+        raise ValueError(
+            f'streams must be a subset of {", ".join(STREAMS)}, '
+            f'it is {", ".join(streams)}')
+    options['streams'] = [stream for stream in STREAMS if stream in streams]
+
+    queue = options.setdefault('stream_queue', 0)
+    if not isinstance(queue, int) or queue < 0:
+        raise ValueError(
+            f'stream_queue must be a non-negative integer, it is {queue}')
+    if queue and 'depth' in streams and options['depth'] == 'png':
+        raise ValueError(
+            'stream_queue requires raw depth (float16 or float32), the png '
+            'depth is normalized by the max depth of the whole run')
+    if queue and 'masks' in streams and options['masks'] == 'gray':
+        raise ValueError(
+            'stream_queue requires indexed or rle masks, the gray masks '
+            'depend on the actors of the whole run')
+
+    return options
+
+
+def get_scene_subdir(index, nscenes, scene):
+    """Return the subdirectory name of a scene
+
+    Parameters
+    ----------
+    index : int
+        The global index of the scene, starting at 0.
+    nscenes : int
+        The total number of scenes in the dataset, used to pad the
+        index with zeros.
+    scene : dict
+        The scene specification, as returned by
+        tools.scenes_json.expand_scenes.
+
+    """
+    return '{}_{}_{}'.format(
+        str(index + 1).zfill(len(str(nscenes))),
+        'train' if scene['is_train'] else 'test',
+        scene['scenario'])
+
+
+def get_mask_id(name):
+    """Return the id of the actor `name` in the indexed masks
+
+    Parameters
+    ----------
+    name : str
+        The name of the actor in the scene, for exemple 'walls' or
+        'object_2'.
+
+    Returns
+    -------
+    id : int or None
+        The id of the actor in [0, 254], or None if the actor has no
+        id. The actors with no id are masked with 255.
+
+    """
+    if name in MASKS_IDS:
+        return MASKS_IDS[name]
+
+    kind, _, number = name.rpartition('_')
+    if kind in MASKS_IDS_RANGES and number.isdigit():
+        start, stop = MASKS_IDS_RANGES[kind]
+        if start + int(number) < stop:
+            return start + int(number)
+    return None
+
+
+def load_depth(directory):
+    """Return the raw depth images of the run saved in `directory`
+
+    The depth is the distance of each pixel to the camera plane, in
+    the Unreal Engine units (centimeters), 0 for the sky. The images
+    are memory mapped from the 'depth.npy' or 'run.pack' file of the
+    run, without any copy nor decoding. This requires numpy.
+
+    Returns
+    -------
+    depth : numpy.ndarray
+        A read-only array of shape (nimages, height, width).
+
+    Raises
+    ------
+    ValueError
+        If the run has not been saved with a raw depth format.
+
+    """
+    import numpy
+
+    npy_file = os.path.join(directory, DEPTH_FILENAME)
+    if os.path.isfile(npy_file):
+        return numpy.load(npy_file, mmap_mode='r')
+
+    if os.path.isfile(os.path.join(directory, PACK_FILENAME)):
+        depth = RunFile(directory).read_stream('depth')
+        if depth.dtype != numpy.uint8:
+            return depth
+
+    raise ValueError(f'no raw depth saved in {directory}')
+
+
+def load_masks(directory):
+    """Return the indexed masks images of the run saved in `directory`
+
+    The pixels are the ids of the actors, as listed in the 'masks_ids'
+    of the run's status (see get_mask_id). The masks are read from the
+    'run.pack' file or from the '.rle' images of the run, the PNG
+    images must be read with an image library. This requires numpy.
+
+    Returns
+    -------
+    masks : numpy.ndarray
+        An uint8 array of shape (nimages, height, width).
+
+    Raises
+    ------
+    ValueError
+        If the run has not been saved with an indexed masks format,
+        or in the 'png' format with the 'indexed' masks.
+
+    """
+    import numpy
+
+    if os.path.isfile(os.path.join(directory, PACK_FILENAME)):
+        run = RunFile(directory)
+        if 'masks_ids' in run.status['header']:
+            return run.read_stream('masks')
+    else:
+        try:
+            images = sorted(
+                i for i in os.listdir(os.path.join(directory, 'masks'))
+                if i.endswith('.rle'))
+        except FileNotFoundError:
+            images = []
+
+        masks = []
+        for image in images:
+            with open(os.path.join(directory, 'masks', image), 'rb') as fin:
+                pixels, shape = decode_rle(fin.read())
+            masks.append(
+                numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(shape))
+        if masks:
+            return numpy.stack(masks)
+
+    raise ValueError(f'no indexed masks saved in {directory}')
+
+
+def read_status(filename):
+    """Return the encoded status of a run as (data, lines)
+
+    `filename` is a status file or a 'run.pack' file, `lines` is True
+    for a status in JSON lines (see tools.status.decode_status).
+
+    """
+    if os.path.basename(filename) == PACK_FILENAME:
+        return RunFile(filename).read_status()
+
+    with open(filename, 'rb') as fin:
+        return fin.read(), filename.endswith('.jsonl')
+
+
+def _find_status(directory):
+    """Return the status file of the run saved in `directory`"""
+    for name in (PACK_FILENAME, *sorted(set(STATUS_FILENAMES.values()))):
+        if os.path.isfile(os.path.join(directory, name)):
+            return os.path.join(directory, name)
+    raise ValueError(f'no status saved in {directory}')
+
+
+def load_status(directory):
+    """Return the status of the run saved in `directory`
+
+    The status is read from the 'run.pack' file or from the status
+    file of the run, in any of the STATUS_FORMATS.
+
+    Returns
+    -------
+    status : dict
+        The status as {'header', 'frames'}, see tools.status.
+
+    Raises
+    ------
+    ValueError
+        If no status is saved in `directory`.
+
+    """
+    return decode_status(*read_status(_find_status(directory)))
+
+
+def load_status_columns(directory):
+    """Return the status of the run saved in `directory` as arrays
+
+    This is faster than load_status with the 'columnar' status
+    format, the frames being read per actor and per field. This
+    requires numpy.
+
+    Returns
+    -------
+    header : dict
+        The header of the status.
+    columns : dict
+        The value of each field of each moving actor over the frames,
+        as (actor -> field -> numpy.ndarray), see
+        tools.status.get_columns.
+
+    Raises
+    ------
+    ValueError
+        If no status is saved in `directory`.
+
+    """
+    return get_columns(*read_status(_find_status(directory)))
+
+
+def is_complete_run(directory, nimages, streams=STREAMS):
+    """Return True if the run in `directory` has been fully saved
+
+    Only the captured `streams` are expected in the run.
+
+    """
+    if os.path.isfile(os.path.join(directory, PACK_FILENAME)):
+        return True
+
+    if not any(os.path.isfile(os.path.join(directory, name))
+               for name in set(STATUS_FILENAMES.values())):
+        return False
+
+    for stream in streams:
+        if stream == 'depth' and os.path.isfile(
+                os.path.join(directory, DEPTH_FILENAME)):
+            continue
+
+        try:
+            images = os.listdir(os.path.join(directory, stream))
+        except FileNotFoundError:
+            return False
+        if len([i for i in images
+                if i.endswith(('.png', '.rle'))]) != nimages:
+            return False
+
+    return True
+
+
+def is_complete_scene(directory, scene, nimages, streams=STREAMS):
+    """Return True if the `scene` in `directory` has been fully saved"""
+    if scene['is_train']:
+        return is_complete_run(directory, nimages, streams)
+    else:
+        return all(
+            is_complete_run(
+                os.path.join(directory, str(run)), nimages, streams)
+            for run in range(1, 5))
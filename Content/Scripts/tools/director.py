@@ -1,22 +1,35 @@
 import os
+import random
+import shutil
+import time
 
 import unreal_engine as ue
 from unreal_engine import FVector, FRotator
 
+from tools.actor_pool import get_pool_stats
+from tools.assets import get_cache_stats, is_streaming_done, warm_up
+from tools.dataset import (
+    get_capture_options, get_scene_subdir, is_complete_scene)
 from tools.saver import Saver
 from tools.scene import Scene
+from tools.scene_queue import SceneList
+from tools.scenes_json import expand_scenes
+from tools.telemetry import Telemetry
+from tools.materials import MATERIALS_CATEGORIES, get_materials
 from tools.tick import Tick
-from tools.utils import exit_ue, set_game_paused
+from tools.utils import (
+    exit_ue, get_scenario, get_scene_rng, set_game_paused, set_game_timestep)
 
 from actors.camera import Camera
+from actors.object import Object
 from actors.parameters import CameraParams
 
 
 class Director:
     """Render, capture and save a list of train and test scenes
 
-    The 'movie director' renders each scene defined in the `scenes`
-    list in the given UE `world`. It manages the transition between
+    The 'movie director' renders each scene popped from `scenes` in
+    the given UE `world`. It manages the transition between
     the different scenes and the different steps of a single scene:
     generating parameters, spawning the actors, rendering the
     different checks and runs, taking and saving screenshots. Those
@@ -27,12 +40,16 @@ class Director:
     ----------
     world : ue.uobject
         The game's world in which to render the scenes
-    scenario_list : list
-        A list of scenes to render, derived from scenario.base.Base
+    scenes : tools.scene_queue.SceneList or tools.scene_queue.SceneQueue
+        The scenes to render, the director pops them one after the
+        other until no more scene is available.
     size : tuple
         The size of a scene the screen resolution times the number of
         images captured in a single scene, in the form (width, height,
         nimages).
+    seed : str
+        The global random seed, each scene has its own random number
+        generator derived from that seed and the scene's index.
     output_dir : str, optional
         When specified, the directory where to write PNG images and
         metadata from the rendered scenes. When ignored (default), do
@@ -41,26 +58,53 @@ class Director:
         The tick interval (in number of game's ticks) between two
         captures. Default to 2.
     tick_pause_at_start: int, optional
-        Pause the game at beginning of a run for `tick_pause_at_start`
-        intervals. This allows the textures and materials to be completly
-        loaded before the first capture. Default to 10 ticks.
+        Pause the game at beginning of a run until the textures and
+        materials are completly loaded, for at most
+        `tick_pause_at_start` intervals. They are loaded once for all
+        at startup, so the pause usually ends at once. Default to 10
+        ticks.
+    resume: bool, optional
+        When True, the scenes already saved in `output_dir` are not
+        rendered again and the partially saved ones are rendered from
+        scratch. Default to False.
+    server: tools.server.SceneServer, optional
+        When specified, the director runs in daemon mode: it does not
+        exit once all the scenes are rendered but waits for new
+        batches of scenes received by the server, until a 'stop'
+        command is received.
+    telemetry: tools.telemetry.Telemetry, optional
+        When specified, the rendering events (scenes and runs start and
+        end, capture and save times, retries) are reported to it.
+    capture: dict, optional
+        The options of the capture, as returned by
+        tools.dataset.get_capture_options. Default options are used
+        when not specified. Its 'timestep' and 'delta_seconds' set the
+        game's clock.
 
     """
-    def __init__(self, world, scenario_list, size, output_dir=None,
-                 tick_interval=2, tick_pause_at_start=10):
+    def __init__(self, world, scenes, size, seed, output_dir=None,
+                 tick_interval=2, tick_pause_at_start=10, resume=False,
+                 server=None, telemetry=None, capture=None):
         self.world = world
-        self.scenario_list = scenario_list
+        self.scenes = scenes
         self.size = size
+        self.seed = seed
         self.output_dir = output_dir
         self.tick_pause_at_start = tick_pause_at_start
+        self.resume = resume and output_dir is not None
+        self.server = server
+        self.telemetry = Telemetry() if telemetry is None else telemetry
+        self.capture_options = get_capture_options(capture)
 
-        ue.log(
-            'scheduling {nscenes} scenes, ({ntest} for test and '
-            '{ntrain} for train), total of {nruns} runs'.format(
-                nscenes=len(self.scenario_list),
-                ntest=len([s for s in self.scenario_list if not s.is_train()]),
-                ntrain=len([s for s in self.scenario_list if s.is_train()]),
-                nruns=sum(s.get_nruns() for s in self.scenario_list)))
+        # in daemon mode, the batches of scenes received and not yet
+        # rendered
+        self.batches = []
+        self.is_stopped = False
+
+        ue.log(f'scheduling {len(self.scenes)} scenes')
+        self.telemetry.emit(
+            'start', nscenes=len(self.scenes),
+            resolution=f'{self.size[0]}x{self.size[1]}')
 
         # the director owns the camera (placed at (0, 0) by default,
         # two meters high)
@@ -72,19 +116,70 @@ class Director:
         # status (if output_dir is defined)
         self.saver = Saver(
             self.size, self.camera,
-            dry_mode=True if self.output_dir is None else False)
+            dry_mode=True if self.output_dir is None else False,
+            png_compression=self.capture_options['png_compression'],
+            format=self.capture_options['format'],
+            depth=self.capture_options['depth'],
+            masks=self.capture_options['masks'],
+            depth_stride=self.capture_options['depth_stride'],
+            masks_stride=self.capture_options['masks_stride'],
+            streams=self.capture_options['streams'],
+            stream_queue=self.capture_options['stream_queue'],
+            status=self.capture_options['status'],
+            telemetry=self.telemetry)
+
+        # with a fixed time step the physics and the moving actors
+        # advance by the same duration at each tick, whatever the
+        # machine's frame rate
+        timestep = self.capture_options['timestep']
+        delta_seconds = self.capture_options['delta_seconds']
+        set_game_timestep(timestep, delta_seconds)
+        ue.log('game time step: {}{}'.format(
+            timestep, '' if timestep == 'realtime'
+            else ' ({:.4f}s)'.format(delta_seconds)))
+
+        # load all the materials and meshes before the first scene,
+        # so that the runs do not wait for their textures
+        t_warm_up = time.perf_counter()
+        is_warm = warm_up(
+            [m for c in MATERIALS_CATEGORIES for m in get_materials(c)],
+            Object.shape.values())
+        ue.log('assets warmed up in {:.1f}s{}'.format(
+            time.perf_counter() - t_warm_up,
+            '' if is_warm else ', some are still streaming'))
 
         # start the ticker, take a screen capture each 2 game ticks
         self.ticker = Tick(tick_interval=tick_interval)
         self.ticker.start()
 
         # initialize to render the first scene on the next tick
-        self.scene_index = 0
-        self.scene = Scene(world, self.scenario_list[0])
-        self.setup()
+        self.scene_index = None
+        self.scene_spec = None
+        self.scene = None
+        self.attempt = 0
+        self.pause_ticks = None
+        if self.next_scene():
+            self.setup()
+        elif self.server is not None:
+            ue.log(f'waiting for scenes on {self.server.path}')
+        else:
+            ue.log('no scene to render, exiting')
+            self.terminate()
 
     def tick(self, dt):
         """This method is called at each game tick by UE"""
+        # no scene is being rendered, in daemon mode look for a new
+        # batch of scenes
+        if self.scene is None:
+            if self.server is not None and self.next_scene():
+                self.setup()
+            elif self.server is not None and self.is_stopped:
+                ue.log('stop command received, exiting')
+                self.server.close()
+                self.server = None
+                self.terminate()
+            return
+
         # update the ticker
         self.ticker.tick(dt)
 
@@ -99,71 +194,125 @@ class Director:
         # retrieve the number of ticks since the run's start
         tick = self.ticker.get_count()
 
-        # manage the pause at beginning
-        if tick <= self.tick_pause_at_start:
-            return
-        if tick == self.tick_pause_at_start + 1:
+        # manage the pause at beginning: wait for the assets to be
+        # streamed in, at most tick_pause_at_start ticks
+        if self.pause_ticks is None:
+            if tick <= self.tick_pause_at_start and not is_streaming_done():
+                return
+            self.pause_ticks = tick - 1
             set_game_paused(self.world, False)
 
-        # during a run, apply magic trick (if any) and take screenshot
-        if tick <= self.size[2] + self.tick_pause_at_start:
-            self.scene.run_magic(tick)
-            self.capture()
+        # during a run, apply magic trick (if any) and take
+        # screenshot. The magic tick is counted from the run's start
+        # with a full pause, so that it occurs at the same frame
+        # whatever the pause. A check run captures nothing and ends
+        # once checked at the magic tick
+        frame = tick - self.pause_ticks
+        if self.scene.is_check_run():
+            self.run_nframes += 1
+            is_run_end = self.scene.check(
+                frame + self.tick_pause_at_start,
+                self.saver) or frame == self.size[2]
+        else:
+            if frame <= self.size[2]:
+                self.scene.run_magic(frame + self.tick_pause_at_start)
+                self.capture()
+            is_run_end = frame == self.size[2]
 
         # end of a run, terminate it
-        if tick == self.size[2] + self.tick_pause_at_start:
+        if is_run_end:
             is_next_run = self.teardown()
-            if is_next_run is True:
+            if is_next_run is None:
+                return
+            elif is_next_run is True:
                 self.setup()
+            elif self.server is not None:
+                # make sure the last runs are saved before reporting
+                # the batch as done
+                if not self.saver.wait():
+                    self.terminate('failed to save the last runs, exiting')
+                    return
+                ue.log(f'all scenes rendered, waiting for scenes '
+                       f'on {self.server.path}')
+                self.telemetry.emit('end')
             else:
+                if not self.saver.wait():
+                    self.terminate('failed to save the last runs, exiting')
+                    return
                 ue.log('all scenes rendered, exiting')
-                self.ticker.stop()
-                exit_ue(self.world)
+                self.telemetry.emit('end')
+                self.terminate()
 
     def setup(self):
         # render the scene: spawn actors
         self.scene.render(self.saver)
         self.ticker.reset()
+        self.pause_ticks = None
         set_game_paused(self.world, True)
 
         description = 'running scene {}/{}: {}'.format(
-            self.scene_index+1, len(self.scenario_list),
+            self.scene_index+1, len(self.scenes),
             self.scene.description())
         ue.log(description)
-
-        # setup the screenshots
-        if self.scene.is_check_run():
-            pass
-        else:
-            self.saver.reset()
+        self.telemetry.emit(
+            'run_start', index=self.scene_index, run=self.scene.current_run)
+        self.run_nframes = 0
+        self.run_capture_time = 0
+
+        # a check run is not rendered, with a fixed time step this
+        # does not change its simulation. In realtime the ticks would
+        # be shorter than in the checked runs, so it is rendered
+        if self.capture_options['timestep'] != 'realtime':
+            self.saver.set_rendering(not self.scene.is_check_run())
+
+        # setup the screenshots, in streaming mode the run is written
+        # to its directory as it is captured
+        if not self.scene.is_check_run():
+            self.saver.reset(
+                None if self.saver.is_dry_mode else self.get_scene_subdir())
 
     def capture(self):
-        if self.scene.is_check_run():
-            # Screenshot.CaptureMasks()
-            pass
-        else:
-            self.saver.capture(self.scene)
+        t_capture = time.perf_counter()
+        self.saver.capture(self.scene)
+        self.run_capture_time += time.perf_counter() - t_capture
+        self.run_nframes += 1
 
     def teardown(self):
         """Save captured images for the current run and prepare the next one
 
-        Return True if there is a next run to render, False otherwise.
+        Return True if there is a next run to render, False otherwise,
+        or None if the game is terminated because the run cannot be
+        saved.
 
         """
+        self.telemetry.emit(
+            'run_end', index=self.scene_index, run=self.scene.current_run,
+            nframes=self.run_nframes, capture_time=self.run_capture_time,
+            pause_ticks=self.pause_ticks, game_time=self.ticker.get_time())
+
         # if the current run failed, restart the whole scene with new
         # random parameters
         if not self.scene.is_valid():
             ue.log('scene failed, retry it')
-            self.scene.reset()
+            self.scene.clear()
+            self.attempt += 1
+            self.telemetry.emit(
+                'scene_retry', index=self.scene_index, attempt=self.attempt)
+            self.spawn_scene()
             return True
 
         # the run was successful, see if we need to save capture and
         # prepare the next run
         if not self.saver.is_dry_mode and not self.scene.is_check_run():
+            t_save = time.perf_counter()
             if not self.saver.save(self.get_scene_subdir()):
                 # save failed, exit
-                self.ticker.stop()
-                exit_ue(self.world)
+                self.terminate(
+                    f'failed to save {self.get_scene_subdir()}, exiting')
+                return None
+            self.telemetry.emit(
+                'save', index=self.scene_index, run=self.scene.current_run,
+                save_time=time.perf_counter() - t_save)
 
         # prepare the next run: if no more run for that scene, render
         # the next scene. Else render the next run of the current
@@ -174,25 +323,121 @@ class Director:
         else:
             # destroy all the actors from the previous scene
             self.scene.clear()
-            self.scene_index += 1
-            try:
-                scenario = self.scenario_list[self.scene_index]
-                self.scene = Scene(self.world, scenario)
-                return True
-            except IndexError:
+            self.telemetry.emit('scene_end', index=self.scene_index)
+            return self.next_scene()
+
+    def next_scene(self):
+        """Pop the next scene to render
+
+        Return True if there is a next scene to render, False otherwise.
+
+        """
+        while True:
+            popped = self.scenes.pop()
+            if popped is None:
+                if self.next_batch():
+                    continue
+                self.scene = None
                 return False
 
+            self.scene_index, self.scene_spec = popped
+            self.scene_subdir = get_scene_subdir(
+                self.scene_index, len(self.scenes), self.scene_spec)
+            if not self.resume:
+                break
+
+            scene_dir = os.path.join(self.output_dir, self.scene_subdir)
+            if not is_complete_scene(
+                    scene_dir, self.scene_spec, self.size[2],
+                    self.capture_options['streams']):
+                # erase the partially saved scene, if any
+                if os.path.exists(scene_dir):
+                    shutil.rmtree(scene_dir)
+                break
+
+            # the scene is already saved, we skip it
+            ue.log('skipping scene {}/{}: already saved'.format(
+                self.scene_index+1, len(self.scenes)))
+            self.telemetry.emit('scene_skip', index=self.scene_index)
+
+        self.attempt = 0
+        self.telemetry.emit(
+            'scene_start', index=self.scene_index, attempt=self.attempt)
+        self.spawn_scene()
+        return True
+
+    def next_batch(self):
+        """In daemon mode, setup the next batch of scenes to render
+
+        Return True if a new batch of scenes is setup, False
+        otherwise.
+
+        """
+        if self.server is None:
+            return False
+
+        for message in self.server.poll():
+            if message.get('command') == 'stop':
+                self.is_stopped = True
+            elif 'scenes' in message:
+                self.batches.append(message)
+
+        while self.batches:
+            batch = self.batches.pop(0)
+            try:
+                scenes = expand_scenes(batch['scenes'])
+            except ValueError as err:
+                ue.log_error(f'invalid batch of scenes, ignoring it: {err}')
+                continue
+
+            self.scenes = SceneList(scenes)
+            self.output_dir = batch.get('output_dir')
+            self.seed = str(batch.get(
+                'seed', random.SystemRandom().randrange(2**32)))
+            self.resume = (
+                batch.get('resume', False) and self.output_dir is not None)
+            self.saver.is_dry_mode = self.output_dir is None
+
+            ue.log(f'scheduling {len(self.scenes)} scenes with seed '
+                   f'{self.seed}, writing to {self.output_dir}')
+            self.telemetry.emit(
+                'start', nscenes=len(self.scenes),
+                resolution=f'{self.size[0]}x{self.size[1]}')
+            return True
+
+        return False
+
+    def terminate(self, error=None):
+        """Stop rendering and exit the game
+
+        The game exits as a failure, logging the `error` message, if
+        `error` is not None or if a run being saved in background
+        fails. The error is then detected by intphys.py.
+
+        """
+        # wait for the runs being saved in background
+        if not self.saver.wait() and error is None:
+            error = 'failed to save the last runs, exiting'
+        stats = get_pool_stats()
+        ue.log(f'actors spawned: {stats["spawned"]}, '
+               f'reused: {stats["reused"]}')
+        stats = get_cache_stats()
+        ue.log(f'assets loaded: {stats["misses"]}, '
+               f'cached: {stats["hits"]}')
+        self.telemetry.close()
+        self.ticker.stop()
+        exit_ue(self.world, error)
+
+    def spawn_scene(self):
+        """Instantiate the current scene with its own random generator"""
+        self.scene = Scene(
+            self.world, get_scenario(self.scene_spec),
+            get_scene_rng(self.seed, self.scene_index, self.attempt))
+
     def get_scene_subdir(self):
         # build the scene sub-directory name, for exemple
         # '027_test_O1/3' or '028_train_O1'
-        idx = self.scene_index + 1
-        padded_idx = '0' * len(str(len(self.scenario_list) - idx)) + str(idx)
-        scene_name = (
-            padded_idx + '_' +
-            ('train' if self.scene.scenario.is_train() else 'test') + '_' +
-            self.scene.scenario.name)
-
-        out = os.path.join(self.output_dir, scene_name)
+        out = os.path.join(self.output_dir, self.scene_subdir)
 
         if not self.scene.scenario.is_train():
             # 1, 2, 3 and 4 subdirectories for test scenes
@@ -6,7 +6,11 @@ import random
 from tools.utils import intphys_root_directory
 
 
-def get_random_material(category):
+# the actor categories having materials in Content/Materials
+MATERIALS_CATEGORIES = ('Floor', 'Object', 'Wall')
+
+
+def get_random_material(category, rng=random):
     """Return a random material for the given category
 
     Parameters
@@ -14,6 +18,9 @@ def get_random_material(category):
     category: str
         The actor category to choose a material for. Must be 'Floor',
         'Object' or 'Wall'.
+    rng: random.Random, optional
+        The random number generator used to choose the material,
+        default to the global one from the random module.
 
     Returns
     -------
@@ -27,17 +34,28 @@ def get_random_material(category):
     ValueError if the requested category is unknown.
 
     """
-    # the list of valid actor categories
-    valid_categories = ['Floor', 'Object', 'Wall']
-    if category not in valid_categories:
+    return rng.choice(get_materials(category))
+
+
+def get_materials(category):
+    """Return the sorted list of the materials for the given category
+
+    The category must be in MATERIALS_CATEGORIES, see
+    get_random_material.
+
+    Raises
+    ------
+    ValueError if the requested category is unknown.
+
+    """
+    if category not in MATERIALS_CATEGORIES:
         raise ValueError(
-            f'category {category} unknown, must be in {valid_categories}')
+            f'category {category} unknown, '
+            f'must be in {list(MATERIALS_CATEGORIES)}')
 
-    # build the list of possible materials and shuffle it, return the
-    # 1st element in it
-    available_materials = _load_materials('Materials/' + category)
-    random.shuffle(available_materials)  # in-place list shuffling
-    return available_materials[0]
+    # the list is sorted so that the choice of a material does not
+    # depend on the filesystem order.
+    return sorted(_load_materials('Materials/' + category))
 
 
 def _get_material_path(path):
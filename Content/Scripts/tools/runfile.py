@@ -0,0 +1,318 @@
+"""Read and write the runs saved in a single packed file
+
+With the 'pack' capture format, a run is saved as a single file
+'run.pack' instead of the 'scene', 'depth' and 'masks' PNG images and
+the 'status.json' file. The file is made of:
+
+- a header: the magic bytes b'IPHYPACK' and the format version, as a
+  little-endian uint32, followed by 4 reserved bytes,
+- the chunks: the arrays of each image of each stream and the status
+  of the run (in JSON or JSON lines, see tools.status), zlib
+  compressed except the raw depth images which can then be memory
+  mapped and the run-length encoded masks (see decode_rle),
+- the index: a JSON dict {'version', 'chunks'} where 'chunks' lists
+  the chunks as dicts {'name', 'frame', 'offset', 'size', 'dtype',
+  'shape', 'compression'}, with 'name' being the stream ('scene',
+  'depth' or 'masks') or 'status', 'frame' the index of the image in
+  the stream and 'compression' either 'zlib', 'rle' or 'none',
+- a footer: the offset and size of the index, as little-endian
+  uint64, followed by the magic bytes.
+
+The images are written by the game in 'run.pack.part'. Once they are
+all written, the status is appended to the file which is then renamed
+to 'run.pack' (see finalize), so a run with a 'run.pack' file is
+complete.
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game. Reading the images as
+arrays requires numpy.
+
+"""
+
+import json
+import os
+import struct
+import zlib
+
+from tools.status import decode_status
+
+
+# the name of a packed run file, of a run being written
+PACK_FILENAME = 'run.pack'
+PART_FILENAME = 'run.pack.part'
+
+MAGIC = b'IPHYPACK'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+_FOOTER = struct.Struct('<QQ8s')
+
+_RLE_HEADER = struct.Struct('<HH')
+_RLE_RUN = struct.Struct('<BH')
+
+
+def decode_rle(data):
+    """Decode a run-length encoded masks image
+
+    The image is made of its height and width, as little-endian
+    uint16, followed by the runs of pixels of the same actor id in
+    row-major order, each as an uint8 id and an uint16 length. This is
+    the format of the 'rle' masks, in the '.rle' files or in the
+    packed runs.
+
+    Returns
+    -------
+    pixels : bytes
+        The ids of the actors, one byte per pixel.
+    shape : tuple
+        The (height, width) of the image.
+
+    Raises
+    ------
+    ValueError
+        If the encoded image is corrupted.
+
+    """
+    height, width = _RLE_HEADER.unpack_from(data)
+    try:
+        pixels = b''.join(
+            bytes((value,)) * length for value, length in
+            _RLE_RUN.iter_unpack(memoryview(data)[_RLE_HEADER.size:]))
+    except struct.error:
+        pixels = b''
+    if len(pixels) != height * width:
+        raise ValueError('corrupted run-length encoded image')
+    return pixels, (height, width)
+
+
+def _read_index(fin):
+    """Return the index and its offset in the opened pack file `fin`"""
+    fin.seek(0)
+    magic, version, _ = _HEADER.unpack(fin.read(_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f'not a packed run file: {fin.name}')
+    if version > VERSION:
+        raise ValueError(
+            f'unsupported packed run version {version}: {fin.name}')
+
+    fin.seek(-_FOOTER.size, os.SEEK_END)
+    offset, size, magic = _FOOTER.unpack(fin.read(_FOOTER.size))
+    if magic != MAGIC:
+        raise ValueError(f'truncated packed run file: {fin.name}')
+
+    fin.seek(offset)
+    return json.loads(fin.read(size).decode('utf8')), offset
+
+
+def finalize(directory, status, dtype='json'):
+    """Append the `status` to the run being written in `directory`
+
+    The file PART_FILENAME written by the game is completed with the
+    `status` and renamed to PACK_FILENAME. The `status` is either a
+    dict, its encoding as bytes or the chunks of its encoding as
+    strings (see tools.status.StatusWriter.iterencode), `dtype` being
+    'json' or 'jsonl'. The chunks are compressed as they are read.
+
+    """
+    if isinstance(status, dict):
+        status = json.dumps(status).encode('utf8')
+    if isinstance(status, bytes):
+        status = [status]
+
+    part = os.path.join(directory, PART_FILENAME)
+    with open(part, 'r+b') as fout:
+        index, offset = _read_index(fout)
+
+        # overwrite the index with the status chunk
+        fout.seek(offset)
+        fout.truncate()
+        compressor = zlib.compressobj()
+        for chunk in status:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf8')
+            fout.write(compressor.compress(chunk))
+        fout.write(compressor.flush())
+        index['chunks'].append({
+            'name': 'status', 'frame': 0, 'offset': offset,
+            'size': fout.tell() - offset, 'dtype': dtype, 'shape': [],
+            'compression': 'zlib'})
+
+        # write the updated index and footer
+        data = json.dumps(index).encode('utf8')
+        fout.write(data)
+        fout.write(_FOOTER.pack(offset + index['chunks'][-1]['size'],
+                                len(data), MAGIC))
+
+    os.rename(part, os.path.join(directory, PACK_FILENAME))
+
+
+class RunFile:
+    """Read a run saved as a packed file
+
+    Parameters
+    ----------
+    filename : str
+        The 'run.pack' file to read, or the run directory containing
+        it.
+
+    Attributes
+    ----------
+    streams : dict
+        The number of images saved in each stream, stream name ->
+        nimages.
+
+    """
+    def __init__(self, filename):
+        if os.path.isdir(filename):
+            filename = os.path.join(filename, PACK_FILENAME)
+        self.filename = filename
+
+        with open(filename, 'rb') as fin:
+            index, _ = _read_index(fin)
+        self._chunks = {(c['name'], c['frame']): c for c in index['chunks']}
+
+        self.streams = {}
+        for name, _ in self._chunks:
+            if name != 'status':
+                self.streams[name] = self.streams.get(name, 0) + 1
+
+    def _read_chunk(self, name, frame=0):
+        try:
+            chunk = self._chunks[(name, frame)]
+        except KeyError:
+            raise KeyError(f'no {name} {frame} in {self.filename}')
+
+        with open(self.filename, 'rb') as fin:
+            fin.seek(chunk['offset'])
+            data = fin.read(chunk['size'])
+
+        compression = chunk.get('compression', 'zlib')
+        if compression == 'zlib':
+            data = zlib.decompress(data)
+        elif compression == 'rle':
+            data = decode_rle(data)[0]
+        return chunk, data
+
+    @property
+    def status(self):
+        """The status of the run, as {'header', 'frames'}"""
+        return decode_status(*self.read_status())
+
+    def read_status(self):
+        """Return the encoded status of the run as (bytes, lines)
+
+        `lines` is True for a status in JSON lines (see
+        tools.status.decode_status).
+
+        """
+        chunk, data = self._read_chunk('status')
+        return data, chunk['dtype'] == 'jsonl'
+
+    def read_raw(self, stream, frame):
+        """Return the image `frame` of `stream` as (bytes, shape, dtype)"""
+        chunk, data = self._read_chunk(stream, frame)
+        return data, tuple(chunk['shape']), chunk['dtype']
+
+    def read(self, stream, frame):
+        """Return the image `frame` of `stream` as a numpy array"""
+        import numpy
+
+        data, shape, dtype = self.read_raw(stream, frame)
+        return numpy.frombuffer(data, dtype=dtype).reshape(shape)
+
+    def read_stream(self, stream):
+        """Return all the images of `stream` as a numpy array
+
+        The uncompressed images (raw depth) are memory mapped from the
+        file and returned as a read-only array.
+
+        """
+        import numpy
+
+        chunks = [self._chunks[(stream, frame)]
+                  for frame in range(self.streams[stream])]
+        first = chunks[0]
+        shape = (len(chunks),) + tuple(first['shape'])
+
+        if (all(c.get('compression', 'zlib') == 'none' for c in chunks)
+                and all(c['offset'] == first['offset'] + i * first['size']
+                        for i, c in enumerate(chunks))):
+            return numpy.memmap(
+                self.filename, dtype=first['dtype'], mode='r',
+                offset=first['offset'], shape=shape)
+
+        return numpy.stack(
+            [self.read(stream, frame) for frame in range(len(chunks))])
+
+    def export_png(self, directory):
+        """Write the run in `directory` as PNG images and 'status.json'
+
+        The images are written in RGBA, as with the 'png' capture
+        format. The raw depth images are written in 'depth.npy'.
+
+        """
+        os.makedirs(directory, exist_ok=True)
+        for stream, nimages in self.streams.items():
+            if self._chunks[(stream, 0)]['dtype'] != 'uint8':
+                self._export_npy(stream, os.path.join(
+                    directory, f'{stream}.npy'))
+                continue
+
+            os.makedirs(os.path.join(directory, stream), exist_ok=True)
+            for frame in range(nimages):
+                data, shape, _ = self.read_raw(stream, frame)
+                name = f'{stream}_{str(frame + 1).zfill(len(str(nimages)))}'
+                with open(os.path.join(
+                        directory, stream, name + '.png'), 'wb') as fout:
+                    fout.write(_encode_png(data, shape))
+
+        with open(os.path.join(directory, 'status.json'), 'w') as fout:
+            fout.write(json.dumps(self.status, indent=4))
+
+    def _export_npy(self, stream, filename):
+        """Write the raw images of `stream` in a NPY file"""
+        first = self._chunks[(stream, 0)]
+        shape = (self.streams[stream],) + tuple(first['shape'])
+
+        # NPY format version 1.0, the header is padded so that the
+        # data is aligned on 64 bytes
+        header = (
+            f"{{'descr': '{first['dtype']}', 'fortran_order': False, "
+            f"'shape': {shape}, }}")
+        header += ' ' * (63 - (10 + len(header)) % 64) + '\n'
+
+        with open(filename, 'wb') as fout:
+            fout.write(b'\x93NUMPY\x01\x00')
+            fout.write(struct.pack('<H', len(header)))
+            fout.write(header.encode('latin1'))
+            for frame in range(shape[0]):
+                fout.write(self.read_raw(stream, frame)[0])
+
+
+def _png_chunk(name, data):
+    return (struct.pack('>I', len(data)) + name + data
+            + struct.pack('>I', zlib.crc32(name + data)))
+
+
+def _encode_png(data, shape):
+    """Return the RGBA PNG of an uint8 image of `shape` (h, w[, 3])"""
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) == 3 else 1
+
+    # expand the image to RGBA
+    npixels = width * height
+    rgba = bytearray(4 * npixels)
+    for c in range(3):
+        rgba[c::4] = data[c % channels::channels]
+    rgba[3::4] = b'\xff' * npixels
+
+    # each scanline is prefixed by its filter type (0 for none)
+    stride = 4 * width
+    raw = b''.join(
+        b'\x00' + rgba[y * stride:(y + 1) * stride] for y in range(height))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + _png_chunk(b'IHDR', struct.pack(
+                '>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + _png_chunk(b'IDAT', zlib.compress(raw))
+            + _png_chunk(b'IEND', b''))
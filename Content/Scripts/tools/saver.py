@@ -1,16 +1,28 @@
-import json
-import os
 
 import unreal_engine as ue
 from unreal_engine.classes import ScreenshotManager
 
+from tools import runfile
+from tools.dataset import STREAMS, get_mask_id
+from tools.status import StatusWriter
+from tools.telemetry import SAVE_STAGES, Telemetry
+
 
 class Saver:
     """Take screen captures during a run and save them at the end
 
     The saver manages screenshots and scene's status. It store them
     during a run and save them at the end, respectively as png images
-    (scene, depth and masks) and status.json file.
+    (scene, depth and masks) and status file.
+
+    The PNG images are written in background while the next run is
+    captured, at most `async_saves` runs being written at a
+    time. The status of a run is encoded frame after frame, in a
+    partial file of the run directory for the 'compact' and 'jsonl'
+    formats, and written once all its images are saved (see poll() and wait()),
+    so that a run with a status file is always complete. With the
+    'pack' format, the images and status are written in a single file
+    instead (see tools.runfile).
 
     Parameters
     ----------
@@ -24,23 +36,78 @@ class Saver:
         When False (default), capture PNG images and metadata from the
         rendered scenes. When True, do not take any captures nor save
         any data.
+    async_saves : int, optional
+        The maximum number of runs written in background, 0 to write
+        them synchronously. Default to 1.
+    png_compression : int, optional
+        The zlib compression level of the images, from 0 (no
+        compression) to 9 (smallest files). Default to 6.
+    format : str, optional
+        The format of the saved runs, 'png' (default) or 'pack'.
+    depth : str, optional
+        The format of the depth images, 'png' (default), 'float16' or
+        'float32' (see tools.dataset.DEPTH_FORMATS).
+    masks : str, optional
+        The format of the masks images, 'gray' (default), 'indexed'
+        or 'rle' (see tools.dataset.MASKS_FORMATS). With the indexed
+        formats, the masks pixels are the global ids of the actors,
+        listed in the 'masks_ids' of the status.
+    depth_stride : int, optional
+        Capture the depth images at one pixel every `depth_stride`
+        pixels of the scene images (see
+        tools.dataset.get_capture_options). Default to 1.
+    masks_stride : int, optional
+        Capture the masks images at one pixel every `masks_stride`
+        pixels of the scene images. Default to 1.
+    streams : list of str, optional
+        The captured streams, a subset of ('scene', 'depth',
+        'masks'). The other streams cost neither capture time, nor
+        memory, nor disk. Default to all the streams.
+    stream_queue : int, optional
+        When positive, the frames are written to disk as they are
+        captured, at most `stream_queue` frames waiting in memory,
+        instead of once the run is captured. This requires raw depth
+        and indexed masks (see tools.dataset.get_capture_options).
+        Default to 0.
+    status : str, optional
+        The format of the status, in tools.status.STATUS_FORMATS.
+        Default to 'json'.
+    telemetry : tools.telemetry.Telemetry, optional
+        When specified, the time spent in each stage of the saving is
+        reported to it once a run is saved.
 
     """
-    def __init__(self, size, camera, dry_mode=False):
+    def __init__(self, size, camera, dry_mode=False, async_saves=1,
+                 png_compression=6, format='png', depth='png',
+                 masks='gray', depth_stride=1, masks_stride=1,
+                 streams=STREAMS, stream_queue=0, status='json',
+                 telemetry=None):
         self.size = size
+        self.format = format
+        self.masks = masks
+        self.streams = streams
         self.camera = camera
         self.is_dry_mode = dry_mode
+        self.telemetry = Telemetry() if telemetry is None else telemetry
 
-        # an empty list to append status along the run
+        # the status header and the status writer to append frames
+        # along the run
+        self.status_format = status
         self.status_header = {}
-        self.status = []
+        self.status = StatusWriter(status)
+
+        # the status of the runs being written in background, indexed
+        # by output directory
+        self.pending = {}
 
-        # initialize the capture. TODO We initialize the manager even
-        # if if we are in dry mode because we may use it in check runs
+        # initialize the capture, even in dry mode because it is used
+        # in check runs (see is_visible)
         verbose = False
         ScreenshotManager.Initialize(
             int(self.size[0]), int(self.size[1]), int(self.size[2]),
-            self.camera.get_actor(), verbose)
+            self.camera.get_actor(), verbose, async_saves, png_compression,
+            format == 'pack', depth, masks, depth_stride, masks_stride,
+            ','.join(streams), stream_queue)
 
     def capture(self, scene):
         """Push the scene's current screenshot and status to memory"""
@@ -49,6 +116,9 @@ class Saver:
             if self.status_header == {}:
                 self.status_header = scene.get_status_header()
                 self.status_header['camera'] = self.camera.get_status()
+                if self.masks != 'gray' and 'masks' in self.streams:
+                    self.status_header['masks_ids'] = self._set_masks_ids(
+                        scene)
 
             # scene, depth and masks images are stored from C++
             ScreenshotManager.Capture(scene.get_ignored_actors())
@@ -56,33 +126,129 @@ class Saver:
             # save the current status
             self.status.append(scene.get_status())
 
-    def reset(self):
-        """Reset the saver and delete all data in cache"""
+    def is_visible(self, actor):
+        """Return True if `actor` is visible from the camera
+
+        The view's rays are traced in the scene at full resolution,
+        over the projection of the actor's bounds, but nothing is
+        captured, so the scene does not need to be rendered.
+
+        """
+        return ScreenshotManager.IsActorVisible(actor.get_actor())
+
+    def set_rendering(self, enabled):
+        """Enable or disable the rendering of the world
+
+        The game keeps ticking without rendering, but the scene images
+        cannot be captured.
+
+        """
+        ScreenshotManager.SetWorldRendering(enabled)
+
+    def _set_masks_ids(self, scene):
+        """Give the global ids of the `scene` actors to the capture
+
+        Return the ids as a dict (actor name -> id), see
+        tools.dataset.get_mask_id.
+
+        """
+        ids = {'sky': get_mask_id('sky')}
+        names, values = [], []
+        for name, actors in scene.get_unreal_actors().items():
+            mask_id = get_mask_id(name)
+            if mask_id is not None:
+                ids[name] = mask_id
+                names += [actor.get_name() for actor in actors]
+                values += [mask_id] * len(actors)
+
+        ScreenshotManager.SetActorsIds(names, values)
+        return ids
+
+    def reset(self, output_dir=None):
+        """Reset the saver and delete all data in cache
+
+        In streaming mode, the run is written to `output_dir` as it is
+        captured, it must then be saved to the same directory.
+
+        """
         if not self.is_dry_mode:
-            ScreenshotManager.Reset()
+            ScreenshotManager.Reset(output_dir or '')
+
+            # discard the status of a run not saved
+            if self.status not in self.pending.values():
+                self.status.close()
             self.status_header = {}
-            self.status = []
+            self.status = StatusWriter(self.status_format, output_dir)
 
     def save(self, output_dir):
-        """Save the captured data to `output_dir`"""
+        """Save the captured data to `output_dir`
+
+        The images are written in background, return False if the
+        saving of this run or of a previous one failed, True
+        otherwise.
+
+        """
         if self.is_dry_mode:
             return True
 
         ue.log(f'saving capture to {output_dir}')
 
-        # save the captured images as PNG
+        # save the captured images as PNG, in background
         done, max_depth, masks = ScreenshotManager.Save(output_dir)
         if not done:
             ue.log_warning(f'failed to save images to {output_dir}')
             return False
 
-        # save images max depth and actors's masks to status
-        self.status_header.update({'max_depth': max_depth, 'masks': masks})
-        status = {'header': self.status_header, 'frames': self.status}
+        # save images max depth and actors's masks to status, it is
+        # written once the images are saved
+        if 'depth' in self.streams:
+            self.status_header['max_depth'] = max_depth
+        if 'masks' in self.streams:
+            self.status_header['masks'] = masks
+        self.status.header = self.status_header
+        self.pending[output_dir] = self.status
+
+        return self.poll()
+
+    def poll(self):
+        """Write the status of the runs saved in background
+
+        Return False if the saving of a run failed, True otherwise.
+
+        """
+        _, saved, failed, timings = ScreenshotManager.PollSaves()
+
+        for i, output_dir in enumerate(saved):
+            # save the status file, or in the packed file
+            status = self.pending.pop(output_dir)
+            if self.format == 'pack':
+                runfile.finalize(
+                    output_dir, status.iterencode(),
+                    'jsonl' if status.format == 'jsonl' else 'json')
+            else:
+                status.write(output_dir)
+            status.close()
+
+            self.telemetry.emit('saved', directory=output_dir, **{
+                f'{stage}_time': timings[len(SAVE_STAGES) * i + j]
+                for j, stage in enumerate(SAVE_STAGES)})
+
+        for output_dir in failed:
+            status = self.pending.pop(output_dir, None)
+            if status is not None:
+                status.close()
+            ue.log_warning(f'failed to save images to {output_dir}')
+
+        return not failed
+
+    def wait(self):
+        """Wait for all the runs to be saved and write their status
 
-        # save the status as JSON file
-        json_file = os.path.join(output_dir, 'status.json')
-        with open(json_file, 'w') as fin:
-            fin.write(json.dumps(status, indent=4))
+        Return False if the saving of a run failed, True otherwise.
+
+        """
+        if not self.pending:
+            return True
 
-        return True
+        ScreenshotManager.WaitSaves()
+        return self.poll()
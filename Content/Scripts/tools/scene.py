@@ -3,6 +3,7 @@ from actors.light import Light
 from actors.object import Object
 from actors.occluder import Occluder
 from actors.walls import Walls
+from tools.actor_pool import release_actor
 
 
 def get_actor_class(name):
@@ -34,15 +35,21 @@ class Scene(object):
     scenario: child of scenario.base.Base
         The scenario to execute. A scenario defines the actors,
         generates parameters for them and implement the magic trick.
+    rng: random.Random
+        The random number generator dedicated to the scene, used to
+        generate the scene's parameters.
 
     """
-    def __init__(self, world, scenario):
+    def __init__(self, world, scenario, rng):
         self.world = world
         self.scenario = scenario
         self.current_run = 0
 
+        # True once a check run found the scene invalid
+        self.is_check_failed = False
+
         # generate random parameters for the scene
-        self.params = self.scenario.generate_parameters()
+        self.params = self.scenario.generate_parameters(rng)
 
         # spawn the actors from generated params
         self.actors = {
@@ -84,10 +91,35 @@ class Scene(object):
             self.scenario.apply_magic_trick(
                 self.get_magic_actor(), self.current_run)
 
+    def check(self, tick, saver):
+        """Check the magic trick on a check run, return True once done
+
+        The magic actor must be hidden by the occluder when the magic
+        trick occurs, the check is done at the magic tick from the
+        visibility of the actor (see tools.saver.Saver.is_visible).
+        When it is visible the scene is invalid.
+
+        """
+        actor = self.get_magic_actor()
+        if actor is None:
+            return True
+
+        if tick != self.params['magic']['tick']:
+            return False
+
+        self.is_check_failed = saver.is_visible(actor)
+        return True
+
     def clear(self):
-        """Destroy all the actors in the scene"""
-        for k, v in self.actors.items():
-            v.actor_destroy()
+        """Release all the actors in the scene to the actors pool
+
+        The actors are reused by the next scenes instead of being
+        destroyed and spawned again (see tools.actor_pool).
+
+        """
+        for actors in self.get_unreal_actors().values():
+            for actor in actors:
+                release_actor(actor)
         self.actors = {}
 
     def get_ignored_actors(self):
@@ -100,6 +132,18 @@ class Scene(object):
             pass
         return []
 
+    def get_unreal_actors(self):
+        """Return the Unreal Engine actors of each actor in the scene
+
+        Return a dict (name -> list of actors), the walls being made of
+        3 actors.
+
+        """
+        return {
+            k: ([v.front.get_actor(), v.right.get_actor(), v.left.get_actor()]
+                if k == 'walls' else [v.get_actor()])
+            for k, v in self.actors.items()}
+
     def get_status(self):
         """Return the current status of each moving actor in the scene"""
         return {k: v.get_status() for k, v in self.get_moving_actors().items()}
@@ -119,8 +163,8 @@ class Scene(object):
         check run failed.
 
         """
-        # TODO
-        return True
+        # TODO forbidden hits
+        return not self.is_check_failed
 
     def is_check_run(self):
         """Return True if the current run is a check, False otherwise"""
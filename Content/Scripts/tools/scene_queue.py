@@ -0,0 +1,100 @@
+"""Provide the scenes to be rendered by the director
+
+The scenes are given to the director either as a static list
+(SceneList) or through a queue shared by several game instances
+(SceneQueue). In both cases the director pops scenes specifications
+(as returned by tools.scenes_json.expand_scenes) along with their
+global index, until no more scene is available.
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game.
+
+"""
+
+import fcntl
+import json
+import os
+
+
+class SceneList:
+    """A static list of scenes, popped in order
+
+    Parameters
+    ----------
+    scenes : list
+        The list of scenes specifications to render.
+    subset : list of int, optional
+        When specified, only the scenes at those indices in `scenes`
+        are popped. Default is to pop all the scenes.
+
+    """
+    def __init__(self, scenes, subset=None):
+        self._scenes = scenes
+        self._subset = list(range(len(scenes))) if subset is None else subset
+        self._next = 0
+
+    def __len__(self):
+        """Return the total number of scenes"""
+        return len(self._scenes)
+
+    def pop(self):
+        """Return the pair (index, scene) of the next scene or None"""
+        if self._next >= len(self._subset):
+            return None
+
+        index = self._subset[self._next]
+        self._next += 1
+        return index, self._scenes[index]
+
+
+class SceneQueue:
+    """A queue of scenes shared by concurrent game instances
+
+    The queue is made of two files: `filename` stores the list of
+    scenes specifications and `filename`.cursor stores the index of
+    the next scene to be rendered. The cursor is protected by a file
+    lock so that each scene is popped by a single game instance.
+
+    Parameters
+    ----------
+    filename : str
+        The queue file, as written by SceneQueue.create().
+
+    """
+    def __init__(self, filename):
+        self._cursor = filename + '.cursor'
+        self._scenes = json.load(open(filename, 'r'))
+
+        if not os.path.isfile(self._cursor):
+            raise ValueError(f'queue cursor not found: {self._cursor}')
+
+    @classmethod
+    def create(cls, filename, scenes):
+        """Write a new queue of `scenes` in `filename` and return it"""
+        with open(filename, 'w') as fout:
+            fout.write(json.dumps(scenes))
+
+        with open(filename + '.cursor', 'w') as fout:
+            fout.write('0')
+
+        return cls(filename)
+
+    def __len__(self):
+        """Return the total number of scenes"""
+        return len(self._scenes)
+
+    def pop(self):
+        """Return the pair (index, scene) of the next scene or None"""
+        with open(self._cursor, 'r+') as fcursor:
+            fcntl.flock(fcursor, fcntl.LOCK_EX)
+            try:
+                index = int(fcursor.read())
+                if index >= len(self._scenes):
+                    return None
+
+                fcursor.seek(0)
+                fcursor.write(str(index + 1))
+                fcursor.truncate()
+                return index, self._scenes[index]
+            finally:
+                fcntl.flock(fcursor, fcntl.LOCK_UN)
@@ -0,0 +1,144 @@
+"""Parse the JSON file defining the scenes to be generated
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game.
+
+"""
+
+import json
+
+
+# The scenarios implemented in scenario.factory, along with the number
+# of check runs of their occluded test scenes (the visible test scenes
+# have no check). This must be kept consistent with the scenario
+# classes.
+SCENARIOS = {'O1': 1}
+
+# the prefixes of the scenarios keys, 'block_' being the legacy one
+# (see Exemples/config.json)
+SCENARIO_PREFIXES = ('scenario_', 'block_')
+
+# the test conditions, for both visible and occluded test scenes
+CONDITIONS = ('static', 'dynamic_1', 'dynamic_2')
+
+
+def load_scenes_json(scenes_json):
+    """Return the list of scenes defined in the JSON file `scenes_json`"""
+    return expand_scenes(json.loads(open(scenes_json, 'r').read()))
+
+
+def expand_scenes(scenes_dict):
+    """Return the list of scenes defined in `scenes_dict`
+
+    Parameters
+    ----------
+    scenes_dict : dict
+        The scenes to render, as loaded from a JSON file. For an
+        exemple of such a file, see intphys/Exemples/exemple.json.
+        Defines a number of train and test scenes to execute for each
+        scenario.
+
+    Returns
+    -------
+    A list of scenes specifications, each one being a dict with the
+    following keys: 'scenario' (e.g. 'O1'), 'is_train', 'is_occluded',
+    'is_static' and 'ntricks'. Those specifications can be
+    serialized to JSON, the scenario instances are built from them
+    by the game.
+
+    Raises
+    ------
+    ValueError if `scenes_dict` is not valid, see validate_scenes().
+
+    """
+    validate_scenes(scenes_dict)
+    scenes = []
+
+    # iterate on the scenarii defined in the dict
+    for scenario, cases in scenes_dict.items():
+        # 'scenario_O1' or 'block_O1' -> 'O1'
+        scenario = scenario.split('_', 1)[1]
+
+        for k, v in cases.items():
+            # train case, v is the number of scenes to generate
+            if 'train' in k:
+                scenes += [
+                    {'scenario': scenario, 'is_train': True,
+                     'is_occluded': False, 'is_static': True, 'ntricks': 1}
+                    for _ in range(v)]
+
+            # test scenes in the form 'test_visible' or 'test_occluded'
+            else:
+                is_occluded = 'occluded' in k
+                for condition, nscenes in v.items():
+                    # condition is 'static', 'dynamic_1' or 'dynamic_2'
+                    scenes += [
+                        {'scenario': scenario, 'is_train': False,
+                         'is_occluded': is_occluded,
+                         'is_static': 'static' in condition,
+                         'ntricks': 2 if condition.endswith('2') else 1}
+                        for _ in range(nscenes)]
+
+    return scenes
+
+
+def validate_scenes(scenes_dict):
+    """Raise ValueError if `scenes_dict` is not a valid scenes definition
+
+    The `scenes_dict` must be in the form {'scenario_<name>': {'train':
+    int, 'test_visible': {condition: int}, 'test_occluded':
+    {condition: int}}} where <name> is in SCENARIOS, condition is in
+    CONDITIONS and the int are non-negative numbers of scenes. Each
+    scenario can define only a part of the train and test keys. The
+    legacy 'block_<name>' keys are accepted as well.
+
+    """
+    def check_count(key, value):
+        if type(value) is not int or value < 0:
+            raise ValueError(
+                f'{key}: number of scenes must be a non-negative '
+                f'integer, it is {value}')
+
+    if not isinstance(scenes_dict, dict):
+        raise ValueError('scenes must be defined in a JSON dictionary')
+
+    for scenario, cases in scenes_dict.items():
+        name = scenario.split('_', 1)[-1]
+        if (not scenario.startswith(SCENARIO_PREFIXES)
+                or name not in SCENARIOS):
+            raise ValueError(
+                f'unknown scenario {scenario}, choose in '
+                f'{", ".join("scenario_" + s for s in SCENARIOS)}')
+
+        if not isinstance(cases, dict):
+            raise ValueError(f'{scenario}: must be a dictionary')
+
+        for case, value in cases.items():
+            key = f'{scenario}/{case}'
+            if case == 'train':
+                check_count(key, value)
+            elif case in ('test_visible', 'test_occluded'):
+                if not isinstance(value, dict):
+                    raise ValueError(f'{key}: must be a dictionary')
+                for condition, nscenes in value.items():
+                    if condition not in CONDITIONS:
+                        raise ValueError(
+                            f'{key}: unknown condition {condition}, '
+                            f'choose in {", ".join(CONDITIONS)}')
+                    check_count(f'{key}/{condition}', nscenes)
+            else:
+                raise ValueError(
+                    f'{scenario}: unknown case {case}, choose in '
+                    f'train, test_visible, test_occluded')
+
+
+def get_nchecks(scene):
+    """Return the number of check runs of a `scene` specification"""
+    if scene['is_train'] or not scene['is_occluded']:
+        return 0
+    return SCENARIOS[scene['scenario']]
+
+
+def get_nruns(scene):
+    """Return the number of runs, checks included, of a `scene`"""
+    return 1 if scene['is_train'] else 4 + get_nchecks(scene)
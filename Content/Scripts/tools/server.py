@@ -0,0 +1,133 @@
+"""Receive batches of scenes to render on a local socket
+
+In daemon mode the game stays alive once all its scenes are rendered
+and waits for new batches of scenes submitted by `intphys.py submit`
+on a UNIX socket. This avoids the Unreal Engine startup (shaders and
+map loading) for each new job.
+
+A client sends a single JSON message terminated by a newline and
+receives a JSON answer. The message is either a batch of scenes
+{'scenes': dict, 'output_dir': str, 'seed': int, 'resume': bool}
+where 'scenes' is in the format of a scenes JSON file and the other
+keys are optional, or the {'command': 'stop'} message asking the game
+to exit once the current batch is done.
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game.
+
+"""
+
+import json
+import os
+import socket
+
+
+class SceneServer:
+    """A non-blocking server receiving batches of scenes
+
+    The server never blocks the game's loop: the poll() method must be
+    called periodically (e.g. at each game's tick) to accept the
+    connections and read the submitted messages.
+
+    Parameters
+    ----------
+    path : str
+        The path to the UNIX socket to listen on, an existing socket
+        file is replaced.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        self._socket.listen()
+        self._socket.setblocking(False)
+
+        # the connected clients with their pending data
+        self._clients = {}
+
+    def close(self):
+        """Close the connections and remove the socket file"""
+        for client in self._clients:
+            client.close()
+        self._clients = {}
+        self._socket.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def poll(self):
+        """Return the list of messages received since the last call"""
+        # accept the new connections
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except BlockingIOError:
+                break
+            client.setblocking(False)
+            self._clients[client] = b''
+
+        # read the available data from the connected clients
+        messages = []
+        for client in list(self._clients):
+            try:
+                data = client.recv(65536)
+            except BlockingIOError:
+                continue
+
+            self._clients[client] += data
+            if not data or self._clients[client].endswith(b'\n'):
+                message = self._clients.pop(client)
+                messages.append(self._answer(client, message))
+
+        return [m for m in messages if m is not None]
+
+    @staticmethod
+    def _answer(client, message):
+        """Parse a `message` received from `client` and answer it
+
+        Return the parsed message, or None if it is not valid.
+
+        """
+        try:
+            message = json.loads(message.decode('utf8'))
+            if 'scenes' not in message and 'command' not in message:
+                raise ValueError('no scenes nor command in message')
+            answer = {'status': 'accepted'}
+        except ValueError as err:
+            message = None
+            answer = {'status': 'rejected', 'error': str(err)}
+
+        try:
+            client.setblocking(True)
+            client.sendall((json.dumps(answer) + '\n').encode('utf8'))
+        except OSError:
+            pass
+        finally:
+            client.close()
+
+        return message
+
+
+def submit(path, message, timeout=60):
+    """Send a `message` to the SceneServer listening on `path`
+
+    Return the server's answer as a dict. Raise OSError if the server
+    cannot be reached.
+
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall((json.dumps(message) + '\n').encode('utf8'))
+
+        answer = b''
+        while not answer.endswith(b'\n'):
+            data = client.recv(4096)
+            if not data:
+                break
+            answer += data
+
+    return json.loads(answer.decode('utf8'))
@@ -0,0 +1,312 @@
+"""Encode and decode the status of a run
+
+The status of a run is a dict {'header', 'frames'}: the header
+describes the static actors, the camera and the scenario (see
+tools.scene.Scene.get_status_header) and the frames list the status
+of the moving actors at each captured image, as dicts (actor name ->
+actor status). It is saved in one of the STATUS_FORMATS:
+
+- 'json' is the 'status.json' file written with an indentation of 4
+  spaces, readable but large,
+- 'compact' is the same JSON without whitespaces,
+- 'jsonl' is the 'status.jsonl' file, in JSON lines: the header on
+  the first line as {'header': header} and then one frame per line,
+- 'columnar' is a compact 'status.json' file where the frames are
+  stored per actor and per field, as {'header', 'layout':
+  'columnar', 'nframes', 'constants', 'columns'}. The nested dicts
+  of the actors status are flattened ('location' -> 'location.x',
+  'location.y', ...), the fields constant over the run (name, mesh,
+  mass, ...) are stored once in 'constants' as {actor: {field:
+  value}} and the other ones in 'columns' as {actor: {field: [value
+  of each frame]}}, null when an actor is missing from a frame.
+
+The StatusWriter encodes the frames as they are captured, so that
+the status of a run is never held as a tree of dicts nor as a whole
+string in memory: the 'compact' and 'jsonl' frames are appended to a
+file as they are encoded, only the 'columnar' accumulators are kept
+in memory. The statuses are read back in any format with
+decode_status, and as numpy arrays with get_columns (see also
+tools.dataset.load_status).
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game.
+
+"""
+
+import json
+import os
+import tempfile
+
+
+# the formats of the status, from the legacy one
+STATUS_FORMATS = ('json', 'compact', 'jsonl', 'columnar')
+
+# the status filename for each format
+STATUS_FILENAMES = {
+    'json': 'status.json',
+    'compact': 'status.json',
+    'jsonl': 'status.jsonl',
+    'columnar': 'status.json'}
+
+_COMPACT = {'separators': (',', ':')}
+
+
+def _flatten(status):
+    """Yield the (field, value) of an actor status, one level deep"""
+    for key, value in status.items():
+        if isinstance(value, dict) and value:
+            for subkey, subvalue in value.items():
+                yield f'{key}.{subkey}', subvalue
+        else:
+            yield key, value
+
+
+class StatusWriter:
+    """Encode the status of a run frame after frame
+
+    Parameters
+    ----------
+    format : str, optional
+        The format of the status, in STATUS_FORMATS. Default to
+        'json'.
+    directory : str, optional
+        The directory of the run. If it exists, the 'compact' and
+        'jsonl' frames are appended to a partial file in it as they
+        are encoded, else to a temporary file. The partial file is
+        removed by close().
+
+    Attributes
+    ----------
+    header : dict
+        The header of the status, set before writing it.
+    nframes : int
+        The number of frames appended.
+
+    """
+    def __init__(self, format='json', directory=None):
+        if format not in STATUS_FORMATS:
+            raise ValueError(
+                f'status format must be in {", ".join(STATUS_FORMATS)}, '
+                f'it is {format}')
+        self.format = format
+        self.header = {}
+        self.nframes = 0
+
+        # the 'json' frames are kept as dicts to be indented, the
+        # 'compact' and 'jsonl' ones are encoded on append to
+        # self._file (opened on the first frame) and the 'columnar'
+        # ones are stored as (actor -> field -> values)
+        self._frames = []
+        self._columns = {}
+        self._directory = directory
+        self._file = None
+        self._partname = None
+
+    @property
+    def filename(self):
+        """The name of the status file"""
+        return STATUS_FILENAMES[self.format]
+
+    def append(self, frame):
+        """Append the status of the moving actors at the next frame"""
+        if self.format == 'json':
+            self._frames.append(frame)
+        elif self.format in ('compact', 'jsonl'):
+            if self._file is None:
+                self._open()
+            frame = json.dumps(frame, **_COMPACT)
+            if self.format == 'jsonl':
+                self._file.write(frame + '\n')
+            else:
+                self._file.write(frame if self.nframes == 0 else ',' + frame)
+        else:
+            for actor, status in frame.items():
+                columns = self._columns.setdefault(actor, {})
+                for field, value in _flatten(status):
+                    columns.setdefault(
+                        field, [None] * self.nframes).append(value)
+
+            # pad the fields missing from this frame
+            for columns in self._columns.values():
+                for values in columns.values():
+                    if len(values) == self.nframes:
+                        values.append(None)
+        self.nframes += 1
+
+    def _open(self):
+        """Open the file where the encoded frames are appended"""
+        if self._directory is not None and os.path.isdir(self._directory):
+            self._partname = os.path.join(
+                self._directory, self.filename + '.part')
+            self._file = open(self._partname, 'w+')
+        else:
+            self._file = tempfile.TemporaryFile('w+')
+
+    def _iterframes(self):
+        """Yield the encoded frames from their file, by chunks"""
+        if self._file is None:
+            return
+        self._file.flush()
+        self._file.seek(0)
+        yield from iter(lambda: self._file.read(1 << 16), '')
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        """Close and remove the file of the encoded frames, if any"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._partname is not None:
+            if os.path.isfile(self._partname):
+                os.remove(self._partname)
+            self._partname = None
+
+    def iterencode(self):
+        """Yield the encoded status as strings, to be concatenated"""
+        if self.format == 'json':
+            yield from json.JSONEncoder(indent=4).iterencode(
+                {'header': self.header, 'frames': self._frames})
+        elif self.format == 'compact':
+            yield '{"header":'
+            yield json.dumps(self.header, **_COMPACT)
+            yield ',"frames":['
+            yield from self._iterframes()
+            yield ']}'
+        elif self.format == 'jsonl':
+            yield json.dumps({'header': self.header}, **_COMPACT) + '\n'
+            yield from self._iterframes()
+        else:
+            constants, columns = {}, {}
+            for actor, fields in self._columns.items():
+                for field, values in fields.items():
+                    if (None not in values
+                            and all(v == values[0] for v in values)):
+                        constants.setdefault(actor, {})[field] = values[0]
+                    else:
+                        columns.setdefault(actor, {})[field] = values
+            yield from json.JSONEncoder(**_COMPACT).iterencode({
+                'header': self.header, 'layout': 'columnar',
+                'nframes': self.nframes, 'constants': constants,
+                'columns': columns})
+
+    def encode(self):
+        """Return the encoded status as UTF-8 bytes"""
+        return ''.join(self.iterencode()).encode('utf8')
+
+    def write(self, directory):
+        """Write the status file in `directory`, return its path"""
+        filename = os.path.join(directory, self.filename)
+        with open(filename, 'w') as fout:
+            for chunk in self.iterencode():
+                fout.write(chunk)
+        return filename
+
+
+def _loads(data, lines=False):
+    """Return the raw status encoded in `data` (str or bytes)
+
+    With `lines` the status is in the 'jsonl' format, it is then
+    returned in the legacy layout {'header', 'frames'}.
+
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf8')
+
+    if not lines:
+        return json.loads(data)
+
+    data = data.splitlines()
+    return {
+        'header': json.loads(data[0])['header'] if data else {},
+        'frames': [json.loads(line) for line in data[1:] if line]}
+
+
+def decode_status(data, lines=False):
+    """Return the status encoded in `data` as {'header', 'frames'}
+
+    The status is encoded in any of the STATUS_FORMATS, `lines` must
+    be True for the 'jsonl' format.
+
+    Raises
+    ------
+    ValueError
+        If the status cannot be decoded.
+
+    """
+    status = _loads(data, lines)
+    if status.get('layout') != 'columnar':
+        return status
+
+    # the flattened fields are split once per actor, the constant
+    # ones set in all the frames
+    frames = [{} for _ in range(status['nframes'])]
+    constants, columns = status['constants'], status['columns']
+    for actor in {**constants, **columns}:
+        fields = [
+            (*field.partition('.')[::2], [value] * len(frames))
+            for field, value in constants.get(actor, {}).items()]
+        fields += [
+            (*field.partition('.')[::2], values)
+            for field, values in columns.get(actor, {}).items()]
+
+        for index, frame in enumerate(frames):
+            actor_status = {}
+            for key, subkey, values in fields:
+                value = values[index]
+                if value is None:
+                    continue
+                if subkey:
+                    actor_status.setdefault(key, {})[subkey] = value
+                else:
+                    actor_status[key] = value
+            if actor_status:
+                frame[actor] = actor_status
+
+    return {'header': status['header'], 'frames': frames}
+
+
+def get_columns(data, lines=False):
+    """Return the frames of the status encoded in `data` as arrays
+
+    The status is encoded in any of the STATUS_FORMATS, `lines` must
+    be True for the 'jsonl' format. This requires numpy.
+
+    Returns
+    -------
+    header : dict
+        The header of the status.
+    columns : dict
+        The value of each field of each actor over the frames, as
+        (actor -> field -> numpy.ndarray of length nframes). The nested
+        fields are flattened ('location.x', ...), the numeric fields
+        are float arrays, NaN when an actor is missing from a frame.
+
+    """
+    import numpy
+
+    status = _loads(data, lines)
+    if status.get('layout') == 'columnar':
+        nframes = status['nframes']
+        fields = {
+            actor: {field: [value] * nframes for field, value in c.items()}
+            for actor, c in status['constants'].items()}
+        for actor, c in status['columns'].items():
+            fields.setdefault(actor, {}).update(c)
+    else:
+        # transpose the frames into columns, as in StatusWriter
+        writer = StatusWriter('columnar')
+        for frame in status['frames']:
+            writer.append(frame)
+        fields = writer._columns
+
+    columns = {}
+    for actor, c in fields.items():
+        columns[actor] = {}
+        for field, values in c.items():
+            if all(isinstance(v, (int, float, type(None))) for v in values):
+                values = [numpy.nan if v is None else v for v in values]
+                columns[actor][field] = numpy.asarray(values, dtype=float)
+            else:
+                columns[actor][field] = numpy.asarray(values, dtype=object)
+
+    return status['header'], columns
@@ -0,0 +1,165 @@
+"""Report the progress of the rendering as machine-readable events
+
+The director writes an event for each step of the rendering (scene
+and run start and end, capture and save times, retries) to a JSON
+lines file, which is read back by intphys.py to display the frames
+per second, scenes per hour and remaining time of each job.
+
+Each event is a JSON dict with at least the 'event' name and the time
+'t' at which it occured (in seconds since epoch). The events are:
+
+- start: {'nscenes', 'resolution'}, the director starts a list of
+  scenes, of `nscenes` scenes in total (including the ones of other
+  jobs), rendered at a given resolution ('<width>x<height>')
+- scene_start: {'index', 'attempt'}
+- scene_skip: {'index'}, the scene is already saved (resume mode)
+- scene_retry: {'index', 'attempt'}, the scene failed a check
+- run_start: {'index', 'run'}
+- run_end: {'index', 'run', 'nframes', 'capture_time', 'pause_ticks',
+  'game_time'}, the run's start was paused `pause_ticks` ticks waiting
+  for the assets to be streamed in, the run lasted `game_time` seconds
+  of game's time
+- save: {'index', 'run', 'save_time'}, the run is handed to the
+  background writer
+- saved: {'directory', 'convert_time', 'encode_time', 'write_time',
+  'total_time'}, the run is written to disk (see SAVE_STAGES)
+- scene_end: {'index'}
+- end: {}, all the scenes are rendered
+
+This module does not depend on the Unreal Engine so it can be used
+from intphys.py as well as from the game.
+
+"""
+
+import json
+import os
+import time
+
+
+# the stages of a run saving: the conversion of depth and masks to
+# images, the PNG encoding and the disk writing, cumulated over the
+# writer threads, and the elapsed time
+SAVE_STAGES = ('convert', 'encode', 'write', 'total')
+
+
+class Telemetry:
+    """Write the rendering events to a JSON lines file
+
+    Parameters
+    ----------
+    filename : str, optional
+        The file to append the events to. When not specified, the
+        events are discarded.
+
+    """
+    def __init__(self, filename=None):
+        # line buffered so that each event is readable once emitted
+        self._file = (
+            None if filename is None else open(filename, 'a', buffering=1))
+
+    def emit(self, event, **fields):
+        """Write the `event` along with its `fields`"""
+        if self._file is not None:
+            fields.update({'event': event, 't': time.time()})
+            self._file.write(json.dumps(fields) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Progress:
+    """Follow the rendering progress of a job from its telemetry file
+
+    Parameters
+    ----------
+    filename : str
+        The telemetry file written by the job, it may not exist yet.
+        When it exists, the events already written are ignored. When
+        None, no progress is reported.
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+        # the number of scenes rendered, skipped and retried, the
+        # number of frames captured
+        self.nrendered = 0
+        self.nskipped = 0
+        self.nretries = 0
+        self.nframes = 0
+
+        # the number of runs saved and the time spent in each stage
+        # of the saving
+        self.nsaved = 0
+        self.save_times = {stage: 0 for stage in SAVE_STAGES}
+
+        # the time of the first and last events received
+        self.t_start = None
+        self.t_last = None
+        self.is_done = False
+
+        # the position in file and the last incomplete line read
+        self._offset = (
+            os.path.getsize(filename) if self._exists() else 0)
+        self._remainder = ''
+
+    def update(self):
+        """Read the events written since the last update"""
+        if not self._exists():
+            return
+
+        with open(self.filename, 'r') as fin:
+            fin.seek(self._offset)
+            data = self._remainder + fin.read()
+            self._offset = fin.tell()
+
+        lines = data.split('\n')
+        self._remainder = lines.pop()
+        for line in lines:
+            self._update(json.loads(line))
+
+    def _exists(self):
+        return self.filename is not None and os.path.isfile(self.filename)
+
+    def _update(self, event):
+        name = event['event']
+        if self.t_start is None:
+            self.t_start = event['t']
+        self.t_last = event['t']
+
+        if name == 'start':
+            self.is_done = False
+        elif name == 'scene_end':
+            self.nrendered += 1
+        elif name == 'scene_skip':
+            self.nskipped += 1
+        elif name == 'scene_retry':
+            self.nretries += 1
+        elif name == 'run_end':
+            self.nframes += event['nframes']
+        elif name == 'saved':
+            self.nsaved += 1
+            for stage in SAVE_STAGES:
+                self.save_times[stage] += event[f'{stage}_time']
+        elif name == 'end':
+            self.is_done = True
+
+    def elapsed(self):
+        """Return the elapsed time in seconds since the first event"""
+        if self.t_start is None:
+            return 0
+        return (self.t_last if self.is_done else time.time()) - self.t_start
+
+    def frames_per_second(self):
+        elapsed = self.elapsed()
+        return self.nframes / elapsed if elapsed else 0
+
+    def scenes_per_hour(self):
+        elapsed = self.elapsed()
+        return 3600 * self.nrendered / elapsed if elapsed else 0
+
+    def save_time_per_run(self, stage='total'):
+        """Return the mean time spent in a stage of the saving per run"""
+        return self.save_times[stage] / self.nsaved if self.nsaved else 0
@@ -2,7 +2,8 @@ class Tick:
     """Tick at a requested frequency within the main game loop
 
     This ticker responds each `tick_interval` ticks of the game's main
-    loop and return the tick count since it started ticking.
+    loop and return the tick count since it started ticking. It also
+    sums the game's time elapsed since then.
 
     """
     def __init__(self, tick_interval=2):
@@ -21,6 +22,9 @@ class Tick:
         # two variables to compute the intervals
         self._t_tick, self._t_last_tick = 0, 0
 
+        # the game's time elapsed while ticking, in seconds
+        self._time = 0
+
     def on_tick(self):
         """True when ticking, False otherwise"""
         return self._is_ticking and self._on_tick
@@ -38,11 +42,16 @@ class Tick:
         self._counter = 0
         self._t_tick = 0
         self._t_last_tick = 0
+        self._time = 0
 
     def get_count(self):
         """Return the number of ticks since the last reset"""
         return self._counter
 
+    def get_time(self):
+        """Return the game's time in seconds since the last reset"""
+        return self._time
+
     def tick(self, dt):
         """Tick at the requested interval"""
         if self._is_ticking and self._update(dt):
@@ -54,10 +63,12 @@ class Tick:
     def _update(self, dt):
         """Update the ticker, return True on tick, False otherwise
 
-        `dt` is not used here and is the time since the last tick.
+        `dt` is the game's time since the last tick, the interval is
+        counted in ticks whatever their duration.
 
         """
         self._t_tick += 1
+        self._time += dt
 
         if self._t_tick - self._t_last_tick >= self._tick_interval:
             self._t_last_tick = self._t_tick
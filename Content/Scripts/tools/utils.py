@@ -1,11 +1,12 @@
 """Defines general utility functions used by intphys"""
 
-import json
 import os
+import random
 
 import unreal_engine as ue
 from unreal_engine import FVector, FRotator
-from unreal_engine.classes import KismetSystemLibrary, GameplayStatics
+from unreal_engine.classes import (
+    KismetSystemLibrary, GameplayStatics, TimeStep)
 
 
 def as_dict(value):
@@ -62,6 +63,23 @@ def set_game_resolution(world, resolution):
     KismetSystemLibrary.ExecuteConsoleCommand(world, command)
 
 
+def set_game_timestep(mode, delta_seconds):
+    """Set how the game's time advances at each tick
+
+    `mode` is in tools.dataset.TIMESTEP_MODES: 'realtime' keeps the
+    engine's clock, 'fixed' advances the game by `delta_seconds` at
+    each tick and 'max-speed' does the same without vertical
+    synchronization nor frame rate limit.
+
+    """
+    if mode == 'realtime':
+        return
+
+    TimeStep.SetFixedTimeStep(delta_seconds)
+    if mode == 'max-speed':
+        TimeStep.SetMaxSpeed()
+
+
 def intphys_root_directory():
     """Return the absolute path to the intphys root directory"""
     # guess it from the evironment variable first, or from the
@@ -78,53 +96,38 @@ def intphys_root_directory():
     return os.path.abspath(root_dir)
 
 
-def parse_scenes_json(world, scenes_json):
-    """Return a list of scenarii to be generated by the director
+def get_scene_rng(seed, index, attempt=0):
+    """Return a random number generator dedicated to a scene
+
+    The generator is derived from the global `seed`, the scene's global
+    `index` and the `attempt` number (incremented each time a scene is
+    retried with new parameters). So the parameters of a scene do not
+    depend on the scenes rendered before it and a single scene can be
+    regenerated on its own.
+
+    """
+    return random.Random(f'{seed}/{index}/{attempt}')
+
+
+def get_scenario(scene):
+    """Return an instance of the scenario class defined by `scene`
 
     Parameters
     ----------
-    world : UE World
-        The game's world hosting the scenes's rendering
-    scenes_json : file
-        A JSON file defining the scenes to render. For an exemple of
-        such a file, see intphys/Exemples/exemple.json. Defines a
-        number of train and test scenes to execute for each scenario.
+    scene : dict
+        A scene specification, as returned by
+        tools.scenes_json.expand_scenes.
 
     Returns
     -------
-    A list of instances of scenario classes (derived from scenario.base.Base)
+    An instance of a scenario class (derived from scenario.base.Base)
 
     """
     from scenario.factory import get_train_scenario, get_test_scenario
 
-    # load the JSON as a dictionary
-    scenes_dict = json.loads(open(scenes_json, 'r').read())
-
-    # fill the scenes to render while parsing the dict
-    scenes = []
-
-    # iterate on the scenarii defined in the dict
-    for scenario, cases in scenes_dict.items():
-        # 'scenario_O1' -> 'O1'
-        scenario = scenario.split('_')[1]
-
-        for k, v in cases.items():
-            # train case, v is the number of scenes to generate
-            if 'train' in k:
-                nscenes = v
-                scenes += [get_train_scenario(scenario)
-                           for _ in range(nscenes)]
-
-            # test scenes in the form 'test_visible' or 'test_occluded'
-            else:
-                is_occluded = 'occluded' in k
-                for condition, nscenes in v.items():
-                    # condition is 'static', 'dynamic_1' or 'dynamic_2'
-                    is_static = 'static' in condition
-                    ntricks = 2 if condition.endswith('2') else 1
-                    scenes += [
-                        get_test_scenario(
-                            scenario, is_occluded, is_static, ntricks)
-                        for _ in range(nscenes)]
-
-    return scenes
+    if scene['is_train']:
+        return get_train_scenario(scene['scenario'])
+    else:
+        return get_test_scenario(
+            scene['scenario'], scene['is_occluded'],
+            scene['is_static'], scene['ntricks'])
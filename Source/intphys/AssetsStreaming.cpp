@@ -0,0 +1,24 @@
+// Fill out your copyright notice in the Description page of Project Settings.
+
+#include "AssetsStreaming.h"
+#include "ContentStreaming.h"
+
+
+bool UAssetsStreaming::WarmUp(const TArray<UMaterialInterface*>& Materials, float Timeout)
+{
+    for (UMaterialInterface* Material : Materials)
+    {
+        if (Material != nullptr)
+        {
+            Material->SetForceMipLevelsToBeResident(true, true, -1.0f);
+        }
+    }
+
+    return IStreamingManager::Get().StreamAllResources(FMath::Max(Timeout, 0.0f)) == 0;
+}
+
+
+int UAssetsStreaming::GetNumPendingResources()
+{
+    return IStreamingManager::Get().GetNumWantingResources();
+}
@@ -0,0 +1,33 @@
+// Fill out your copyright notice in the Description page of Project Settings.
+
+#pragma once
+
+#include "CoreMinimal.h"
+#include "Kismet/BlueprintFunctionLibrary.h"
+#include "Materials/MaterialInterface.h"
+#include "AssetsStreaming.generated.h"
+
+
+/**
+ * Exposes functions to Python for warming up the assets.
+ *
+ * The textures of the materials are streamed in by the engine after
+ * the materials are loaded, a capture taken before that shows blurry
+ * textures.
+ */
+UCLASS()
+class INTPHYS_API UAssetsStreaming : public UBlueprintFunctionLibrary
+{
+    GENERATED_BODY()
+
+public:
+    // Force the textures of the materials to stay resident and stream
+    // them in, waiting at most `Timeout` seconds. Return true if all
+    // the resources are streamed in
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static bool WarmUp(const TArray<UMaterialInterface*>& Materials, float Timeout = 10.0f);
+
+    // Return the number of resources still waiting to be streamed in
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static int GetNumPendingResources();
+};
@@ -1,6 +1,8 @@
 #include "Screenshot.h"
 
-#include "ImageUtils.h"
+#include "Async/Async.h"
+#include "Async/ParallelFor.h"
+#include "zlib.h"
 #include "Runtime/Core/Public/HAL/PlatformFilemanager.h"
 #include "Runtime/Core/Public/GenericPlatform/GenericPlatformMath.h"
 #include "Runtime/Engine/Classes/Kismet/GameplayStatics.h"
@@ -74,49 +76,169 @@ static FSceneView* GetSceneView(APlayerController* PlayerController, UWorld* Wor
 }
 
 
-FScreenshot::FScreenshot(const FIntVector& Size, AActor* OriginActor, bool Verbose)
-    : m_Size(Size), m_OriginActor(OriginActor), m_Verbose(Verbose), m_ImageIndex(0)
+FScreenshot::FCaptureBuffers::FCaptureBuffers(const FIntVector& Size, const FSaveOptions& Options)
 {
-    // allocate memory for storing images
-    m_Scene.SetNum(Size.Z);
-    for (auto& Image : m_Scene)
+    // allocate memory for storing images, none for the disabled streams
+    Scene.SetNum(Options.Streams[0] ? Size.Z : 0);
+    for (auto& Image : Scene)
         Image.SetNum(Size.X * Size.Y);
 
-    m_Depth.SetNum(Size.Z);
-    for (auto& Image : m_Depth)
-        Image.SetNum(Size.X * Size.Y);
+    FIntVector DepthSize = FScreenshot::GetStreamSize(Size, 1, Options);
+    Depth.SetNum(Options.Streams[1] ? Size.Z : 0);
+    for (auto& Image : Depth)
+        Image.SetNum(DepthSize.X * DepthSize.Y);
 
-    m_Masks.SetNum(Size.Z);
-    for (auto& Image : m_Masks)
-        Image.SetNum(Size.X * Size.Y);
+    FIntVector MasksSize = FScreenshot::GetStreamSize(Size, 2, Options);
+    Masks.SetNum(Options.Streams[2] ? Size.Z : 0);
+    for (auto& Image : Masks)
+        Image.SetNum(MasksSize.X * MasksSize.Y);
+}
+
+
+FScreenshot::FStreamedRun::FStreamedRun()
+    : FrameQueued(FPlatformProcess::GetSynchEventFromPool(false)),
+      FrameWritten(FPlatformProcess::GetSynchEventFromPool(false))
+{}
+
+
+FScreenshot::FStreamedRun::~FStreamedRun()
+{
+    FPlatformProcess::ReturnSynchEventToPool(FrameQueued);
+    FPlatformProcess::ReturnSynchEventToPool(FrameWritten);
+}
 
-    m_WriteBuffer.SetNum(Size.X * Size.Y);
-    m_CompressedWriteBuffer.SetNum(Size.X * Size.Y);
+
+FScreenshot::FScreenshot(
+    const FIntVector& Size, AActor* OriginActor, bool Verbose,
+    int AsyncSaves, const FSaveOptions& SaveOptions)
+    : m_Size(Size), m_OriginActor(OriginActor), m_Verbose(Verbose), m_ImageIndex(0), m_MaxDepth(0),
+      m_AsyncSaves(FMath::Max(AsyncSaves, 0)), m_SaveOptions(SaveOptions)
+{
+    m_SaveOptions.CompressionLevel = FMath::Clamp(m_SaveOptions.CompressionLevel, 0, 9);
+    m_SaveOptions.DepthStride = FMath::Max(m_SaveOptions.DepthStride, 1);
+    m_SaveOptions.MasksStride = FMath::Max(m_SaveOptions.MasksStride, 1);
+    m_SaveOptions.StreamQueue = FMath::Clamp(m_SaveOptions.StreamQueue, 0, m_Size.Z);
+
+    // in streaming mode, only the queued frames are stored
+    m_NumSlots = m_SaveOptions.StreamQueue > 0 ? m_SaveOptions.StreamQueue : m_Size.Z;
+    m_Buffers = FCaptureBuffersPtr(new FCaptureBuffers(
+        FIntVector(m_Size.X, m_Size.Y, m_NumSlots), m_SaveOptions));
 }
 
 
 FScreenshot::~FScreenshot()
-{}
+{
+    if (m_StreamedRun.IsValid())
+    {
+        EndStream().Wait();
+    }
+    WaitSaves();
+}
 
 
 void FScreenshot::SetOriginActor(AActor* Actor)
 {
     m_OriginActor = Actor;
+    m_RayOrigins.Empty();
+}
+
+
+void FScreenshot::SetActorsIds(const TMap<FString, uint8>& ActorsIds)
+{
+    m_ActorsIds = ActorsIds;
 }
 
 
-void FScreenshot::Reset()
+void FScreenshot::Reset(const FString& Directory)
 {
+    // discard the streamed run not saved, if any
+    if (m_StreamedRun.IsValid())
+    {
+        UE_LOG(LogTemp, Warning, TEXT("Discarding the run streamed to %s"), *m_StreamedRun->Directory);
+        EndStream().Wait();
+    }
+
     m_ImageIndex = 0;
+    m_MaxDepth = 0;
     m_ActorsSet.Empty();
     m_ActorsMap.Empty();
+    m_ActorsIndices.Empty();
+    m_RayOrigins.Empty();
 
-    for (auto& Image : m_Scene)
+    for (auto& Image : m_Buffers->Scene)
         Image.Init(FColor(), Image.Num());
-    for (auto& Image : m_Depth)
+    for (auto& Image : m_Buffers->Depth)
         Image.Init(0.0, Image.Num());
-    for (auto& Image : m_Masks)
+    for (auto& Image : m_Buffers->Masks)
         Image.Init(0, Image.Num());
+
+    if (m_SaveOptions.StreamQueue > 0 and not Directory.IsEmpty())
+    {
+        BeginStream(Directory);
+    }
+}
+
+
+uint FScreenshot::GetSlot() const
+{
+    return m_ImageIndex % m_NumSlots;
+}
+
+
+void FScreenshot::CreateDirectories(const FString& Directory) const
+{
+    // Create the subdirectories where to write the PNGs, or the
+    // directory of the packed file
+    VerifyOrCreateDirectory(Directory);
+    if (m_SaveOptions.bPack)
+    {
+        return;
+    }
+
+    for (uint Stream = 0; Stream < 3; ++Stream)
+    {
+        // raw depth is written in a single file
+        if (not m_SaveOptions.Streams[Stream] or
+            (Stream == 1 and m_SaveOptions.DepthFormat != EDepthFormat::Png))
+        {
+            continue;
+        }
+
+        FString SubDirectory = FPaths::Combine(Directory, GetStreamName(Stream));
+        VerifyOrCreateDirectory(SubDirectory);
+    }
+}
+
+
+void FScreenshot::BeginStream(const FString& Directory)
+{
+    CreateDirectories(Directory);
+
+    FStreamedRunPtr Run(new FStreamedRun());
+    Run->Directory = Directory;
+    Run->Buffers = m_Buffers;
+
+    FIntVector Size = m_Size;
+    FSaveOptions Options = m_SaveOptions;
+    m_StreamedRun = Run;
+    m_StreamedResult = Async<FSaveResult>(
+        EAsyncExecution::Thread,
+        [Run, Size, Options]()
+        {
+            return FScreenshot::WriteStream(*Run, Size, Options);
+        });
+}
+
+
+TFuture<FScreenshot::FSaveResult> FScreenshot::EndStream()
+{
+    FStreamedFrame End;
+    End.Index = -1;
+    m_StreamedRun->Frames.Enqueue(End);
+    m_StreamedRun->FrameQueued->Trigger();
+    m_StreamedRun.Reset();
+
+    return MoveTemp(m_StreamedResult);
 }
 
 
@@ -133,8 +255,34 @@ bool FScreenshot::Capture(const TArray<AActor*>& IgnoredActors)
         return false;
     }
 
-    bool bDone1 = FScreenshot::CaptureScene();
-    bool bDone2 = FScreenshot::CaptureDepthAndMasks(IgnoredActors);
+    // in streaming mode, wait for a free slot in the queue
+    if (m_StreamedRun.IsValid())
+    {
+        while (m_StreamedRun->NumQueued.GetValue() >= m_NumSlots)
+        {
+            m_StreamedRun->FrameWritten->Wait();
+        }
+    }
+
+    const bool* Streams = m_SaveOptions.Streams;
+    bool bDone1 = not Streams[0] or FScreenshot::CaptureScene();
+    bool bDone2 = not (Streams[1] or Streams[2]) or FScreenshot::CaptureDepthAndMasks(IgnoredActors);
+
+    // push the frame to the writer
+    if (m_StreamedRun.IsValid())
+    {
+        FStreamedFrame Frame;
+        Frame.Index = m_ImageIndex;
+        if (Streams[2])
+        {
+            TMap<FString, uint8> ActorsMap;
+            ComputeMasksColors(ActorsMap, Frame.ColorMap);
+        }
+
+        m_StreamedRun->NumQueued.Increment();
+        m_StreamedRun->Frames.Enqueue(MoveTemp(Frame));
+        m_StreamedRun->FrameQueued->Trigger();
+    }
 
     // Update the counter
     m_ImageIndex++;
@@ -145,37 +293,159 @@ bool FScreenshot::Capture(const TArray<AActor*>& IgnoredActors)
 
 bool FScreenshot::Save(const FString& Directory, float& OutMaxDepth, TMap<FString, uint8>& OutActorsMap)
 {
-    // Create the subdirectories where to write the PNGs
-    for (const auto& Name : {TEXT("scene"), TEXT("masks"), TEXT("depth")})
+    bool bStreamed = m_StreamedRun.IsValid();
+    if (bStreamed and m_StreamedRun->Directory != Directory)
     {
-        FString SubDirectory = FPaths::Combine(Directory, FString(Name));
-        VerifyOrCreateDirectory(SubDirectory);
+        UE_LOG(LogTemp, Error, TEXT("Run streamed to %s, cannot save it to %s"),
+               *m_StreamedRun->Directory, *Directory);
+        return false;
     }
 
-    // Save the images
-    bool bScene = SaveScene(FPaths::Combine(Directory, FString("scene")));
-    bool bMasks = SaveMasks(FPaths::Combine(Directory, FString("masks")), OutActorsMap);
-    bool bDepth = SaveDepth(FPaths::Combine(Directory, FString("depth")), OutMaxDepth);
+    if (not bStreamed)
+    {
+        CreateDirectories(Directory);
+    }
 
-    bool bDone = bScene and bMasks and bDepth;
-    if (not bDone)
+    // The global max depth, computed along the capture
+    OutMaxDepth = m_MaxDepth;
+
+    if (m_Verbose)
     {
-        UE_LOG(LogTemp, Error, TEXT("Failed to save captured images"));
+        UE_LOG(LogTemp, Log, TEXT("Max depth is %f"), OutMaxDepth);
     }
 
-    return bDone;
+    // The actors masks are needed by the status, compute them now
+    TMap<uint8, uint8> ColorMap;
+    ComputeMasksColors(OutActorsMap, ColorMap);
+
+    if (m_Verbose)
+    {
+        FString MasksStr;
+        for (auto& Elem : OutActorsMap)
+        {
+            MasksStr += FString::Printf(TEXT("(%s, %d) "), *Elem.Key, Elem.Value);
+        }
+        UE_LOG(LogTemp, Log, TEXT("Actors masks are %s"), *MasksStr);
+    }
+
+    // Bound the number of runs in memory: wait for the oldest save to
+    // complete if needed
+    while (m_PendingSaves.Num() > 0 and m_PendingSaves.Num() >= FMath::Max(m_AsyncSaves, 1))
+    {
+        m_PendingSaves[0].Result.Wait();
+        CollectSaves(false);
+    }
+
+    // Hand the captured images to a background writer, or let the
+    // streaming writer complete the run
+    FCaptureBuffersPtr Buffers = m_Buffers;
+    FIntVector Size = m_Size;
+    float MaxDepth = OutMaxDepth;
+    FSaveOptions Options = m_SaveOptions;
+
+    FPendingSave Pending;
+    Pending.Directory = Directory;
+    Pending.Buffers = Buffers;
+    if (bStreamed)
+    {
+        Pending.Result = EndStream();
+    }
+    else
+    {
+        Pending.Result = Async<FSaveResult>(
+            EAsyncExecution::ThreadPool,
+            [Buffers, Size, Directory, MaxDepth, ColorMap, Options]()
+            {
+                return FScreenshot::WriteRun(*Buffers, Size, Directory, MaxDepth, ColorMap, Options);
+            });
+    }
+    m_PendingSaves.Add(MoveTemp(Pending));
+
+    // Capture the next run in other buffers
+    m_Buffers = m_FreeBuffers.Num() > 0 ? m_FreeBuffers.Pop() : FCaptureBuffersPtr(new FCaptureBuffers(
+        FIntVector(m_Size.X, m_Size.Y, m_NumSlots), m_SaveOptions));
+
+    // In synchronous mode, wait for the images to be written
+    if (m_AsyncSaves == 0)
+    {
+        CollectSaves(true);
+        return m_FailedDirectories.Num() == 0;
+    }
+
+    return true;
+}
+
+
+int FScreenshot::PollSaves(TArray<FString>& OutSaved, TArray<FString>& OutFailed, TArray<float>& OutTimings)
+{
+    CollectSaves(false);
+
+    OutTimings.Empty(4 * m_SavedTimings.Num());
+    for (const auto& Timings : m_SavedTimings)
+    {
+        OutTimings.Append({Timings.Convert, Timings.Encode, Timings.Write, Timings.Total});
+    }
+
+    OutSaved = MoveTemp(m_SavedDirectories);
+    OutFailed = MoveTemp(m_FailedDirectories);
+    m_SavedDirectories.Empty();
+    m_FailedDirectories.Empty();
+    m_SavedTimings.Empty();
+
+    return m_PendingSaves.Num();
+}
+
+
+void FScreenshot::WaitSaves()
+{
+    CollectSaves(true);
+}
+
+
+void FScreenshot::CollectSaves(bool bWait)
+{
+    // collect the saves in order, stop at the first one not ready
+    while (m_PendingSaves.Num() > 0)
+    {
+        FPendingSave& Pending = m_PendingSaves[0];
+        if (bWait)
+        {
+            Pending.Result.Wait();
+        }
+        else if (not Pending.Result.IsReady())
+        {
+            break;
+        }
+
+        const FSaveResult& Result = Pending.Result.Get();
+        if (Result.bDone)
+        {
+            m_SavedDirectories.Add(Pending.Directory);
+            m_SavedTimings.Add(Result.Timings);
+        }
+        else
+        {
+            UE_LOG(LogTemp, Error, TEXT("Failed to save captured images to %s"), *Pending.Directory);
+            m_FailedDirectories.Add(Pending.Directory);
+        }
+
+        m_FreeBuffers.Add(Pending.Buffers);
+        m_PendingSaves.RemoveAt(0);
+    }
 }
 
 
 bool FScreenshot::IsActorInFrame(const AActor* Actor, const uint FrameIndex)
 {
-    if (FrameIndex >= m_ImageIndex)
+    // in streaming mode, only the last queued frames are in memory
+    if (FrameIndex >= m_ImageIndex or m_ImageIndex - FrameIndex > static_cast<uint>(m_NumSlots) or
+        m_Buffers->Masks.Num() == 0)
     {
         return false;
     }
 
-    uint8 ActorId = m_ActorsMap[Actor->GetName()];
-    return m_Masks[FrameIndex].Contains(ActorId);
+    const uint8* ActorId = m_ActorsMap.Find(Actor->GetName());
+    return ActorId and m_Buffers->Masks[FrameIndex % m_NumSlots].Contains(*ActorId);
 }
 
 
@@ -185,6 +455,80 @@ bool FScreenshot::IsActorInLastFrame(const AActor* Actor)
 }
 
 
+bool FScreenshot::IsActorVisible(const AActor* Actor)
+{
+    m_World = m_OriginActor->GetWorld();
+    if (Actor == nullptr or m_World == nullptr)
+    {
+        return false;
+    }
+
+    FSceneView* SceneView = GetSceneView(UGameplayStatics::GetPlayerController(m_OriginActor, 0), m_World);
+    if (SceneView == nullptr)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Screenshot: SceneView is null"));
+        return false;
+    }
+
+    // the rays are traced at full resolution, independently of the
+    // depth and masks strides, so that a partly visible actor is not
+    // missed. Only the pixels within the projection of the actor's
+    // bounds are traced, or the whole view if the bounds are partly
+    // behind the point of view
+    FIntRect Rect(0, 0, m_Size.X, m_Size.Y);
+    FVector Origin, Extent;
+    Actor->GetActorBounds(false, Origin, Extent);
+    FBox2D Projected(ForceInit);
+    bool bInFront = true;
+    for (int Corner = 0; Corner < 8 and bInFront; ++Corner)
+    {
+        FVector Point = Origin + Extent * FVector(
+            Corner & 1 ? 1.f : -1.f, Corner & 2 ? 1.f : -1.f, Corner & 4 ? 1.f : -1.f);
+        FVector2D Pixel;
+        bInFront = SceneView->WorldToPixel(Point, Pixel);
+        Projected += Pixel;
+    }
+
+    if (bInFront)
+    {
+        Rect.Min.X = FMath::Max(Rect.Min.X, FMath::FloorToInt(Projected.Min.X));
+        Rect.Min.Y = FMath::Max(Rect.Min.Y, FMath::FloorToInt(Projected.Min.Y));
+        Rect.Max.X = FMath::Min(Rect.Max.X, FMath::CeilToInt(Projected.Max.X) + 1);
+        Rect.Max.Y = FMath::Min(Rect.Max.Y, FMath::CeilToInt(Projected.Max.Y) + 1);
+    }
+
+    // the actor is out of the view
+    if (Rect.Width() <= 0 or Rect.Height() <= 0)
+    {
+        return false;
+    }
+
+    // trace the rows of the rectangle in parallel, until a ray hits
+    // the actor
+    FCollisionQueryParams CollisionQueryParams("ClickableTrace", false);
+    FThreadSafeBool bVisible(false);
+    ParallelFor(Rect.Height(), [&](int32 Row)
+    {
+        FHitResult HitResult;
+        FVector RayOrigin, RayDirection;
+        for (int x = Rect.Min.X; x < Rect.Max.X and not bVisible; ++x)
+        {
+            SceneView->DeprojectFVector2D(FVector2D(x, Rect.Min.Y + Row), RayOrigin, RayDirection);
+            bool bHit = m_World->LineTraceSingleByChannel(
+                HitResult, RayOrigin, RayOrigin + RayDirection * 1000000.f,
+                ECollisionChannel::ECC_Visibility, CollisionQueryParams);
+
+            if (bHit and HitResult.GetActor() == Actor)
+            {
+                bVisible = true;
+            }
+        }
+    });
+
+    return bVisible;
+}
+
+
 bool FScreenshot::CaptureScene()
 {
     TSharedPtr<SWindow> WindowPtr = GEngine->GameViewport->GetWindow();
@@ -192,12 +536,12 @@ bool FScreenshot::CaptureScene()
     {
         FIntVector OutSize;
         bool bDone = FSlateApplication::Get().TakeScreenshot(
-            WindowPtr.ToSharedRef(), m_Scene[m_ImageIndex], OutSize);
+            WindowPtr.ToSharedRef(), m_Buffers->Scene[GetSlot()], OutSize);
 
         // Force no transparency
         if (bDone)
         {
-            for (FColor& Pixel : m_Scene[m_ImageIndex])
+            for (FColor& Pixel : m_Buffers->Scene[GetSlot()])
             {
                 Pixel.A = 255;
             }
@@ -220,13 +564,11 @@ bool FScreenshot::CaptureDepthAndMasks(const TArray<AActor*>& IgnoredActors)
         CollisionQueryParams.AddIgnoredActor(Actor);
     }
 
-    // Intitialize world and scene view
+    // Intitialize world and the rays of the view
     m_World = m_OriginActor->GetWorld();
-    m_SceneView = GetSceneView(UGameplayStatics::GetPlayerController(m_OriginActor, 0), m_World);
-
-    if (m_World == NULL || m_SceneView == NULL)
+    if (not UpdateRays())
     {
-        UE_LOG(LogTemp, Error, TEXT("Screenshot: SceneView or World are null"));
+        return false;
     }
 
     // get the origin location and rotation for distance computation
@@ -234,55 +576,69 @@ bool FScreenshot::CaptureDepthAndMasks(const TArray<AActor*>& IgnoredActors)
     FVector OriginRot = FRotationMatrix(m_OriginActor->GetActorRotation()).GetScaledAxis(EAxis::X);
     OriginRot.Normalize();
 
-    // for each pixel of the view, cast a ray in the scene and get the
-    // resulting hit actor and hit distance
-    FHitResult HitResult;
-    for (int y = 0; y < m_Size.Y; ++y)
+    // for each traced pixel of the view, cast a ray in the scene and
+    // get the resulting hit actor and hit distance. The rows of pixels
+    // are traced in parallel, the depth and masks are computed from
+    // the hits once all the rays are traced.
+    m_TracedDepth.SetNumUninitialized(m_TraceSize.X * m_TraceSize.Y, false);
+    m_HitActors.SetNumUninitialized(m_TraceSize.X * m_TraceSize.Y, false);
+    ParallelFor(m_TraceSize.Y, [&](int32 y)
     {
-        for (int x = 0; x < m_Size.X; ++x)
-	{
-            FVector RayOrigin, RayDirection;
-            m_SceneView->DeprojectFVector2D(FVector2D(x, y), RayOrigin, RayDirection);
-
+        FHitResult HitResult;
+        for (int x = 0; x < m_TraceSize.X; ++x)
+        {
+            uint PixelIndex = y * m_TraceSize.X + x;
             bool bHit = m_World->LineTraceSingleByChannel(
-                HitResult, RayOrigin, RayOrigin + RayDirection * 1000000.f,
+                HitResult, m_RayOrigins[PixelIndex], m_RayEnds[PixelIndex],
                 ECollisionChannel::ECC_Visibility, CollisionQueryParams);
 
-            if(bHit)
+            if (bHit)
             {
-                uint PixelIndex = y * m_Size.X + x;
-
-                // compute depth
-                float HitDistance = FVector::DotProduct(HitResult.Location - OriginLoc, OriginRot);
-                m_Depth[m_ImageIndex][PixelIndex] = HitDistance;
+                m_TracedDepth[PixelIndex] = FVector::DotProduct(HitResult.Location - OriginLoc, OriginRot);
+                m_HitActors[PixelIndex] = HitResult.GetActor();
+            }
+            else
+            {
+                m_TracedDepth[PixelIndex] = 0;
+                m_HitActors[PixelIndex] = nullptr;
+            }
+        }
+    });
 
-                // compute mask
-                FString ActorName = HitResult.GetActor()->GetName();
-                int8 ActorIndex = static_cast<uint8>(m_ActorsSet.Add(ActorName).AsInteger() + 1);
-                m_ActorsMap.Add(ActorName, ActorIndex);
-                m_Masks[m_ImageIndex][PixelIndex] = ActorIndex;
+    // compute depth, the nearest traced pixel of each pixel
+    if (m_SaveOptions.Streams[1])
+    {
+        FIntVector DepthSize = GetStreamSize(m_Size, 1, m_SaveOptions);
+        FImageDepth& Depth = m_Buffers->Depth[GetSlot()];
+        for (int y = 0; y < DepthSize.Y; ++y)
+        {
+            for (int x = 0; x < DepthSize.X; ++x)
+            {
+                Depth[y * DepthSize.X + x] = m_TracedDepth[GetTracedIndex(x, y, m_SaveOptions.DepthStride)];
             }
         }
+        m_MaxDepth = FMath::Max(m_MaxDepth, FMath::Max(Depth));
     }
 
-    return true;
-}
-
-
-bool FScreenshot::SaveScene(const FString& Directory)
-{
-    for (uint i = 0; i < m_Size.Z; ++i)
+    // compute mask, neighbour pixels are mostly on the same actor
+    if (m_SaveOptions.Streams[2])
     {
-        // build the filename
-        FString FileIndex = FScreenshot::ZeroPadding(i+1);
-        FString Filename = FPaths::Combine(
-            Directory, FString::Printf(TEXT("scene_%s.png"), *FileIndex));
-
-        // write the image
-        bool bDone = FScreenshot::WritePng(m_Scene[i], Filename);
-        if (not bDone)
+        FIntVector MasksSize = GetStreamSize(m_Size, 2, m_SaveOptions);
+        FImageMasks& Masks = m_Buffers->Masks[GetSlot()];
+        const AActor* LastActor = nullptr;
+        uint8 LastIndex = 0;
+        for (int y = 0; y < MasksSize.Y; ++y)
         {
-            return false;
+            for (int x = 0; x < MasksSize.X; ++x)
+            {
+                const AActor* Actor = m_HitActors[GetTracedIndex(x, y, m_SaveOptions.MasksStride)];
+                if (Actor != LastActor)
+                {
+                    LastActor = Actor;
+                    LastIndex = Actor ? GetActorIndex(Actor) : 0;
+                }
+                Masks[y * MasksSize.X + x] = LastIndex;
+            }
         }
     }
 
@@ -290,68 +646,109 @@ bool FScreenshot::SaveScene(const FString& Directory)
 }
 
 
-bool FScreenshot::SaveDepth(const FString& Directory, float& OutMaxDepth)
+int FScreenshot::GetTracedIndex(int x, int y, int Stride) const
+{
+    // the traced pixel under the center of the pixel (x, y) of an
+    // image captured with `Stride`
+    int TracedX = FMath::Min((x * Stride + Stride / 2) / m_TraceStride, m_TraceSize.X - 1);
+    int TracedY = FMath::Min((y * Stride + Stride / 2) / m_TraceStride, m_TraceSize.Y - 1);
+    return TracedY * m_TraceSize.X + TracedX;
+}
+
+
+bool FScreenshot::UpdateRays()
 {
-    // Extract the global max depth
-    TArray<float> MaxDepthArray;
-    for (const auto& Image : m_Depth)
+    // the rays only depend on the point of view, they are computed
+    // again when it moves
+    FTransform Transform = m_OriginActor->GetActorTransform();
+    if (m_RayOrigins.Num() > 0 and Transform.Equals(m_RaysTransform))
     {
-        MaxDepthArray.Add(FMath::Max(Image));
+        return true;
     }
-    OutMaxDepth = FMath::Max(MaxDepthArray);
 
-    if (m_Verbose)
+    // the rays are traced at the finest stride of the captured depth
+    // and masks
+    uint TracedStream = not m_SaveOptions.Streams[2] or (
+        m_SaveOptions.Streams[1] and m_SaveOptions.DepthStride <= m_SaveOptions.MasksStride) ? 1 : 2;
+    m_TraceStride = TracedStream == 1 ? m_SaveOptions.DepthStride : m_SaveOptions.MasksStride;
+    m_TraceSize = GetStreamSize(m_Size, TracedStream, m_SaveOptions);
+
+    m_SceneView = GetSceneView(UGameplayStatics::GetPlayerController(m_OriginActor, 0), m_World);
+    if (m_World == NULL || m_SceneView == NULL)
     {
-        UE_LOG(LogTemp, Log, TEXT("Max depth is %f"), OutMaxDepth);
+        UE_LOG(LogTemp, Error, TEXT("Screenshot: SceneView or World are null"));
+        m_RayOrigins.Empty();
+        return false;
     }
 
-    for (uint i = 0; i < m_Size.Z; ++i)
+    m_RayOrigins.SetNumUninitialized(m_TraceSize.X * m_TraceSize.Y, false);
+    m_RayEnds.SetNumUninitialized(m_TraceSize.X * m_TraceSize.Y, false);
+    for (int y = 0; y < m_TraceSize.Y; ++y)
     {
-        // build the filename
-        FString FileIndex = FScreenshot::ZeroPadding(i+1);
-        FString Filename = FPaths::Combine(
-            Directory, FString::Printf(TEXT("depth_%s.png"), *FileIndex));
-
-        // normalize the depth in [0, 1] and cast to uint8
-        FImageDepth& Image = m_Depth[i];
-        for(uint j = 0; j < Image.Num(); ++j)
-        {
-            uint8 Pixel = static_cast<uint8>(Image[j] * 255.0 / OutMaxDepth);
-            m_WriteBuffer[j] = FColor(Pixel, Pixel, Pixel, 255);
-        }
-
-        // write the image
-        bool bDone = FScreenshot::WritePng(m_WriteBuffer, Filename);
-        if (not bDone)
+        for (int x = 0; x < m_TraceSize.X; ++x)
         {
-            return false;
+            uint PixelIndex = y * m_TraceSize.X + x;
+            FVector2D Pixel(x * m_TraceStride + m_TraceStride / 2, y * m_TraceStride + m_TraceStride / 2);
+            FVector RayDirection;
+            m_SceneView->DeprojectFVector2D(Pixel, m_RayOrigins[PixelIndex], RayDirection);
+            m_RayEnds[PixelIndex] = m_RayOrigins[PixelIndex] + RayDirection * 1000000.f;
         }
     }
+    m_RaysTransform = Transform;
 
     return true;
 }
 
 
-bool FScreenshot::SaveMasks(const FString& Directory, TMap<FString, uint8>& OutActorsMap)
+uint8 FScreenshot::GetActorIndex(const AActor* Actor)
+{
+    if (const uint8* Index = m_ActorsIndices.Find(Actor))
+    {
+        return *Index;
+    }
+
+    FString ActorName = Actor->GetName();
+    uint8 Index = static_cast<uint8>(m_ActorsSet.Add(ActorName).AsInteger() + 1);
+    m_ActorsMap.Add(ActorName, Index);
+    m_ActorsIndices.Add(Actor, Index);
+
+    return Index;
+}
+
+
+void FScreenshot::ComputeMasksColors(TMap<FString, uint8>& OutActorsMap, TMap<uint8, uint8>& OutColorMap) const
 {
     // build the (actors name -> gray level) and (actor id -> gray
     // level) mappings
     OutActorsMap.Empty(m_ActorsSet.Num() + 1);
     OutActorsMap.Add(FString(TEXT("Sky")), 0);
 
-    TMap<uint8, uint8> ColorMap;
-    ColorMap.Empty(m_ActorsSet.Num());
-    ColorMap.Add(0, 0);
+    OutColorMap.Empty(m_ActorsSet.Num());
+    OutColorMap.Add(0, 0);
 
     // merge all the wall actors to a single gray level
     uint8 WallColor = 0;
     for (const FString& ActorName : m_ActorsSet)
     {
+        // indexed masks: the actor's global id
+        if (m_SaveOptions.MasksFormat != EMasksFormat::Gray)
+        {
+            const uint8* Id = m_ActorsIds.Find(ActorName);
+            if (Id == nullptr and m_Verbose)
+            {
+                UE_LOG(LogTemp, Warning, TEXT("No mask id for actor %s"), *ActorName);
+            }
+
+            OutActorsMap.Add(ActorName, Id ? *Id : 255);
+            OutColorMap.Add(m_ActorsSet.FindId(ActorName).AsInteger() + 1, Id ? *Id : 255);
+            continue;
+        }
+
         // true if the actor is a wall
         bool bIsWall = ActorName.Contains(FString(TEXT("Wall")));
 
         // index of the actor in raw images (0 is for the sky)
-        auto Index = m_ActorsSet.Add(ActorName).AsInteger() + 1;
+        auto Index = m_ActorsSet.FindId(ActorName).AsInteger() + 1;
 
         // the grayscale color we will assign to that actor
         uint8 Color;
@@ -375,53 +772,703 @@ bool FScreenshot::SaveMasks(const FString& Directory, TMap<FString, uint8>& OutA
         }
 
         OutActorsMap.Add(ActorName, Color);
-        ColorMap.Add(Index, Color);
+        OutColorMap.Add(Index, Color);
     }
+}
 
-    if (m_Verbose)
+
+FScreenshot::FSaveResult FScreenshot::WriteRun(
+    const FCaptureBuffers& Buffers, const FIntVector& Size, const FString& Directory,
+    float MaxDepth, const TMap<uint8, uint8>& ColorMap, const FSaveOptions& Options)
+{
+    double StartTime = FPlatformTime::Seconds();
+
+    // the scene, depth and masks images are distributed over the
+    // workers, each one with its own buffers and timings
+    uint NImages = 3 * Size.Z;
+    int NWorkers = FMath::Clamp(
+        FPlatformMisc::NumberOfCoresIncludingHyperthreads(), 1, static_cast<int>(NImages));
+
+    TArray<FWriteBuffers> WriteBuffers;
+    WriteBuffers.SetNum(NWorkers);
+    TArray<FSaveTimings> Timings;
+    Timings.SetNum(NWorkers);
+    TArray<bool> Done;
+    Done.Init(true, NWorkers);
+
+    // in pack mode, the compressed images to be written in a single file
+    TArray<TArray<uint8>> Packed;
+    if (Options.bPack)
     {
-        FString MasksStr;
-        for (auto& Elem : OutActorsMap)
+        Packed.SetNum(NImages);
+    }
+
+    ParallelFor(NWorkers, [&](int32 Worker)
+    {
+        for (uint Index = Worker; Index < NImages; Index += NWorkers)
         {
-            MasksStr += FString::Printf(TEXT("(%s, %d) "), *Elem.Key, Elem.Value);
+            TArray<uint8> Unused;
+            uint Frame = Index % Size.Z;
+            if (not WriteImage(
+                    Buffers, Size, Directory, MaxDepth, ColorMap, Options,
+                    Index / Size.Z, Frame, Frame, WriteBuffers[Worker], Timings[Worker],
+                    Options.bPack ? Packed[Index] : Unused))
+            {
+                Done[Worker] = false;
+                return;
+            }
         }
-        UE_LOG(LogTemp, Log, TEXT("Actors masks are %s"), *MasksStr);
+    });
+
+    FSaveResult Result;
+    Result.bDone = not Done.Contains(false);
+
+    if (Options.bPack and Result.bDone)
+    {
+        double Time = FPlatformTime::Seconds();
+        Result.bDone = WritePack(Size, FPaths::Combine(Directory, FString("run.pack.part")), Packed, Options);
+        Timings[0].Write += FPlatformTime::Seconds() - Time;
+    }
+    else if (Options.DepthFormat != EDepthFormat::Png and Options.Streams[1] and Result.bDone)
+    {
+        double Time = FPlatformTime::Seconds();
+        Result.bDone = WriteNpy(
+            Buffers, GetStreamSize(Size, 1, Options), FPaths::Combine(Directory, FString("depth.npy")),
+            Options.DepthFormat, WriteBuffers[0]);
+        Timings[0].Write += FPlatformTime::Seconds() - Time;
+    }
+
+    for (const auto& WorkerTimings : Timings)
+    {
+        Result.Timings.Convert += WorkerTimings.Convert;
+        Result.Timings.Encode += WorkerTimings.Encode;
+        Result.Timings.Write += WorkerTimings.Write;
+    }
+    Result.Timings.Total = FPlatformTime::Seconds() - StartTime;
+
+    return Result;
+}
+
+
+FScreenshot::FSaveResult FScreenshot::WriteStream(
+    FStreamedRun& Run, const FIntVector& Size, const FSaveOptions& Options)
+{
+    double StartTime = FPlatformTime::Seconds();
+    FSaveResult Result;
+    Result.bDone = true;
+
+    // the packed file, or the NPY file of the raw depth, is written
+    // frame after frame
+    bool bNpy = not Options.bPack and Options.Streams[1] and Options.DepthFormat != EDepthFormat::Png;
+    FString Filename = FPaths::Combine(Run.Directory, FString(Options.bPack ? "run.pack.part" : "depth.npy"));
+    TUniquePtr<IFileHandle> File;
+    TArray<FString> Chunks;
+    uint64 Offset = 0;
+    if (Options.bPack or bNpy)
+    {
+        IPlatformFile& PlatformFile = FPlatformFileManager::Get().GetPlatformFile();
+        File.Reset(PlatformFile.OpenWrite(*Filename));
+        if (not File)
+        {
+            UE_LOG(LogTemp, Error, TEXT("Failed to open %s"), *Filename);
+            Result.bDone = false;
+        }
+        else
+        {
+            Result.bDone = Options.bPack ?
+                BeginPack(*File, Offset) :
+                WriteNpyHeader(*File, GetStreamSize(Size, 1, Options), Options.DepthFormat);
+        }
+    }
+
+    // the 3 streams of a frame are encoded in parallel, each with its
+    // own buffers and timings
+    FWriteBuffers WriteBuffers[3];
+    FSaveTimings Timings[3];
+    TArray<uint8> Packed[3];
+
+    // write the frames as they are queued, until the end of the run.
+    // After a failure the frames are still dequeued so that the
+    // capture never waits for a free slot
+    while (true)
+    {
+        FStreamedFrame Frame;
+        if (not Run.Frames.Dequeue(Frame))
+        {
+            Run.FrameQueued->Wait();
+            continue;
+        }
+
+        if (Frame.Index < 0)
+        {
+            break;
+        }
+
+        if (Result.bDone)
+        {
+            uint Slot = Frame.Index % Options.StreamQueue;
+            bool Done[3] = {true, true, true};
+            ParallelFor(3, [&](int32 Stream)
+            {
+                Done[Stream] = WriteImage(
+                    *Run.Buffers, Size, Run.Directory, 0, Frame.ColorMap, Options,
+                    Stream, Frame.Index, Slot, WriteBuffers[Stream], Timings[Stream], Packed[Stream]);
+            });
+            Result.bDone = Done[0] and Done[1] and Done[2];
+
+            // append the frame to the file, in the streams order
+            double Time = FPlatformTime::Seconds();
+            if (Result.bDone and Options.bPack)
+            {
+                for (uint Stream = 0; Stream < 3 and Result.bDone; ++Stream)
+                {
+                    if (Options.Streams[Stream])
+                    {
+                        Result.bDone = AppendPackChunk(
+                            *File, Size, Options, Stream, Frame.Index, Packed[Stream], Offset, Chunks);
+                    }
+                }
+            }
+            else if (Result.bDone and bNpy)
+            {
+                ConvertRawDepth(Run.Buffers->Depth[Slot], Options.DepthFormat, WriteBuffers[1].Raw);
+                Result.bDone = File->Write(WriteBuffers[1].Raw.GetData(), WriteBuffers[1].Raw.Num());
+            }
+            Timings[0].Write += FPlatformTime::Seconds() - Time;
+
+            if (not Result.bDone)
+            {
+                UE_LOG(LogTemp, Error, TEXT("Failed to write frame %d to %s"), Frame.Index+1, *Run.Directory);
+            }
+        }
+
+        // release the slot
+        Run.NumQueued.Decrement();
+        Run.FrameWritten->Trigger();
     }
 
-    for (uint i = 0; i < m_Size.Z; ++i)
+    if (Options.bPack and Result.bDone)
     {
-        // build the filename
-        FString FileIndex = FScreenshot::ZeroPadding(i+1);
-        FString Filename = FPaths::Combine(
-            Directory, FString::Printf(TEXT("masks_%s.png"), *FileIndex));
+        double Time = FPlatformTime::Seconds();
+        Result.bDone = EndPack(*File, Offset, Chunks);
+        Timings[0].Write += FPlatformTime::Seconds() - Time;
+        if (not Result.bDone)
+        {
+            UE_LOG(LogTemp, Error, TEXT("Failed to write %s"), *Filename);
+        }
+    }
 
+    for (const auto& StreamTimings : Timings)
+    {
+        Result.Timings.Convert += StreamTimings.Convert;
+        Result.Timings.Encode += StreamTimings.Encode;
+        Result.Timings.Write += StreamTimings.Write;
+    }
+    Result.Timings.Total = FPlatformTime::Seconds() - StartTime;
+
+    return Result;
+}
+
+
+bool FScreenshot::WriteImage(
+    const FCaptureBuffers& Buffers, const FIntVector& Size, const FString& Directory,
+    float MaxDepth, const TMap<uint8, uint8>& ColorMap, const FSaveOptions& Options,
+    uint Stream, uint Frame, uint Slot,
+    FWriteBuffers& WriteBuffers, FSaveTimings& OutTimings, TArray<uint8>& OutPacked)
+{
+    if (not Options.Streams[Stream])
+    {
+        return true;
+    }
+
+    FString Name = GetStreamName(Stream);
+    FIntVector ImageSize = FScreenshot::GetStreamSize(Size, Stream, Options);
+
+    // build the filename
+    bool bIndexed = Stream == 2 and Options.MasksFormat != EMasksFormat::Gray;
+    bool bRle = Stream == 2 and Options.MasksFormat == EMasksFormat::Rle;
+    FString FileIndex = FScreenshot::ZeroPadding(Frame+1, Size.Z);
+    FString Filename = FPaths::Combine(
+        Directory, Name, FString::Printf(
+            TEXT("%s_%s.%s"), *Name, *FileIndex, bRle ? TEXT("rle") : TEXT("png")));
+
+    // raw depth is written as a whole in depth.npy by WriteRun, or
+    // stored uncompressed in the packed file
+    double Time = FPlatformTime::Seconds();
+    if (Stream == 1 and Options.DepthFormat != EDepthFormat::Png)
+    {
+        if (Options.bPack)
+        {
+            ConvertRawDepth(Buffers.Depth[Slot], Options.DepthFormat, OutPacked);
+            OutTimings.Convert += FPlatformTime::Seconds() - Time;
+        }
+        return true;
+    }
+
+    // indexed masks are encoded from the actors ids, one byte per pixel
+    if (bIndexed)
+    {
+        return WriteIndexedMasks(
+            Buffers.Masks[Slot], ImageSize, Filename, ColorMap, Options,
+            WriteBuffers, OutTimings, OutPacked);
+    }
+
+    // convert depth and masks to grayscale images
+    const TArray<FColor>* Bitmap = &WriteBuffers.Bitmap;
+    if (Stream == 0)
+    {
+        Bitmap = &Buffers.Scene[Slot];
+    }
+    else if (Stream == 1)
+    {
+        // normalize the depth in [0, 1] and cast to uint8
+        const FImageDepth& Image = Buffers.Depth[Slot];
+        WriteBuffers.Bitmap.SetNum(Image.Num(), false);
+        for (uint j = 0; j < Image.Num(); ++j)
+        {
+            uint8 Pixel = static_cast<uint8>(Image[j] * 255.0 / MaxDepth);
+            WriteBuffers.Bitmap[j] = FColor(Pixel, Pixel, Pixel, 255);
+        }
+    }
+    else
+    {
         // normalize masks from [0, nactors-1] to [0, 255]
-        FImageMasks& Image = m_Masks[i];
+        const FImageMasks& Image = Buffers.Masks[Slot];
+        WriteBuffers.Bitmap.SetNum(Image.Num(), false);
         for (uint j = 0; j < Image.Num(); ++j)
         {
             auto Color = ColorMap[Image[j]];
-            m_WriteBuffer[j] = FColor(Color, Color, Color, 255);
+            WriteBuffers.Bitmap[j] = FColor(Color, Color, Color, 255);
         }
+    }
+    OutTimings.Convert += FPlatformTime::Seconds() - Time;
 
-        // write the image
-        bool bDone = FScreenshot::WritePng(m_WriteBuffer, Filename);
+    // in pack mode, only compress the raw image
+    if (Options.bPack)
+    {
+        Time = FPlatformTime::Seconds();
+        bool bDone = FScreenshot::EncodeRaw(
+            *Bitmap, ImageSize, Stream == 0 ? 3 : 1, Options.CompressionLevel, WriteBuffers, OutPacked);
+        OutTimings.Encode += FPlatformTime::Seconds() - Time;
         if (not bDone)
         {
-            return false;
+            UE_LOG(LogTemp, Error, TEXT("Failed to encode %s %d"), *Name, Frame+1);
         }
+        return bDone;
+    }
+
+    // compress the image as PNG
+    Time = FPlatformTime::Seconds();
+    bool bDone = FScreenshot::EncodePng(*Bitmap, ImageSize, Options.CompressionLevel, WriteBuffers);
+    OutTimings.Encode += FPlatformTime::Seconds() - Time;
+    if (not bDone)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to encode %s"), *Filename);
+        return false;
+    }
+
+    // Write the PNG array to disk
+    Time = FPlatformTime::Seconds();
+    bDone = FFileHelper::SaveArrayToFile(WriteBuffers.Png, *Filename);
+    OutTimings.Write += FPlatformTime::Seconds() - Time;
+    if (not bDone)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to write %s"), *Filename);
+    }
+
+    return bDone;
+}
+
+
+bool FScreenshot::WriteIndexedMasks(
+    const FImageMasks& Image, const FIntVector& Size, const FString& Filename,
+    const TMap<uint8, uint8>& ColorMap, const FSaveOptions& Options,
+    FWriteBuffers& WriteBuffers, FSaveTimings& OutTimings, TArray<uint8>& OutPacked)
+{
+    // map the actors from their index in the run to their global id
+    double Time = FPlatformTime::Seconds();
+    uint8 Ids[256] = {0};
+    for (const auto& Elem : ColorMap)
+    {
+        Ids[Elem.Key] = Elem.Value;
+    }
+
+    TArray<uint8>& Indexed = WriteBuffers.Indexed;
+    Indexed.SetNumUninitialized(Image.Num(), false);
+    for (int j = 0; j < Image.Num(); ++j)
+    {
+        Indexed[j] = Ids[Image[j]];
+    }
+    OutTimings.Convert += FPlatformTime::Seconds() - Time;
+
+    // encode the ids, in the packed file or in a PNG or RLE file
+    Time = FPlatformTime::Seconds();
+    TArray<uint8>& Data = Options.bPack ? OutPacked : WriteBuffers.Png;
+    bool bDone = true;
+    if (Options.MasksFormat == EMasksFormat::Rle)
+    {
+        FScreenshot::EncodeRle(Indexed, Size, Data);
+    }
+    else if (Options.bPack)
+    {
+        bDone = FScreenshot::Deflate(Indexed, Options.CompressionLevel, Data);
+    }
+    else
+    {
+        bDone = FScreenshot::EncodeGrayPng(Indexed, Size, Options.CompressionLevel, WriteBuffers);
     }
+    OutTimings.Encode += FPlatformTime::Seconds() - Time;
+
+    if (not bDone)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to encode %s"), *Filename);
+        return false;
+    }
+
+    if (Options.bPack)
+    {
+        return true;
+    }
+
+    Time = FPlatformTime::Seconds();
+    bDone = FFileHelper::SaveArrayToFile(Data, *Filename);
+    OutTimings.Write += FPlatformTime::Seconds() - Time;
+    if (not bDone)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to write %s"), *Filename);
+    }
+
+    return bDone;
+}
+
+
+// Append a PNG chunk of the given `Type` and `Data` to `Out`
+static void AppendPngChunk(TArray<uint8>& Out, const char* Type, const uint8* Data, uint32 Length)
+{
+    auto AppendUint32 = [&Out](uint32 Value)
+    {
+        Out.Add((Value >> 24) & 0xff);
+        Out.Add((Value >> 16) & 0xff);
+        Out.Add((Value >> 8) & 0xff);
+        Out.Add(Value & 0xff);
+    };
+
+    AppendUint32(Length);
+    int32 Start = Out.Num();
+    Out.Append(reinterpret_cast<const uint8*>(Type), 4);
+    Out.Append(Data, Length);
+    AppendUint32(crc32(0, Out.GetData() + Start, Length + 4));
+}
+
+
+bool FScreenshot::EncodePng(
+    const TArray<FColor>& Bitmap, const FIntVector& Size, int CompressionLevel,
+    FWriteBuffers& WriteBuffers)
+{
+    // Build the raw PNG scanlines in RGBA, each one prefixed by its
+    // filter type. The 'up' filter (difference with the previous
+    // scanline) is cheap and efficient on the rendered images, it is
+    // not used with the fastest levels.
+    uint8 Filter = CompressionLevel > 1 ? 2 : 0;
+    uint32 RowSize = 1 + 4 * Size.X;
+    TArray<uint8>& Raw = WriteBuffers.Raw;
+    Raw.SetNumUninitialized(RowSize * Size.Y, false);
+    for (int y = 0; y < Size.Y; ++y)
+    {
+        uint8* Row = Raw.GetData() + y * RowSize;
+        const FColor* Pixels = Bitmap.GetData() + y * Size.X;
+        const FColor* Previous = y > 0 ? Pixels - Size.X : nullptr;
+
+        Row[0] = Previous ? Filter : 0;
+        for (int x = 0; x < Size.X; ++x)
+        {
+            uint8* Pixel = Row + 1 + 4 * x;
+            Pixel[0] = Pixels[x].R;
+            Pixel[1] = Pixels[x].G;
+            Pixel[2] = Pixels[x].B;
+            Pixel[3] = 255;
+
+            if (Previous and Filter == 2)
+            {
+                Pixel[0] -= Previous[x].R;
+                Pixel[1] -= Previous[x].G;
+                Pixel[2] -= Previous[x].B;
+                Pixel[3] = 0;
+            }
+        }
+    }
+
+    return FScreenshot::DeflatePng(Size, 6, CompressionLevel, WriteBuffers);
+}
+
+
+bool FScreenshot::EncodeGrayPng(
+    const TArray<uint8>& Image, const FIntVector& Size, int CompressionLevel,
+    FWriteBuffers& WriteBuffers)
+{
+    // Build the raw PNG scanlines, with the 'up' filter as in
+    // EncodePng()
+    uint8 Filter = CompressionLevel > 1 ? 2 : 0;
+    uint32 RowSize = 1 + Size.X;
+    TArray<uint8>& Raw = WriteBuffers.Raw;
+    Raw.SetNumUninitialized(RowSize * Size.Y, false);
+    for (int y = 0; y < Size.Y; ++y)
+    {
+        uint8* Row = Raw.GetData() + y * RowSize;
+        const uint8* Pixels = Image.GetData() + y * Size.X;
+
+        if (y > 0 and Filter == 2)
+        {
+            Row[0] = Filter;
+            for (int x = 0; x < Size.X; ++x)
+            {
+                Row[1 + x] = Pixels[x] - Pixels[x - Size.X];
+            }
+        }
+        else
+        {
+            Row[0] = 0;
+            FMemory::Memcpy(Row + 1, Pixels, Size.X);
+        }
+    }
+
+    return FScreenshot::DeflatePng(Size, 0, CompressionLevel, WriteBuffers);
+}
+
+
+bool FScreenshot::DeflatePng(
+    const FIntVector& Size, uint8 ColorType, int CompressionLevel, FWriteBuffers& WriteBuffers)
+{
+    // Compress the scanlines
+    const TArray<uint8>& Raw = WriteBuffers.Raw;
+    TArray<uint8>& Deflated = WriteBuffers.Deflated;
+    uLongf DeflatedSize = compressBound(Raw.Num());
+    Deflated.SetNumUninitialized(DeflatedSize, false);
+    if (compress2(Deflated.GetData(), &DeflatedSize, Raw.GetData(), Raw.Num(), CompressionLevel) != Z_OK)
+    {
+        return false;
+    }
+
+    // Write the PNG signature, header, data and end chunks
+    static const uint8 Signature[] = {137, 80, 78, 71, 13, 10, 26, 10};
+    TArray<uint8>& Out = WriteBuffers.Png;
+    Out.Reset();
+    Out.Append(Signature, 8);
+
+    uint8 Header[13] = {
+        static_cast<uint8>((Size.X >> 24) & 0xff), static_cast<uint8>((Size.X >> 16) & 0xff),
+        static_cast<uint8>((Size.X >> 8) & 0xff), static_cast<uint8>(Size.X & 0xff),
+        static_cast<uint8>((Size.Y >> 24) & 0xff), static_cast<uint8>((Size.Y >> 16) & 0xff),
+        static_cast<uint8>((Size.Y >> 8) & 0xff), static_cast<uint8>(Size.Y & 0xff),
+        8,  // bit depth
+        ColorType,
+        0, 0, 0};  // compression, filter and interlace methods
+    AppendPngChunk(Out, "IHDR", Header, 13);
+    AppendPngChunk(Out, "IDAT", Deflated.GetData(), DeflatedSize);
+    AppendPngChunk(Out, "IEND", nullptr, 0);
 
     return true;
 }
 
 
-bool FScreenshot::WritePng(const TArray<FColor>& Bitmap, const FString& Filename)
+bool FScreenshot::EncodeRaw(
+    const TArray<FColor>& Bitmap, const FIntVector& Size, int NChannels, int CompressionLevel,
+    FWriteBuffers& WriteBuffers, TArray<uint8>& OutData)
 {
-    // Convert the raw pixels Bitmap to a PNG compressed array
-    FImageUtils::CompressImageArray(m_Size.X, m_Size.Y, Bitmap, m_CompressedWriteBuffer);
+    // Extract the RGB or gray channels
+    TArray<uint8>& Raw = WriteBuffers.Raw;
+    Raw.SetNumUninitialized(NChannels * Bitmap.Num(), false);
+    for (int j = 0; j < Bitmap.Num(); ++j)
+    {
+        Raw[NChannels * j] = Bitmap[j].R;
+        if (NChannels == 3)
+        {
+            Raw[3 * j + 1] = Bitmap[j].G;
+            Raw[3 * j + 2] = Bitmap[j].B;
+        }
+    }
 
-    // Write the PNG array to disk
-    bool bDone = FFileHelper::SaveArrayToFile(m_CompressedWriteBuffer, *Filename);
+    // Compress them
+    return FScreenshot::Deflate(Raw, CompressionLevel, OutData);
+}
+
+
+bool FScreenshot::Deflate(const TArray<uint8>& Data, int CompressionLevel, TArray<uint8>& OutData)
+{
+    uLongf DataSize = compressBound(Data.Num());
+    OutData.SetNumUninitialized(DataSize, false);
+    if (compress2(OutData.GetData(), &DataSize, Data.GetData(), Data.Num(), CompressionLevel) != Z_OK)
+    {
+        return false;
+    }
+    OutData.SetNum(DataSize, false);
+
+    return true;
+}
+
+
+void FScreenshot::EncodeRle(const TArray<uint8>& Image, const FIntVector& Size, TArray<uint8>& OutData)
+{
+    auto AppendUint16 = [&OutData](uint16 Value)
+    {
+        OutData.Add(Value & 0xff);
+        OutData.Add((Value >> 8) & 0xff);
+    };
+
+    OutData.Reset();
+    AppendUint16(Size.Y);
+    AppendUint16(Size.X);
+
+    // the runs of pixels with the same id, in row-major order
+    int j = 0;
+    while (j < Image.Num())
+    {
+        uint8 Id = Image[j];
+        int Length = 1;
+        while (j + Length < Image.Num() and Image[j + Length] == Id and Length < 65535)
+        {
+            ++Length;
+        }
+
+        OutData.Add(Id);
+        AppendUint16(Length);
+        j += Length;
+    }
+}
+
+
+bool FScreenshot::WritePack(
+    const FIntVector& Size, const FString& Filename, const TArray<TArray<uint8>>& Packed,
+    const FSaveOptions& Options)
+{
+    IPlatformFile& PlatformFile = FPlatformFileManager::Get().GetPlatformFile();
+    TUniquePtr<IFileHandle> File(PlatformFile.OpenWrite(*Filename));
+    if (not File)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to open %s"), *Filename);
+        return false;
+    }
+
+    // the images, indexed in a JSON list
+    TArray<FString> Chunks;
+    uint64 Offset;
+    bool bDone = BeginPack(*File, Offset);
+    for (int Index = 0; Index < Packed.Num() and bDone; ++Index)
+    {
+        uint Stream = Index / Size.Z;
+        if (Options.Streams[Stream])
+        {
+            bDone = AppendPackChunk(*File, Size, Options, Stream, Index % Size.Z, Packed[Index], Offset, Chunks);
+        }
+    }
+    bDone = bDone and EndPack(*File, Offset, Chunks);
+
+    if (not bDone)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to write %s"), *Filename);
+    }
+
+    return bDone;
+}
+
+
+// The magic bytes of a packed file, in header and footer
+static const uint8 PackMagic[] = {'I', 'P', 'H', 'Y', 'P', 'A', 'C', 'K'};
+
+
+bool FScreenshot::BeginPack(IFileHandle& File, uint64& OutOffset)
+{
+    // header: magic and format version
+    uint32 Version[2] = {1, 0};
+    OutOffset = 16;
+    return File.Write(PackMagic, 8) and File.Write(reinterpret_cast<uint8*>(Version), 8);
+}
+
+
+bool FScreenshot::AppendPackChunk(
+    IFileHandle& File, const FIntVector& Size, const FSaveOptions& Options,
+    uint Stream, uint Frame, const TArray<uint8>& Data, uint64& Offset, TArray<FString>& Chunks)
+{
+    FString Name = GetStreamName(Stream);
+    FIntVector ImageSize = FScreenshot::GetStreamSize(Size, Stream, Options);
+    FString Shape = Stream == 0 ?
+        FString::Printf(TEXT("[%d, %d, 3]"), ImageSize.Y, ImageSize.X) :
+        FString::Printf(TEXT("[%d, %d]"), ImageSize.Y, ImageSize.X);
+
+    // raw depth is not compressed so that it can be memory mapped
+    bool bRawDepth = Stream == 1 and Options.DepthFormat != EDepthFormat::Png;
+    const TCHAR* DType = not bRawDepth ? TEXT("uint8") :
+        (Options.DepthFormat == EDepthFormat::Float16 ? TEXT("<f2") : TEXT("<f4"));
+
+    // run-length encoded masks (see EncodeRle)
+    bool bRleMasks = Stream == 2 and Options.MasksFormat == EMasksFormat::Rle;
+    const TCHAR* Compression = bRawDepth ? TEXT("none") : (bRleMasks ? TEXT("rle") : TEXT("zlib"));
+
+    Chunks.Add(FString::Printf(
+        TEXT("{\"name\": \"%s\", \"frame\": %d, \"offset\": %llu, \"size\": %d, \"dtype\": \"%s\", \"shape\": %s, \"compression\": \"%s\"}"),
+        *Name, Frame, Offset, Data.Num(), DType, *Shape, Compression));
+
+    Offset += Data.Num();
+    return File.Write(Data.GetData(), Data.Num());
+}
+
+
+bool FScreenshot::EndPack(IFileHandle& File, uint64 Offset, const TArray<FString>& Chunks)
+{
+    // index and footer: index offset and size, magic
+    FTCHARToUTF8 IndexJson(*FString::Printf(
+        TEXT("{\"version\": 1, \"chunks\": [%s]}"), *FString::Join(Chunks, TEXT(", "))));
+    uint64 Footer[2] = {Offset, static_cast<uint64>(IndexJson.Length())};
+    return File.Write(reinterpret_cast<const uint8*>(IndexJson.Get()), IndexJson.Length())
+        and File.Write(reinterpret_cast<uint8*>(Footer), 16)
+        and File.Write(PackMagic, 8);
+}
+
+
+void FScreenshot::ConvertRawDepth(const FImageDepth& Image, EDepthFormat Format, TArray<uint8>& OutData)
+{
+    if (Format == EDepthFormat::Float16)
+    {
+        OutData.SetNumUninitialized(Image.Num() * sizeof(uint16), false);
+        uint16* Data = reinterpret_cast<uint16*>(OutData.GetData());
+        for (int j = 0; j < Image.Num(); ++j)
+        {
+            Data[j] = FFloat16(Image[j]).Encoded;
+        }
+    }
+    else
+    {
+        OutData.SetNumUninitialized(Image.Num() * sizeof(float), false);
+        FMemory::Memcpy(OutData.GetData(), Image.GetData(), OutData.Num());
+    }
+}
+
+
+bool FScreenshot::WriteNpy(
+    const FCaptureBuffers& Buffers, const FIntVector& Size, const FString& Filename,
+    EDepthFormat Format, FWriteBuffers& WriteBuffers)
+{
+    IPlatformFile& PlatformFile = FPlatformFileManager::Get().GetPlatformFile();
+    TUniquePtr<IFileHandle> File(PlatformFile.OpenWrite(*Filename));
+    if (not File)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Failed to open %s"), *Filename);
+        return false;
+    }
+
+    bool bDone = WriteNpyHeader(*File, Size, Format);
+
+    // the depth images, in C order
+    for (const auto& Image : Buffers.Depth)
+    {
+        if (not bDone)
+        {
+            break;
+        }
+
+        ConvertRawDepth(Image, Format, WriteBuffers.Raw);
+        bDone = File->Write(WriteBuffers.Raw.GetData(), WriteBuffers.Raw.Num());
+    }
 
     if (not bDone)
     {
@@ -432,10 +1479,43 @@ bool FScreenshot::WritePng(const TArray<FColor>& Bitmap, const FString& Filename
 }
 
 
-FString FScreenshot::ZeroPadding(uint Index) const
+bool FScreenshot::WriteNpyHeader(IFileHandle& File, const FIntVector& Size, EDepthFormat Format)
+{
+    // NPY header (format version 1.0): magic, version, header length
+    // and a dict describing the array, padded so that the data is
+    // aligned on 64 bytes
+    FString Header = FString::Printf(
+        TEXT("{'descr': '%s', 'fortran_order': False, 'shape': (%d, %d, %d), }"),
+        Format == EDepthFormat::Float16 ? TEXT("<f2") : TEXT("<f4"), Size.Z, Size.Y, Size.X);
+    int Padding = 63 - (10 + Header.Len()) % 64;
+    Header += FString::ChrN(Padding, ' ') + TEXT("\n");
+
+    static const uint8 Magic[] = {0x93, 'N', 'U', 'M', 'P', 'Y', 1, 0};
+    uint16 HeaderLength = Header.Len();
+    FTCHARToUTF8 HeaderUtf8(*Header);
+    return File.Write(Magic, 8)
+        and File.Write(reinterpret_cast<uint8*>(&HeaderLength), 2)
+        and File.Write(reinterpret_cast<const uint8*>(HeaderUtf8.Get()), HeaderUtf8.Length());
+}
+
+
+FString FScreenshot::GetStreamName(uint Stream)
+{
+    return Stream == 0 ? TEXT("scene") : (Stream == 1 ? TEXT("depth") : TEXT("masks"));
+}
+
+
+FIntVector FScreenshot::GetStreamSize(const FIntVector& Size, uint Stream, const FSaveOptions& Options)
+{
+    int Stride = Stream == 1 ? Options.DepthStride : (Stream == 2 ? Options.MasksStride : 1);
+    return FIntVector(FMath::Max(Size.X / Stride, 1), FMath::Max(Size.Y / Stride, 1), Size.Z);
+}
+
+
+FString FScreenshot::ZeroPadding(uint Index, uint MaxIndex)
 {
     FString SIndex = FString::FromInt(Index);
-    FString SMax = FString::FromInt(m_Size.Z);
+    FString SMax = FString::FromInt(MaxIndex);
 
     return FString::ChrN(SMax.Len() - SIndex.Len(), '0') + SIndex;
 }
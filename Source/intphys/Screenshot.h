@@ -3,27 +3,123 @@
 #pragma once
 
 #include "CoreMinimal.h"
+#include "Async/Future.h"
+#include "Containers/Queue.h"
+#include "HAL/Event.h"
+#include "HAL/ThreadSafeBool.h"
+#include "HAL/ThreadSafeCounter.h"
+
+class IFileHandle;
+
+
+// How the depth images are saved: as PNG images normalized by the
+// run's max depth, or as raw floats (half or single precision)
+enum class EDepthFormat : uint8
+{
+    Png,
+    Float16,
+    Float32
+};
+
+
+// How the masks images are saved: as gray levels spread over [0, 255]
+// in each run, or as the global ids of the actors (see
+// FScreenshot::SetActorsIds), one byte per pixel, possibly run-length
+// encoded
+enum class EMasksFormat : uint8
+{
+    Gray,
+    Indexed,
+    Rle
+};
+
+
+// How the runs are captured and written to disk
+struct FSaveOptions
+{
+    // The zlib compression level of the images, from 0 (no
+    // compression) to 9 (best compression)
+    int CompressionLevel = 6;
+
+    // When true, write a run in a single 'run.pack.part' file (see
+    // Content/Scripts/tools/runfile.py), else as PNG images
+    bool bPack = false;
+
+    // The format of the depth images. Raw depth is written
+    // uncompressed in 'depth.npy' (or in the packed file) so that it
+    // can be memory mapped
+    EDepthFormat DepthFormat = EDepthFormat::Png;
+
+    // The format of the masks images
+    EMasksFormat MasksFormat = EMasksFormat::Gray;
+
+    // The depth and masks images are captured at one pixel every
+    // `Stride` pixels of the scene images, in both dimensions
+    int DepthStride = 1;
+    int MasksStride = 1;
+
+    // The captured streams, as 0 for scene, 1 for depth and 2 for
+    // masks. The disabled streams are neither captured, nor stored,
+    // nor written
+    bool Streams[3] = {true, true, true};
+
+    // When positive, stream the frames of a run to disk as they are
+    // captured, through a queue of `StreamQueue` frames, else write
+    // the run once captured. Streaming requires raw depth and indexed
+    // masks, which do not depend on the whole run
+    int StreamQueue = 0;
+};
 
 
 class FScreenshot
 {
 public:
-    FScreenshot(const FIntVector& Size, AActor* OriginActor, bool Verbose = false);
+    // Up to `AsyncSaves` runs are written to disk in background while
+    // the next runs are captured, 0 to save synchronously
+    FScreenshot(
+        const FIntVector& Size, AActor* OriginActor, bool Verbose = false,
+        int AsyncSaves = 1, const FSaveOptions& SaveOptions = FSaveOptions());
 
     ~FScreenshot();
 
     void SetOriginActor(AActor* Actor);
 
+    // Set the global ids of the actors in the indexed masks, as
+    // (actor name -> id). The table is kept over the runs, the actors
+    // not in it are masked with the id 255
+    void SetActorsIds(const TMap<FString, uint8>& ActorsIds);
+
     bool Capture(const TArray<AActor*>& IgnoredActors);
 
+    // Compute the max depth and actors masks of the captured run and
+    // hand its images to a background writer, the result of the
+    // writing is then given by PollSaves()
     bool Save(const FString& Directory, float& OutMaxDepth, TMap<FString, uint8>& OutActorsMap);
 
-    void Reset();
+    // Retrieve the directories saved or failed since the last call,
+    // return the number of runs still being written. OutTimings has
+    // the time spent in each stage of the saving (see FSaveTimings)
+    // for each saved directory
+    int PollSaves(TArray<FString>& OutSaved, TArray<FString>& OutFailed, TArray<float>& OutTimings);
+
+    // Wait until all the runs are written to disk
+    void WaitSaves();
+
+    // Start a new run. In streaming mode, its frames are written to
+    // `Directory` as they are captured, the run being completed by
+    // Save(Directory). A run not saved is discarded at the next Reset
+    void Reset(const FString& Directory = FString());
 
     bool IsActorInFrame(const AActor* Actor, const uint FrameIndex);
 
     bool IsActorInLastFrame(const AActor* Actor);
 
+    // Return true if a ray of the view hits `Actor`. The rays are
+    // traced at full resolution over the projection of the actor's
+    // bounds and nothing is captured, so the scene does not need to
+    // be rendered
+    bool IsActorVisible(const AActor* Actor);
+
 private:
     // Types of the captured images (they are all saved after a
     // conversion to TArray<uint8>)
@@ -31,6 +127,81 @@ private:
     typedef TArray<float> FImageDepth;
     typedef TArray<uint8> FImageMasks;
 
+    // The captured images of a run
+    struct FCaptureBuffers
+    {
+        TArray<FImageScene> Scene;
+        TArray<FImageDepth> Depth;
+        TArray<FImageMasks> Masks;
+
+        FCaptureBuffers(const FIntVector& Size, const FSaveOptions& Options);
+    };
+    typedef TSharedPtr<FCaptureBuffers, ESPMode::ThreadSafe> FCaptureBuffersPtr;
+
+    // The time spent in each stage of a run saving, in seconds. The
+    // stages are cumulated over the writer threads, Total is the
+    // elapsed time
+    struct FSaveTimings
+    {
+        float Convert = 0;
+        float Encode = 0;
+        float Write = 0;
+        float Total = 0;
+    };
+
+    // The result of a run saving
+    struct FSaveResult
+    {
+        bool bDone;
+        FSaveTimings Timings;
+    };
+
+    // A captured frame to be written by a streaming writer: its index
+    // in the run, -1 for the end of the run, and the (actor id -> mask
+    // id) mapping at capture time
+    struct FStreamedFrame
+    {
+        int Index;
+        TMap<uint8, uint8> ColorMap;
+    };
+
+    // A run being streamed to disk: the captured frames are queued in
+    // the Buffers slots (frame index modulo the number of slots) until
+    // written by the writer thread
+    struct FStreamedRun
+    {
+        FString Directory;
+        FCaptureBuffersPtr Buffers;
+        TQueue<FStreamedFrame, EQueueMode::Spsc> Frames;
+        FThreadSafeCounter NumQueued;
+        FEvent* FrameQueued;
+        FEvent* FrameWritten;
+
+        FStreamedRun();
+        ~FStreamedRun();
+    };
+    typedef TSharedPtr<FStreamedRun, ESPMode::ThreadSafe> FStreamedRunPtr;
+
+    // A run being written in background
+    struct FPendingSave
+    {
+        FString Directory;
+        FCaptureBuffersPtr Buffers;
+        TFuture<FSaveResult> Result;
+    };
+
+    // The buffers used by a writer thread to encode an image: the
+    // converted depth or masks image, the indexed masks, the PNG
+    // scanlines, their zlib compression and the PNG file
+    struct FWriteBuffers
+    {
+        TArray<FColor> Bitmap;
+        TArray<uint8> Indexed;
+        TArray<uint8> Raw;
+        TArray<uint8> Deflated;
+        TArray<uint8> Png;
+    };
+
     // A triplet (width, height, nimages) of captured images
     FIntVector m_Size;
 
@@ -43,42 +214,199 @@ private:
     // Index of the current image (next to be captured)
     uint m_ImageIndex;
 
+    // Number of frames in the capture buffers: all the frames of a
+    // run, or the queue size in streaming mode
+    int m_NumSlots;
+
+    // The max depth of the run being captured
+    float m_MaxDepth;
+
     // World and scene view for depth and mask capture
     UWorld* m_World;
     FSceneView* m_SceneView;
 
-    // Buffers used to store the captured images
-    TArray<FImageScene> m_Scene;
-    TArray<FImageDepth> m_Depth;
-    TArray<FImageMasks> m_Masks;
+    // Buffers used to store the images of the run being captured
+    FCaptureBuffersPtr m_Buffers;
+
+    // Buffers of the runs already written, reused for the next runs
+    TArray<FCaptureBuffersPtr> m_FreeBuffers;
+
+    // The runs being written in background, at most m_AsyncSaves
+    int m_AsyncSaves;
+    TArray<FPendingSave> m_PendingSaves;
+
+    // The run being captured and streamed to disk, if any
+    FStreamedRunPtr m_StreamedRun;
+    TFuture<FSaveResult> m_StreamedResult;
+
+    // How the runs are written to disk
+    FSaveOptions m_SaveOptions;
 
-    // Buffers used in WritePng
-    TArray<FColor> m_WriteBuffer;
-    TArray<uint8> m_CompressedWriteBuffer;
+    // The runs written or failed, not yet retrieved by PollSaves()
+    TArray<FString> m_SavedDirectories;
+    TArray<FString> m_FailedDirectories;
+    TArray<FSaveTimings> m_SavedTimings;
 
     // Map the actors names to int ids
     TSet<FString> m_ActorsSet;
     TMap<FString, uint8> m_ActorsMap;
 
+    // Cache the int ids of the actors met in the run
+    TMap<const AActor*, uint8> m_ActorsIndices;
+
+    // The rays cast from the view to capture depth and masks, one
+    // every m_TraceStride pixels, computed again when the point of
+    // view moves
+    TArray<FVector> m_RayOrigins;
+    TArray<FVector> m_RayEnds;
+    FTransform m_RaysTransform;
+    int m_TraceStride;
+    FIntVector m_TraceSize;
+
+    // The depth and the actor hit by each ray in the current frame
+    TArray<float> m_TracedDepth;
+    TArray<const AActor*> m_HitActors;
+
+    // The global ids of the actors in the indexed masks
+    TMap<FString, uint8> m_ActorsIds;
+
+    // The buffers slot of the current image
+    uint GetSlot() const;
+
+    // Create the directory and subdirectories where to write a run
+    void CreateDirectories(const FString& Directory) const;
+
+    // Start streaming the run to `Directory`
+    void BeginStream(const FString& Directory);
+
+    // Stop the writer of the streamed run, return the future result
+    // of its writing
+    TFuture<FSaveResult> EndStream();
+
     // Take a screenshot of the scene and push it in memory
     bool CaptureScene();
 
     // Take the scene's depth field and object masking, push them to memory
     bool CaptureDepthAndMasks(const TArray<AActor*>& IgnoredActors);
 
-    // Save all the scene images to disk
-    bool SaveScene(const FString& Directory);
+    // Compute the rays of the view if the origin actor moved, return
+    // false if the scene view is not available
+    bool UpdateRays();
+
+    // Return the index of the traced pixel nearest to the pixel (x, y)
+    // of an image captured with `Stride`
+    int GetTracedIndex(int x, int y, int Stride) const;
+
+    // Return the int id of an actor in the masks, registering it
+    // if this is its first hit in the run
+    uint8 GetActorIndex(const AActor* Actor);
+
+    // Compute the gray level (or the global id) of each actor in the
+    // masks images, as a mapping (actor name -> gray level) and (actor
+    // id -> gray level)
+    void ComputeMasksColors(TMap<FString, uint8>& OutActorsMap, TMap<uint8, uint8>& OutColorMap) const;
+
+    // Move the completed background saves to the saved or failed
+    // directories, if `bWait` is true wait for all the saves
+    void CollectSaves(bool bWait);
+
+    // Write all the images of a run to disk, called from a background
+    // thread: it only accesses its arguments. The images are encoded
+    // in parallel, each worker having its own buffers
+    static FSaveResult WriteRun(
+        const FCaptureBuffers& Buffers, const FIntVector& Size, const FString& Directory,
+        float MaxDepth, const TMap<uint8, uint8>& ColorMap, const FSaveOptions& Options);
+
+    // Write the frames of a streamed run to disk as they are queued,
+    // called from a dedicated thread
+    static FSaveResult WriteStream(FStreamedRun& Run, const FIntVector& Size, const FSaveOptions& Options);
+
+    // Write the image `Frame` of a `Stream` (0 for scene, 1 for depth
+    // and 2 for masks) to disk, the image being in the buffers `Slot`.
+    // In pack mode, the compressed image is stored in OutPacked
+    // instead.
+    static bool WriteImage(
+        const FCaptureBuffers& Buffers, const FIntVector& Size, const FString& Directory,
+        float MaxDepth, const TMap<uint8, uint8>& ColorMap, const FSaveOptions& Options,
+        uint Stream, uint Frame, uint Slot,
+        FWriteBuffers& WriteBuffers, FSaveTimings& OutTimings, TArray<uint8>& OutPacked);
+
+    // Write an indexed masks image as a grayscale PNG or a RLE file.
+    // In pack mode, the compressed image is stored in OutPacked instead.
+    static bool WriteIndexedMasks(
+        const FImageMasks& Image, const FIntVector& Size, const FString& Filename,
+        const TMap<uint8, uint8>& ColorMap, const FSaveOptions& Options,
+        FWriteBuffers& WriteBuffers, FSaveTimings& OutTimings, TArray<uint8>& OutPacked);
+
+    // Compress the raw pixels of an image in OutData, in RGB for the
+    // scene and in grayscale for depth and masks
+    static bool EncodeRaw(
+        const TArray<FColor>& Bitmap, const FIntVector& Size, int NChannels, int CompressionLevel,
+        FWriteBuffers& WriteBuffers, TArray<uint8>& OutData);
+
+    // Compress `Data` with zlib in OutData
+    static bool Deflate(const TArray<uint8>& Data, int CompressionLevel, TArray<uint8>& OutData);
+
+    // Run-length encode an indexed masks image in OutData: its height
+    // and width as uint16 followed by (id as uint8, length as uint16)
+    // runs, in little-endian (see Content/Scripts/tools/runfile.py)
+    static void EncodeRle(const TArray<uint8>& Image, const FIntVector& Size, TArray<uint8>& OutData);
+
+    // Write the compressed images of a run in a single file
+    static bool WritePack(
+        const FIntVector& Size, const FString& Filename, const TArray<TArray<uint8>>& Packed,
+        const FSaveOptions& Options);
+
+    // Write the header of a packed file, OutOffset is the offset of
+    // the first chunk
+    static bool BeginPack(IFileHandle& File, uint64& OutOffset);
+
+    // Append the image `Frame` of a `Stream` to a packed file, its
+    // index entry is added to Chunks
+    static bool AppendPackChunk(
+        IFileHandle& File, const FIntVector& Size, const FSaveOptions& Options,
+        uint Stream, uint Frame, const TArray<uint8>& Data, uint64& Offset, TArray<FString>& Chunks);
+
+    // Write the index and footer of a packed file
+    static bool EndPack(IFileHandle& File, uint64 Offset, const TArray<FString>& Chunks);
+
+    // Convert a depth image to raw floats in the given format
+    static void ConvertRawDepth(const FImageDepth& Image, EDepthFormat Format, TArray<uint8>& OutData);
+
+    // Write all the depth images of a run as raw floats in a NPY file
+    static bool WriteNpy(
+        const FCaptureBuffers& Buffers, const FIntVector& Size, const FString& Filename,
+        EDepthFormat Format, FWriteBuffers& WriteBuffers);
+
+    // Write the header of a NPY file of `Size` depth images, they are
+    // then appended in order
+    static bool WriteNpyHeader(IFileHandle& File, const FIntVector& Size, EDepthFormat Format);
+
+    // Encode an image in RGBA PNG format into WriteBuffers.Png, the
+    // alpha channel of the image is forced to 255.
+    static bool EncodePng(
+        const TArray<FColor>& Bitmap, const FIntVector& Size, int CompressionLevel,
+        FWriteBuffers& WriteBuffers);
+
+    // Encode an image in 8 bits grayscale PNG format into
+    // WriteBuffers.Png
+    static bool EncodeGrayPng(
+        const TArray<uint8>& Image, const FIntVector& Size, int CompressionLevel,
+        FWriteBuffers& WriteBuffers);
 
-    // Save all the depth images to disk
-    bool SaveDepth(const FString& Directory, float& OutMaxDepth);
+    // Compress the PNG scanlines in WriteBuffers.Raw and build the PNG
+    // file of the given color type (0 for gray, 6 for RGBA)
+    static bool DeflatePng(
+        const FIntVector& Size, uint8 ColorType, int CompressionLevel, FWriteBuffers& WriteBuffers);
 
-    // Save all the masks images to disk
-    bool SaveMasks(const FString& Directory, TMap<FString, uint8>& OutMasksMap);
+    // The name of a stream, 0 for "scene", 1 for "depth" and 2 for
+    // "masks"
+    static FString GetStreamName(uint Stream);
 
-    // Write an image as a PNG file in RGBA format. The alpha channel
-    // of the image is forced to 255.
-    bool WritePng(const TArray<FColor>& Bitmap, const FString& Filename);
+    // The size (width, height, nimages) of the images of a stream, 0
+    // for scene, 1 for depth and 2 for masks
+    static FIntVector GetStreamSize(const FIntVector& Size, uint Stream, const FSaveOptions& Options);
 
     // Prefix the PNG filenames with zeros : 13 -> "0013"
-    FString ZeroPadding(uint Index) const;
+    static FString ZeroPadding(uint Index, uint MaxIndex);
 };
@@ -1,6 +1,8 @@
 // Fill out your copyright notice in the Description page of Project Settings.
 
 #include "ScreenshotManager.h"
+#include "Engine/Engine.h"
+#include "Engine/GameViewportClient.h"
 
 
 TSharedPtr<FScreenshot> UScreenshotManager::Screenshot = nullptr;
@@ -9,10 +11,80 @@ TSharedPtr<FScreenshot> UScreenshotManager::Screenshot = nullptr;
 bool UScreenshotManager::Initialize(
     int Width, int Height, int NImages,
     AActor* OriginActor,
-    bool Verbose)
+    bool Verbose,
+    int AsyncSaves,
+    int CompressionLevel,
+    bool Pack,
+    const FString& DepthFormat,
+    const FString& MasksFormat,
+    int DepthStride,
+    int MasksStride,
+    const FString& Streams,
+    int StreamQueue)
 {
     FIntVector Size(Width, Height, NImages);
-    Screenshot = TSharedPtr<FScreenshot>(new FScreenshot(Size, OriginActor, Verbose));
+
+    FSaveOptions SaveOptions;
+    SaveOptions.CompressionLevel = CompressionLevel;
+    SaveOptions.bPack = Pack;
+    SaveOptions.DepthStride = DepthStride;
+    SaveOptions.MasksStride = MasksStride;
+    SaveOptions.StreamQueue = StreamQueue;
+
+    // the captured streams, as a comma separated list
+    static const TCHAR* StreamNames[] = {TEXT("scene"), TEXT("depth"), TEXT("masks")};
+    TArray<FString> Names;
+    Streams.ParseIntoArray(Names, TEXT(","));
+    for (int Stream = 0; Stream < 3; ++Stream)
+    {
+        SaveOptions.Streams[Stream] = Names.Remove(StreamNames[Stream]) > 0;
+    }
+
+    if (Names.Num() > 0)
+    {
+        UE_LOG(LogTemp, Error, TEXT("Unknown streams %s"), *FString::Join(Names, TEXT(",")));
+        return false;
+    }
+
+    if (DepthFormat == TEXT("float16"))
+    {
+        SaveOptions.DepthFormat = EDepthFormat::Float16;
+    }
+    else if (DepthFormat == TEXT("float32"))
+    {
+        SaveOptions.DepthFormat = EDepthFormat::Float32;
+    }
+    else if (DepthFormat != TEXT("png"))
+    {
+        UE_LOG(LogTemp, Error, TEXT("Unknown depth format %s"), *DepthFormat);
+        return false;
+    }
+
+    if (MasksFormat == TEXT("indexed"))
+    {
+        SaveOptions.MasksFormat = EMasksFormat::Indexed;
+    }
+    else if (MasksFormat == TEXT("rle"))
+    {
+        SaveOptions.MasksFormat = EMasksFormat::Rle;
+    }
+    else if (MasksFormat != TEXT("gray"))
+    {
+        UE_LOG(LogTemp, Error, TEXT("Unknown masks format %s"), *MasksFormat);
+        return false;
+    }
+
+    // a streamed frame is written before the end of the run, so
+    // neither normalized by the run's max depth nor by its actors
+    if (StreamQueue > 0 and
+        ((SaveOptions.Streams[1] and SaveOptions.DepthFormat == EDepthFormat::Png) or
+         (SaveOptions.Streams[2] and SaveOptions.MasksFormat == EMasksFormat::Gray)))
+    {
+        UE_LOG(LogTemp, Error, TEXT("Streaming requires raw depth and indexed masks"));
+        return false;
+    }
+
+    Screenshot = TSharedPtr<FScreenshot>(new FScreenshot(Size, OriginActor, Verbose, AsyncSaves, SaveOptions));
 
     return true;
 }
@@ -30,9 +102,21 @@ bool UScreenshotManager::Save(const FString& Directory, float& OutMaxDepth, TMap
 }
 
 
-void UScreenshotManager::Reset()
+int UScreenshotManager::PollSaves(TArray<FString>& OutSaved, TArray<FString>& OutFailed, TArray<float>& OutTimings)
+{
+    return Screenshot->PollSaves(OutSaved, OutFailed, OutTimings);
+}
+
+
+void UScreenshotManager::WaitSaves()
 {
-    Screenshot->Reset();
+    Screenshot->WaitSaves();
+}
+
+
+void UScreenshotManager::Reset(const FString& Directory)
+{
+    Screenshot->Reset(Directory);
 }
 
 
@@ -42,6 +126,30 @@ void UScreenshotManager::SetOriginActor(AActor* Actor)
 }
 
 
+bool UScreenshotManager::SetActorsIds(const TArray<FString>& Names, const TArray<int>& Ids)
+{
+    if (Names.Num() != Ids.Num())
+    {
+        UE_LOG(LogTemp, Error, TEXT("Actors names and ids differ in size"));
+        return false;
+    }
+
+    TMap<FString, uint8> ActorsIds;
+    for (int i = 0; i < Names.Num(); ++i)
+    {
+        if (Ids[i] < 0 or Ids[i] > 255)
+        {
+            UE_LOG(LogTemp, Error, TEXT("Invalid mask id %d for actor %s"), Ids[i], *Names[i]);
+            return false;
+        }
+        ActorsIds.Add(Names[i], static_cast<uint8>(Ids[i]));
+    }
+
+    Screenshot->SetActorsIds(ActorsIds);
+    return true;
+}
+
+
 bool UScreenshotManager::IsActorInFrame(AActor* Actor, int FrameIndex)
 {
     return Screenshot->IsActorInFrame(Actor, static_cast<uint>(FrameIndex));
@@ -52,3 +160,20 @@ bool UScreenshotManager::IsActorInLastFrame(AActor* Actor)
 {
     return Screenshot->IsActorInLastFrame(Actor);
 }
+
+
+bool UScreenshotManager::IsActorVisible(AActor* Actor)
+{
+    return Screenshot->IsActorVisible(Actor);
+}
+
+
+void UScreenshotManager::SetWorldRendering(bool Enabled)
+{
+    // the game still ticks and the physics still runs when the world
+    // is not rendered, only the scene captures need it
+    if (GEngine != nullptr and GEngine->GameViewport != nullptr)
+    {
+        GEngine->GameViewport->bDisableWorldRendering = not Enabled;
+    }
+}
@@ -27,7 +27,16 @@ public:
     static bool Initialize(
         int Width, int Height, int NImages,
         AActor* OriginActor,
-        bool Verbose = false);
+        bool Verbose = false,
+        int AsyncSaves = 1,
+        int CompressionLevel = 6,
+        bool Pack = false,
+        const FString& DepthFormat = TEXT("png"),
+        const FString& MasksFormat = TEXT("gray"),
+        int DepthStride = 1,
+        int MasksStride = 1,
+        const FString& Streams = TEXT("scene,depth,masks"),
+        int StreamQueue = 0);
 
     UFUNCTION(BlueprintCallable, Category="IntPhys")
     static bool Capture(const TArray<AActor*>& IgnoredActors);
@@ -36,14 +45,29 @@ public:
     static bool Save(const FString& Directory, float& OutMaxDepth, TMap<FString, uint8>& OutActorsMap);
 
     UFUNCTION(BlueprintCallable, Category="IntPhys")
-    static void Reset();
+    static int PollSaves(TArray<FString>& OutSaved, TArray<FString>& OutFailed, TArray<float>& OutTimings);
+
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static void WaitSaves();
+
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static void Reset(const FString& Directory = TEXT(""));
 
     UFUNCTION(BlueprintCallable, Category="IntPhys")
     static void SetOriginActor(AActor* Actor);
 
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static bool SetActorsIds(const TArray<FString>& Names, const TArray<int>& Ids);
+
     UFUNCTION(BlueprintCallable, Category="IntPhys")
     static bool IsActorInFrame(AActor* Actor, int FrameIndex);
 
     UFUNCTION(BlueprintCallable, Category="IntPhys")
     static bool IsActorInLastFrame(AActor* Actor);
+
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static bool IsActorVisible(AActor* Actor);
+
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static void SetWorldRendering(bool Enabled);
 };
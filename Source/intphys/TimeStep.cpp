@@ -0,0 +1,33 @@
+// Fill out your copyright notice in the Description page of Project Settings.
+
+#include "TimeStep.h"
+#include "HAL/IConsoleManager.h"
+#include "Misc/App.h"
+
+
+void UTimeStep::SetFixedTimeStep(float DeltaSeconds)
+{
+    if (DeltaSeconds > 0.0f)
+    {
+        FApp::SetFixedDeltaTime(DeltaSeconds);
+        FApp::SetUseFixedTimeStep(true);
+    }
+    else
+    {
+        FApp::SetUseFixedTimeStep(false);
+    }
+}
+
+
+void UTimeStep::SetMaxSpeed()
+{
+    IConsoleManager& Console = IConsoleManager::Get();
+    for (const TCHAR* Name : {TEXT("r.VSync"), TEXT("t.MaxFPS")})
+    {
+        IConsoleVariable* Variable = Console.FindConsoleVariable(Name);
+        if (Variable != nullptr)
+        {
+            Variable->Set(0, ECVF_SetByCode);
+        }
+    }
+}
@@ -0,0 +1,34 @@
+// Fill out your copyright notice in the Description page of Project Settings.
+
+#pragma once
+
+#include "CoreMinimal.h"
+#include "Kismet/BlueprintFunctionLibrary.h"
+#include "TimeStep.generated.h"
+
+
+/**
+ * Exposes functions to Python for controlling the game's clock.
+ *
+ * By default the engine advances the game by the wall-clock time
+ * elapsed since the last tick, so the physics depends on the frame
+ * rate the machine sustains. With a fixed time step each tick
+ * advances the game by the same duration and the engine does not
+ * wait for the wall clock.
+ */
+UCLASS()
+class INTPHYS_API UTimeStep : public UBlueprintFunctionLibrary
+{
+    GENERATED_BODY()
+
+public:
+    // Advance the game by `DeltaSeconds` at each tick, or by the
+    // elapsed wall-clock time if `DeltaSeconds` is not positive
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static void SetFixedTimeStep(float DeltaSeconds);
+
+    // Disable the vertical synchronization and the frame rate limit
+    // so that the game ticks as fast as possible
+    UFUNCTION(BlueprintCallable, Category="IntPhys")
+    static void SetMaxSpeed();
+};
@@ -12,6 +12,9 @@ public class intphys : ModuleRules
 
 		PrivateDependencyModuleNames.AddRange(new string[] {  });
 
+		// zlib is used to compress the PNG images
+		AddEngineThirdPartyPrivateStaticDependencies(Target, "zlib");
+
 		// Uncomment if you are using Slate UI
 		// PrivateDependencyModuleNames.AddRange(new string[] { "Slate", "SlateCore" });
 		
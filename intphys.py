@@ -15,24 +15,57 @@ To see command-line arguments, have a::
 
     ./intphys.py --help
 
+In daemon mode (--daemon option), the game stays alive once its scenes
+are rendered and waits for new batches of scenes. Submit them with::
+
+    ./intphys.py submit <socket> <json-file> -o <output-dir>
+
+To validate a scenes file and estimate the cost of its generation
+without launching the game, have a::
+
+    ./intphys.py plan <json-file> --history <previous-output-dir>
+
 """
 
 import argparse
+import contextlib
 import copy
+import datetime
 import json
 import logging
+import gzip
+import hashlib
 import os
 import re
 import shlex
 import shutil
 import subprocess
 import sys
+import tempfile
 import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 # absolute path to the directory containing this script
 INTPHYS_ROOT = os.path.dirname(os.path.abspath(__file__))
 
+# the Unreal Engine independant modules from the game are shared with
+# this script
+sys.path.insert(0, os.path.join(INTPHYS_ROOT, 'Content', 'Scripts'))
+from tools.dataset import (
+    DELTA_SECONDS, DEPTH_FORMATS, FORMATS, MASKS_FORMATS, NIMAGES,
+    PNG_COMPRESSION, STREAMS, TIMESTEP_MODES, get_capture_options,
+    get_scene_subdir, read_status)
+from tools.runfile import PACK_FILENAME, RunFile
+from tools.status import STATUS_FILENAMES, STATUS_FORMATS, decode_status
+from tools.scene_queue import SceneQueue
+from tools.scenes_json import (
+    expand_scenes, get_nchecks, get_nruns, load_scenes_json)
+from tools.server import submit
+from tools.telemetry import SAVE_STAGES, Progress
+
 # path to the UnrealEngine directory
 try:
     UE_ROOT = os.environ['UE_ROOT']
@@ -44,6 +77,10 @@ except KeyError:
 # the default screen resolution (in pixels)
 DEFAULT_RESOLUTION = '288x288'
 
+# the estimated memory used by a game instance, captures excepted (in
+# bytes)
+ENGINE_MEMORY = 1.5e9
+
 
 def intphys_binaries():
     """Returns the list of packaged intphys programs as absolute paths"""
@@ -64,61 +101,153 @@ class LogStripFormatter(logging.Formatter):
         return super(LogStripFormatter, self).format(record)
 
 
-class LogUnrealFormatter(LogStripFormatter):
-    """Removes begining date, module name and trailing '\n'"""
-    def format(self, record):
-        # remove all content before and including the second ':' (this
-        # strip off the date and id from Unreal log messages)
-        try:
-            record.msg = record.msg[
-                [m.start() for m in re.finditer(':', record.msg)][1]+1:]
-        except IndexError:
-            pass
-
-        return super(LogUnrealFormatter, self).format(record)
-
-
 class LogNoEmptyMessageFilter(logging.Filter):
     """Inhibits empty log messages (spaces only or \n)"""
     def filter(self, record):
         return len(record.getMessage().strip())
 
 
-class LogNoStartupMessagesFilter(logging.Filter):
-    """Removes luatorch import messages and unreal startup messages"""
-    def filter(self, record):
-        msg = record.getMessage()
-        return not (
-            'Using binned.' in msg or
-            'per-process limit of core file size to infinity.' in msg or
-            'depot+UE4-Releases' in msg)
-
-
-class LogInhibitUnrealFilter(logging.Filter):
-    """Inhibits some unrelevant Unreal log messages
+# The relevant Unreal log messages are the ones containing 'Error',
+# 'LogPython' or 'LogTemp' (except the textures loading ones), the
+# luatorch import messages and unreal startup messages are removed. A
+# single precompiled pattern is applied on the raw bytes so that the
+# dropped lines are never decoded.
+UNREAL_LOG_PATTERN = re.compile(
+    rb'^(?!.*(?:Using binned\.'
+    rb'|per-process limit of core file size to infinity\.'
+    rb'|depot\+UE4-Releases))'
+    rb'(?:.*(?:Error|LogPython)|(?!.*Display: Loaded TP).*LogTemp)')
 
-    Messages containing 'Error' or 'LogPython' are kept, other are
-    removed from the Unreal Engine log (messages like
-    "[data][id]message")
 
-    """
-    def filter(self, record):
-        msg = record.getMessage()
+class LogPump:
+    """Forwards the output of a subprocess to a logger
 
-        # filter out empty messages
-        if not msg.strip():
-            return False
+    The `pipe` is read by large chunks and split into lines. If
+    `verbose` is False, only the lines matching UNREAL_LOG_PATTERN are
+    kept, with the date and module name of the Unreal messages
+    removed.
 
-        # keep only messages with Error, logPython and LogTemp
-        return 'LogPython' in msg or 'Error' in msg or (
-            'LogTemp' in msg and 'Display: Loaded TP' not in msg)
+    The lines are read and forwarded to `log` by two different
+    threads, so that a slow terminal never blocks the subprocess: when
+    more than `maxlines` lines are waiting to be displayed, the new
+    lines are dropped.
 
+    If `raw_log` is not None, the whole output is also written to that
+    file, gzip compressed if its name ends with '.gz'.
 
-def GetLogger(verbose=False, name=None):
-    """Returns a logger configured to filter Unreal log messages
+    If `on_error` is not None, it is called on the first line
+    containing 'Error:'.
 
-    If `verbose` is True, do not filter any message, if `verbose` is
-    False (default), keep only relevant messages).
+    """
+    def __init__(self, pipe, log, verbose=False, raw_log=None,
+                 on_error=None, chunk_size=2**16, maxlines=10**5):
+        self.pipe = pipe
+        self.log = log
+        self.verbose = verbose
+        self.raw_log = raw_log
+        self.on_error = on_error
+        self.chunk_size = chunk_size
+        self.maxlines = maxlines
+
+        # number of lines forwarded to the log, filtered out and
+        # dropped because the log was too slow
+        self.nkept = 0
+        self.nfiltered = 0
+        self.ndropped = 0
+
+        # the lines waiting to be forwarded, shared by the two threads
+        self._pending = []
+        self._is_closed = False
+        self._condition = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._Read, daemon=True),
+            threading.Thread(target=self._Write, daemon=True)]
+
+    def Start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def Join(self):
+        """Wait the pipe is closed and all the kept lines are forwarded"""
+        for thread in self._threads:
+            thread.join()
+
+    def _Filter(self, lines):
+        """Return the decoded `lines` to be forwarded to the log"""
+        if self.verbose:
+            return [line.decode('utf8', 'replace') for line in lines]
+
+        kept = []
+        for line in lines:
+            if UNREAL_LOG_PATTERN.match(line):
+                # remove all content before and including the second
+                # ':' (this strip off the date and id from Unreal log
+                # messages)
+                line = line.decode('utf8', 'replace')
+                fields = line.split(':', 2)
+                kept.append(fields[2] if len(fields) == 3 else line)
+        self.nfiltered += len(lines) - len(kept)
+        return kept
+
+    def _Read(self):
+        raw_log = None
+        if self.raw_log:
+            raw_log = (
+                gzip.open(self.raw_log, 'wb', compresslevel=1)
+                if self.raw_log.endswith('.gz')
+                else open(self.raw_log, 'wb'))
+
+        fileno = self.pipe.fileno()
+        remainder = b''
+        try:
+            while True:
+                chunk = os.read(fileno, self.chunk_size)
+                if raw_log:
+                    raw_log.write(chunk)
+
+                # split the chunk in lines, the last one being
+                # incomplete until the next chunk (or the end of file)
+                lines = (remainder + chunk).split(b'\n')
+                remainder = lines.pop() if chunk else b''
+
+                if self.on_error and any(b'Error:' in l for l in lines):
+                    self.on_error()
+                    self.on_error = None
+
+                lines = self._Filter(lines)
+                with self._condition:
+                    if len(self._pending) + len(lines) > self.maxlines:
+                        self.ndropped += len(lines)
+                    elif lines:
+                        self._pending += lines
+                        self._condition.notify()
+
+                if not chunk:
+                    break
+        finally:
+            self.pipe.close()
+            if raw_log:
+                raw_log.close()
+            with self._condition:
+                self._is_closed = True
+                self._condition.notify()
+
+    def _Write(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._is_closed:
+                    self._condition.wait()
+                lines, self._pending = self._pending, []
+                if not lines:
+                    break
+
+            for line in lines:
+                self.log.info(line)
+            self.nkept += len(lines)
+
+
+def GetLogger(name=None):
+    """Returns a logger writing to standard output
 
     If `name` is not None, prefix all messages with it.
 
@@ -129,16 +258,9 @@ def GetLogger(verbose=False, name=None):
     log.setLevel(logging.DEBUG)
     log.addFilter(LogNoEmptyMessageFilter())
 
-    if not verbose:
-        log.addFilter(LogInhibitUnrealFilter())
-        log.addFilter(LogNoStartupMessagesFilter())
-        formatter = LogUnrealFormatter(msg)
-    else:
-        formatter = LogStripFormatter(msg)
-
     # log to standard output
     std_handler = logging.StreamHandler(sys.stdout)
-    std_handler.setFormatter(formatter)
+    std_handler.setFormatter(LogStripFormatter(msg))
     std_handler.setLevel(logging.DEBUG)
     log.addHandler(std_handler)
 
@@ -152,9 +274,10 @@ def ParseArgs():
         description='Data generator for the intphys project')
 
     parser.add_argument(
-        'scenes_file', metavar='<json-file>', help='''
+        'scenes_file', metavar='<json-file>', nargs='?', help='''
         json configuration file defining the scenes to be rendered,
-        for an exemple configuration file see {}'''
+        for an exemple configuration file see {}. Optional in daemon
+        mode.'''
         .format(os.path.join(INTPHYS_ROOT, 'Exemples', 'exemple.json')))
 
     parser.add_argument(
@@ -167,6 +290,25 @@ def ParseArgs():
         '-v', '--verbose', action='store_true',
         help='display all the UnrealEngine log messages')
 
+    parser.add_argument(
+        '-l', '--raw-log', metavar='<log-file>', default=None,
+        help='''write the whole UnrealEngine log to <log-file>, gzip
+        compressed if it ends with ".gz". When running several jobs, the
+        job index is inserted before the extension''')
+
+    parser.add_argument(
+        '-t', '--telemetry', metavar='<file>', default=None,
+        help='''write the rendering events (scenes and runs start and end,
+        capture and save times, retries) to <file> in JSON lines format,
+        default is <output-dir>/telemetry.jsonl. When running several
+        jobs, the job index is inserted before the extension''')
+
+    parser.add_argument(
+        '-p', '--progress', metavar='<seconds>', type=int, default=60,
+        help='''display the frames per second, scenes per hour and
+        remaining time of each job every <seconds>, 0 to disable, default
+        is %(default)s''')
+
     parser.add_argument(
         '-r', '--resolution', default=DEFAULT_RESOLUTION,
         metavar='<width>x<height>',
@@ -178,14 +320,138 @@ def ParseArgs():
         help='optional random seed for data generator, '
         'by default use the current system time')
 
-    parser.add_argument(
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
         '-f', '--force', action='store_true',
         help='overwrite <output-dir>, any existing content is erased')
 
-    # parser.add_argument(
-    #     '-j', '--njobs', type=int, default=1, metavar='<int>',
-    #     help='''number of data generation to run in parallel,
-    #     this option is ignored if --editor is specified''')
+    group.add_argument(
+        '--resume', action='store_true',
+        help='''resume a previous generation in <output-dir>: the scenes
+        already saved are kept and only the missing or partially saved
+        ones are generated''')
+
+    parser.add_argument(
+        '--png-compression', metavar='<level>', default='default',
+        help='''zlib compression level of the PNG images, from 0 (no
+        compression) to 9 (smallest files), or one of {}. "fast" is much
+        faster to save than "default" for slightly bigger files, default
+        is %(default)s'''.format(', '.join(PNG_COMPRESSION)))
+
+    parser.add_argument(
+        '--format', choices=FORMATS, default='png',
+        help='''format of the saved runs: "png" writes the images of each
+        stream and a status.json file, "pack" writes a single run.pack
+        file per run, convert it to PNG with "intphys.py export". Default
+        is %(default)s''')
+
+    parser.add_argument(
+        '--depth', choices=DEPTH_FORMATS, default='png',
+        help='''format of the depth images: "png" writes 8 bits images
+        normalized by the max depth of each run, "float16" and "float32"
+        write the raw depth (in cm) in depth.npy (or in run.pack), ready
+        to be memory mapped. Default is %(default)s''')
+
+    parser.add_argument(
+        '--masks', choices=MASKS_FORMATS, default='gray',
+        help='''format of the masks images: "gray" spreads the actors
+        over [0, 255] in each run, "indexed" writes the global ids of
+        the actors (the same in all the runs, listed in the status) as
+        8 bits images and "rle" run-length encodes them. Default is
+        %(default)s''')
+
+    parser.add_argument(
+        '--streams', default=','.join(STREAMS), metavar='<streams>',
+        help='''comma separated list of the captured streams, in {}.
+        The other streams are neither captured nor saved, for exemple
+        "--streams scene" does not trace the depth and masks rays.
+        Default is %(default)s'''.format(', '.join(STREAMS)))
+
+    parser.add_argument(
+        '--depth-stride', type=int, default=1, metavar='<int>',
+        help='''capture the depth images at one pixel every <int>
+        pixels of the scene images (in both dimensions), for exemple
+        72x72 depth images with a stride of 4 at 288x288. Default is
+        %(default)s''')
+
+    parser.add_argument(
+        '--masks-stride', type=int, default=1, metavar='<int>',
+        help='''capture the masks images at one pixel every <int>
+        pixels of the scene images, each masks pixel being the actor
+        at the center of its block (nearest neighbour). Default is
+        %(default)s''')
+
+    parser.add_argument(
+        '--status', choices=STATUS_FORMATS, default=STATUS_FORMATS[0],
+        help='''format of the status of each run: "json" is an indented
+        status.json file, "compact" the same without whitespaces,
+        "jsonl" a status.jsonl file with a frame per line and
+        "columnar" a compact status.json storing each field of each
+        actor as a list over the frames, the constant fields being
+        stored once (read them with tools.dataset.load_status).
+        Default is %(default)s''')
+
+    parser.add_argument(
+        '--stream-queue', type=int, default=0, metavar='<int>',
+        help='''write the frames to disk as they are captured, at most
+        <int> frames waiting in memory, instead of storing the whole
+        runs. Requires --depth float16|float32 and --masks indexed|rle
+        (or --streams without depth and masks). Default is
+        %(default)s (not streamed)''')
+
+    parser.add_argument(
+        '--timestep', choices=TIMESTEP_MODES, default=TIMESTEP_MODES[0],
+        help='''how the game's time advances: "realtime" follows the
+        wall clock so the simulation depends on the machine's frame
+        rate, "fixed" advances the game by --delta-seconds at each tick
+        and "max-speed" does the same without vertical synchronization
+        nor frame rate limit, as fast as the machine allows. The check
+        runs of the occluded test scenes are not rendered with "fixed"
+        and "max-speed" only: in "realtime" skipping the rendering would
+        shorten the ticks and so change the checked simulation. Default
+        is %(default)s''')
+
+    parser.add_argument(
+        '--delta-seconds', type=float, default=DELTA_SECONDS,
+        metavar='<seconds>',
+        help='''with --timestep fixed|max-speed, the duration of a game's
+        tick. Default is %(default).4f''')
+
+    parser.add_argument(
+        '--substeps', type=int, default=2, metavar='<int>',
+        help='''number of game's ticks between two captures, default is
+        %(default)s''')
+
+    parser.add_argument(
+        '-j', '--njobs', type=int, default=1, metavar='<int>',
+        help='''number of data generation to run in parallel,
+        this option is ignored if --editor or --standalone-game is
+        specified, default is %(default)s''')
+
+    parser.add_argument(
+        '--max-memory', type=float, default=None, metavar='<GB>',
+        help='''when running several jobs, start a job only if its memory
+        footprint fits in <GB> gigabytes, the footprint is estimated from
+        the resolution and then measured on the running jobs''')
+
+    parser.add_argument(
+        '--max-cpu', type=float, default=None, metavar='<cores>',
+        help='''when running several jobs, start a job only if the running
+        jobs use less than <cores> CPU cores, and lower the priority of
+        the most recent jobs when they use more''')
+
+    parser.add_argument(
+        '-q', '--queue', action='store_true',
+        help='''when running several jobs, the jobs pull the scenes from a
+        shared queue instead of processing a static subpart of the scenes,
+        so that the slowest job does not set the overall time''')
+
+    parser.add_argument(
+        '-d', '--daemon', metavar='<socket>', default=None,
+        help='''run in daemon mode: once the scenes are rendered, the game
+        waits for new batches of scenes submitted on the UNIX socket
+        <socket> with "intphys.py submit", this avoids the game's
+        startup cost for each batch. Not compatible with --njobs''')
 
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
@@ -202,6 +468,78 @@ def ParseArgs():
             'resolution is not in <width>x<height> format'
             '(e.g. "800x600"): {}'.format(args.resolution))
 
+    if args.scenes_file is None and args.daemon is None:
+        parser.error('the following arguments are required: <json-file>')
+
+    if args.daemon and args.njobs != 1:
+        parser.error('--daemon cannot be used with --njobs')
+
+    # the options of the capture, as given to the game
+    try:
+        args.capture = get_capture_options(
+            {'png_compression': args.png_compression,
+             'format': args.format, 'depth': args.depth,
+             'masks': args.masks, 'depth_stride': args.depth_stride,
+             'masks_stride': args.masks_stride, 'streams': args.streams,
+             'stream_queue': args.stream_queue, 'status': args.status,
+             'timestep': args.timestep, 'delta_seconds': args.delta_seconds,
+             'substeps': args.substeps})
+    except ValueError as err:
+        parser.error(err)
+
+    return args
+
+
+def ParseSubmitArgs(argv):
+    """Defines the argument parser of the submit command
+
+    Returns the arguments parsed from `argv`
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='intphys.py submit',
+        description='''Submit a batch of scenes to an intphys game
+        running in daemon mode (see the --daemon option)''')
+
+    parser.add_argument(
+        'socket', metavar='<socket>',
+        help='the UNIX socket the game is listening on')
+
+    parser.add_argument(
+        'scenes_file', metavar='<json-file>', nargs='?',
+        help='json configuration file defining the scenes to be rendered')
+
+    parser.add_argument(
+        '-o', '--output-dir', metavar='<output-dir>', default=None, help='''
+        directory where to write generated data, must be non-existing
+        or used along with the --force option. If <output-dir> is not
+        specified, the scenes are rendered in "dry mode".''')
+
+    parser.add_argument(
+        '-s', '--seed', default=None, metavar='<int>', type=int,
+        help='optional random seed for data generator, '
+        'by default use the current system time')
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        '-f', '--force', action='store_true',
+        help='overwrite <output-dir>, any existing content is erased')
+
+    group.add_argument(
+        '--resume', action='store_true',
+        help='''resume a previous generation in <output-dir>: the scenes
+        already saved are kept and only the missing or partially saved
+        ones are generated''')
+
+    group.add_argument(
+        '--stop', action='store_true',
+        help='''ask the game to exit once the scenes already submitted
+        are rendered''')
+
+    args = parser.parse_args(argv)
+    if args.scenes_file is None and not args.stop:
+        parser.error('the following arguments are required: <json-file>')
+
     return args
 
 
@@ -211,11 +549,11 @@ def _BalanceList(l, n):
     This is used for subjobs configuration generation. Sublists with
     only zeros are removed.
 
-    >>> balance_list([5, 1, 2], 2) == [[3, 0, 1], [2, 1, 1]]
-    >>> balance_list([1, 0], 2) == [[1, 0]]
+    >>> _BalanceList([5, 1, 2], 2) == [[3, 1, 1], [2, 0, 1]]
+    >>> _BalanceList([1, 0], 2) == [[1, 0]]
 
     """
-    balanced = [[(v / n if v >= n else 0) for v in l] for _ in range(n)]
+    balanced = [[(v // n if v >= n else 0) for v in l] for _ in range(n)]
 
     idx = 0
     for i, v in enumerate(l):
@@ -239,58 +577,380 @@ def _BalanceList(l, n):
     return balanced
 
 
-# def _BalanceConfig(config, njobs):
-#     """Split the `config` into `n` parts returned as list of dicts
-
-#     Return a tuple (subconfigs, nruns, njobs) where subconfigs is a
-#     list of JSON dicts, each one being the configuration of a
-#     subjob. `nruns` is a list of the total number of runs in each
-#     subjob. `njobs` can be modified and is returned as the third
-#     element in the pair.
-
-#     """
-#     # compute the list of balanced subjobs (from nested nested dict to
-#     # list of dicts or ints)
-#     values = [v for vv in config.itervalues() for v in vv.itervalues()]
-#     # from list of dicts or ints to nested list
-#     values = [v.values() if isinstance(v, dict) else [v] for v in values]
-#     # from nested list to list
-#     values = sum(values, [])
-
-#     balanced = _BalanceList(values, njobs)
-#     nruns = [sum(l) for l in balanced]
-
-#     if njobs > len(balanced):
-#         njobs = len(balanced)
-#         print('reducing the number of jobs to {}'.format(njobs))
-
-#     # create subconfigs for each subjob (from list to nested nested dict)
-#     subconfigs = [copy.deepcopy(config) for _ in range(njobs)]
-#     for i in range(njobs):
-#         for block_name, block_value in config.iteritems():
-#             j = 0
-#             for set_name, set_value in block_value.iteritems():
-#                 if isinstance(set_value, dict):  # test iteration
-#                     for subset_name in set_value.iterkeys():
-#                         subconfigs[i][block_name][set_name][subset_name] = (
-#                             balanced[i][j])
-#                         j += 1
-#                 else:  # train iteration
-#                     subconfigs[i][block_name][set_name] = balanced[i][j]
-#                     j += 1
-
-#     return subconfigs, nruns, njobs
+def _BalanceScenes(config, njobs):
+    """Split the scenes defined in `config` into `njobs` balanced subsets
+
+    `config` is a scenes configuration as loaded from a JSON file, in
+    the form {scenario: {'train': int, 'test_visible': {condition:
+    int}, 'test_occluded': {condition: int}}}.
+
+    Return a list of subsets, each one being the list of global
+    indices of the scenes attributed to a subjob, the scenes being
+    ordered as in tools.scenes_json.expand_scenes. There is less than
+    `njobs` subsets when there is less scenes than jobs.
+
+    """
+    # compute the list of balanced subjobs (from nested nested dict to
+    # list of dicts or ints)
+    values = [v for vv in config.values() for v in vv.values()]
+    # from list of dicts or ints to nested list
+    values = [list(v.values()) if isinstance(v, dict) else [v]
+              for v in values]
+    # from nested list to list
+    values = sum(values, [])
+
+    balanced = _BalanceList(values, njobs)
+
+    # the scenes of a given type are contiguous in the scenes list,
+    # distribute them to the subjobs
+    subsets = [[] for _ in balanced]
+    index = 0
+    for j in range(len(values)):
+        for i, counts in enumerate(balanced):
+            subsets[i] += list(range(index, index + counts[j]))
+            index += counts[j]
+
+    return subsets
+
+
+def _DisplayProgress(monitored, nscenes=None):
+    """Display the progress of the `monitored` jobs
+
+    `monitored` is a list of (log, progress, njob_scenes) for each
+    job, with `progress` a tools.telemetry.Progress and `njob_scenes`
+    the number of scenes to be rendered by the job, or None if the
+    scenes are pulled from a queue of `nscenes` scenes shared by all
+    the jobs.
+
+    """
+    for _, progress, _ in monitored:
+        progress.update()
+
+    # the remaining scenes and rendering speed of the shared queue
+    shared = [p for _, p, n in monitored if n is None]
+    shared_remaining = None if nscenes is None else nscenes - sum(
+        p.nrendered + p.nskipped for p in shared)
+    shared_speed = sum(p.scenes_per_hour() for p in shared)
+
+    for log, progress, njob_scenes in monitored:
+        if progress.t_start is None:
+            continue
+
+        if njob_scenes is None:
+            remaining, speed = shared_remaining, shared_speed
+        else:
+            remaining = (
+                njob_scenes - progress.nrendered - progress.nskipped)
+            speed = progress.scenes_per_hour()
+
+        eta = 'unknown'
+        if progress.is_done:
+            eta = 'done'
+        elif remaining is not None and speed:
+            eta = str(datetime.timedelta(
+                seconds=int(3600 * remaining / speed)))
+
+        log.info('{:.1f} frames/s, {:.1f} scenes/hour, {} scenes rendered, '
+                 '{} retries, ETA {}'.format(
+                     progress.frames_per_second(),
+                     progress.scenes_per_hour(),
+                     progress.nrendered, progress.nretries, eta))
+
+        if progress.nsaved:
+            log.info('{:.2f}s per run saved ({})'.format(
+                progress.save_time_per_run(), ', '.join(
+                    '{} {:.2f}s'.format(
+                        stage, progress.save_time_per_run(stage))
+                    for stage in SAVE_STAGES if stage != 'total')))
+
+
+@contextlib.contextmanager
+def _MonitorProgress(monitored, interval, nscenes=None):
+    """Display the progress of the `monitored` jobs every `interval` seconds
+
+    The progress is displayed in a background thread until the end of
+    the context, see _DisplayProgress for the arguments. Do nothing if
+    `interval` is 0.
+
+    """
+    stop = threading.Event()
+
+    def Monitor():
+        while not stop.wait(interval):
+            _DisplayProgress(monitored, nscenes)
+
+    thread = threading.Thread(target=Monitor, daemon=True)
+    if interval:
+        thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        if interval:
+            thread.join()
+
+
+def ParsePlanArgs(argv):
+    """Defines the argument parser of the plan command
+
+    Returns the arguments parsed from `argv`
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='intphys.py plan',
+        description='''Validate a scenes file and estimate the cost of its
+        generation, without launching the game''')
+
+    parser.add_argument(
+        'scenes_file', metavar='<json-file>',
+        help='json configuration file defining the scenes to be rendered')
+
+    parser.add_argument(
+        '-r', '--resolution', default=DEFAULT_RESOLUTION,
+        metavar='<width>x<height>',
+        help=('resolution of the rendered images (in pixels), '
+              'default is %(default)s'))
+
+    parser.add_argument(
+        '-j', '--njobs', type=int, default=1, metavar='<int>',
+        help='''number of data generation to run in parallel,
+        default is %(default)s''')
+
+    parser.add_argument(
+        '-H', '--history', metavar='<output-dir>', action='append',
+        default=[], help='''output directory of a previous generation, its
+        telemetry files and data are used to estimate the rendering
+        speed and disk usage. Can be repeated.''')
+
+    parser.add_argument(
+        '-l', '--list', action='store_true',
+        help='list the scenes to be rendered along with their runs')
+
+    args = parser.parse_args(argv)
+    if not re.match('[0-9]+x[0-9]+', args.resolution):
+        parser.error(
+            'resolution is not in <width>x<height> format'
+            '(e.g. "800x600"): {}'.format(args.resolution))
+
+    if args.njobs < 1:
+        parser.error('njobs must be a strictly positive integer')
+
+    return args
+
+
+def JobFootprint(resolution, nimages=NIMAGES, engine_memory=ENGINE_MEMORY):
+    """Return the estimated memory footprint of a job, in bytes
+
+    On top of the engine itself, the game stores the scene (RGBA),
+    depth (float) and masks (uint8) images of the `nimages` frames of
+    two runs (the one being captured and the one being saved in
+    background), plus a RGBA and a compressed write buffers (see
+    Source/intphys/Screenshot.h). In streaming mode, only the queued
+    frames are stored and `nimages` is the queue size.
+
+    """
+    return engine_memory + _Pixels(resolution) * (
+        2 * nimages * (4 + 4 + 1) + 4 + 1)
+
+
+class JobGovernor:
+    """Admit and throttle concurrent jobs within memory and CPU budgets
+
+    A job must be admitted before it starts: it waits until its
+    memory footprint fits in `max_memory` (in bytes) and the CPU used
+    by the running jobs is below `max_cpu` (in number of cores). The
+    footprint of a job is first estimated as `footprint` (or the peak
+    memory of the running jobs if greater) and then measured as the
+    peak memory of the terminated jobs. The first job is always
+    admitted.
+
+    The resident memory (RSS) and CPU usage of the running jobs, their
+    subprocesses included, are read from /proc every `interval`
+    seconds. When the CPU usage exceeds `max_cpu`, the most recent job
+    is throttled by lowering its scheduling priority. The priority is
+    restored once the usage goes back under the budget.
+
+    """
+    def __init__(self, footprint, max_memory=None, max_cpu=None,
+                 interval=1):
+        self.footprint = footprint
+        self.measured_footprint = None
+        self.max_memory = max_memory
+        self.max_cpu = max_cpu
+        self.interval = interval
+
+        # pid -> {'rss', 'peak', 'cpu', 'ticks', 'throttled'} for the running
+        # jobs, in admission order, and number of admitted jobs not
+        # yet started
+        self._jobs = {}
+        self._starting = 0
+
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._Monitor, daemon=True)
+
+    def Start(self):
+        self._thread.start()
+
+    def Stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def Admit(self, log):
+        """Wait until a new job can run within the budgets"""
+        with self._condition:
+            is_waiting = False
+            while not self._CanAdmit():
+                if not is_waiting:
+                    log.info('waiting for memory or CPU to start the job')
+                    is_waiting = True
+                self._condition.wait(self.interval)
+            self._starting += 1
+
+    def Register(self, pid):
+        """Follow the admitted job running as process `pid`"""
+        with self._condition:
+            self._starting -= 1
+            self._jobs[pid] = {
+                'rss': 0, 'peak': 0, 'cpu': 0, 'ticks': None,
+                'throttled': False}
+
+    def Release(self, pid):
+        """Stop following the terminated job `pid`"""
+        with self._condition:
+            job = self._jobs.pop(pid, None)
+            if job and job['peak']:
+                self.measured_footprint = max(
+                    self.measured_footprint or 0, job['peak'])
+            self._condition.notify_all()
+
+    def GetFootprint(self):
+        """Return the current estimation of a job's memory footprint"""
+        if self.measured_footprint is not None:
+            return self.measured_footprint
+        return max([self.footprint] + [
+            j['peak'] for j in self._jobs.values()])
+
+    def _CanAdmit(self):
+        njobs = len(self._jobs) + self._starting
+        if njobs == 0:
+            return True
+
+        # a running job may grow up to the footprint
+        if self.max_memory is not None:
+            footprint = self.GetFootprint()
+            memory = (self._starting + 1) * footprint + sum(
+                max(j['rss'], footprint) for j in self._jobs.values())
+            if memory > self.max_memory:
+                return False
+
+        # a job starting is assumed to use a single core
+        if self.max_cpu is not None:
+            cpu = self._starting + 1 + sum(
+                j['cpu'] for j in self._jobs.values())
+            if cpu > self.max_cpu:
+                return False
+
+        return True
+
+    @staticmethod
+    def _ReadProcesses():
+        """Return the dict pid -> (ppid, rss, ticks) of all the processes
+
+        `rss` is the resident memory in bytes and `ticks` the CPU time
+        in clock ticks.
+
+        """
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        processes = {}
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                # the process name is between parenthesis and may
+                # contain spaces
+                stat = open('/proc/{}/stat'.format(pid), 'r').read()
+                fields = stat[stat.rindex(')') + 2:].split()
+                processes[int(pid)] = (
+                    int(fields[1]), int(fields[21]) * page_size,
+                    int(fields[11]) + int(fields[12]))
+            except (OSError, ValueError, IndexError):
+                # the process terminated in the meantime
+                pass
+        return processes
+
+    def _Monitor(self):
+        clock_ticks = os.sysconf('SC_CLK_TCK')
+        while not self._stop.wait(self.interval):
+            processes = self._ReadProcesses()
+            children = {}
+            for pid, (ppid, _, _) in processes.items():
+                children.setdefault(ppid, []).append(pid)
+
+            with self._condition:
+                for pid, job in self._jobs.items():
+                    # sum the usage of the job and its subprocesses
+                    rss, ticks, tree = 0, 0, [pid]
+                    while tree:
+                        p = tree.pop()
+                        if p in processes:
+                            rss += processes[p][1]
+                            ticks += processes[p][2]
+                        tree += children.get(p, [])
+
+                    job['rss'] = rss
+                    job['peak'] = max(job['peak'], rss)
+                    if job['ticks'] is not None:
+                        job['cpu'] = (ticks - job['ticks']) / (
+                            clock_ticks * self.interval)
+                    job['ticks'] = ticks
+
+                self._Throttle()
+                self._condition.notify_all()
+
+    def _Throttle(self):
+        """Lower or restore the priority of the most recent jobs"""
+        if self.max_cpu is None:
+            return
+
+        cpu = sum(j['cpu'] for j in self._jobs.values())
+        if cpu > self.max_cpu:
+            for pid, job in reversed(list(self._jobs.items())):
+                if not job['throttled']:
+                    self._SetPriority(pid, 19)
+                    job['throttled'] = True
+                    break
+        elif cpu < 0.9 * self.max_cpu:
+            for pid, job in self._jobs.items():
+                if job['throttled']:
+                    self._SetPriority(pid, 0)
+                    job['throttled'] = False
+                    break
+
+    @staticmethod
+    def _SetPriority(pid, priority):
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, priority)
+        except (OSError, PermissionError):
+            # the job terminated or, when restoring a priority, the
+            # user is not allowed to raise it again
+            pass
 
 
 def _Run(command, log, scenes_file, output_dir, cwd=None,
-         seed=None, resolution=DEFAULT_RESOLUTION):
+         seed=None, resolution=DEFAULT_RESOLUTION, queue=None,
+         subset=None, resume=False, daemon=None, verbose=False,
+         raw_log=None, telemetry=None, governor=None, capture=None):
     """Run `command` as a subprocess
 
-    The `command` stdout and stderr are forwarded to `log`. The
-    `command` runs with the following environment variables, in top of
-    the current environment:
+    The `command` stdout and stderr are forwarded to `log`, keeping
+    only the relevant messages if `verbose` is False, and written to
+    the file `raw_log` if not None (see LogPump). If `governor` is not
+    None, the `command` waits to be admitted by it before starting
+    (see JobGovernor). The `command` runs with the following
+    environment variables, in top of the current environment:
 
-    INTPHYS_SCENES is the absolute path to `SCENES_file`.
+    INTPHYS_SCENES is the absolute path to `scenes_file`, if not None
 
     INTPHYS_DATA is the absolute path to `output_dir` with a
        trailing slash added.
@@ -299,13 +959,34 @@ def _Run(command, log, scenes_file, output_dir, cwd=None,
 
     INTPHYS_RESOLUTION is `resolution`
 
+    INTPHYS_QUEUE is the absolute path to `queue`, a scenes queue
+       shared by several jobs
+
+    INTPHYS_SUBSET is the absolute path to `subset`, a JSON file
+       listing the indices of the scenes to render
+
+    INTPHYS_RESUME is defined if `resume` is True
+
+    INTPHYS_SOCKET is the absolute path to `daemon`, the socket on
+       which the game waits for new batches of scenes
+
+    INTPHYS_TELEMETRY is the absolute path to `telemetry`, the file
+       where the game reports its progress
+
+    INTPHYS_CAPTURE is `capture`, the options of the capture (see
+       tools.dataset.get_capture_options) as a JSON dict
+
+    Return the exit code of the `command`.
+
     """
     # setup the environment variables used in python scripts
     environ = copy.deepcopy(os.environ)
     environ['INTPHYS_ROOT'] = INTPHYS_ROOT
-    environ['INTPHYS_SCENES'] = os.path.abspath(scenes_file)
     environ['INTPHYS_RESOLUTION'] = resolution
 
+    if scenes_file is not None:
+        environ['INTPHYS_SCENES'] = os.path.abspath(scenes_file)
+
     if output_dir:
         # get the output directory as absolute path
         output_dir = os.path.abspath(output_dir)
@@ -317,7 +998,28 @@ def _Run(command, log, scenes_file, output_dir, cwd=None,
     if seed is not None:
         environ['INTPHYS_SEED'] = str(seed)
 
+    if queue is not None:
+        environ['INTPHYS_QUEUE'] = os.path.abspath(queue)
+
+    if subset is not None:
+        environ['INTPHYS_SUBSET'] = os.path.abspath(subset)
+
+    if resume:
+        environ['INTPHYS_RESUME'] = '1'
+
+    if daemon is not None:
+        environ['INTPHYS_SOCKET'] = os.path.abspath(daemon)
+        log.info('waiting for scenes on ' + environ['INTPHYS_SOCKET'])
+
+    if telemetry is not None:
+        environ['INTPHYS_TELEMETRY'] = os.path.abspath(telemetry)
+
+    if capture is not None:
+        environ['INTPHYS_CAPTURE'] = json.dumps(capture)
+
     # run the command as a subprocess
+    if governor:
+        governor.Admit(log)
     job = subprocess.Popen(
         shlex.split(command),
         stdin=None,
@@ -325,43 +1027,269 @@ def _Run(command, log, scenes_file, output_dir, cwd=None,
         stderr=subprocess.STDOUT,
         cwd=cwd,
         env=environ)
+    if governor:
+        governor.Register(job.pid)
 
-    # join the command output to log (from
-    # https://stackoverflow.com/questions/35488927)
-    def ConsumeLines(pipe, consume):
-        with pipe:
-            # NOTE: workaround read-ahead bug
-            for line in iter(pipe.readline, b''):
-                line = line.decode('utf8')
-                consume(line)
-                # exit the UE subprocess on the first encountered error
-                if 'Error:' in line:
-                    job.kill()
-            consume('\n')
-
-    threading.Thread(
-        target=ConsumeLines,
-        args=[job.stdout, lambda line: log.info(line)]).start()
+    # forward the command output to log, exit the UE subprocess on
+    # the first encountered error
+    pump = LogPump(
+        job.stdout, log, verbose=verbose, raw_log=raw_log,
+        on_error=job.kill)
+    pump.Start()
 
     # wait the job is finished, forwarding any error
     job.wait()
+    if governor:
+        governor.Release(job.pid)
+    pump.Join()
+    log.info('{} log lines displayed, {} filtered out, {} dropped'.format(
+        pump.nkept, pump.nfiltered, pump.ndropped))
     if job.returncode:
         log.error('command "%s" returned with %s', command, job.returncode)
-        sys.exit(job.returncode)
+    return job.returncode
+
+
+def _JobFile(filename, index):
+    """Return the log or telemetry file of the subjob `index`
+
+    >>> _JobFile('intphys.log.gz', 2) == 'intphys.2.log.gz'
+
+    """
+    if filename is None:
+        return None
+
+    root, ext = os.path.splitext(filename)
+    if ext == '.gz':
+        root, ext = os.path.splitext(root)
+        ext += '.gz'
+    return '{}.{}{}'.format(root, index, ext)
+
+
+def _MergeJob(data_dir, output_dir):
+    """Move the scenes generated by a subjob into the `output_dir`
+
+    Return the number of merged scenes.
+
+    """
+    merged = 0
+    for name in os.listdir(data_dir):
+        if re.match('^[0-9]+_.+$', name):
+            shutil.move(
+                os.path.join(data_dir, name), os.path.join(output_dir, name))
+            merged += 1
+
+    return merged
+
+
+def _RunJob(command, job_dir, log, cwd=None, resolution=DEFAULT_RESOLUTION,
+            verbose=False, dry_mode=False, resume=False, raw_log=None,
+            telemetry=None, governor=None, capture=None):
+    """Run a subjob as configured in `job_dir` and return its exit code
+
+    `job_dir` contains the scenes file, the indices of the scenes to
+    render and the parameters of the subjob (scenes.json, subset.json
+    and job.json), the data is written in `job_dir`/data. Unless
+    `resume` is True, any data from a previous execution is erased.
+
+    """
+    job = json.load(open(os.path.join(job_dir, 'job.json'), 'r'))
+
+    data_dir = None
+    if not dry_mode:
+        data_dir = os.path.join(job_dir, 'data')
+        if os.path.exists(data_dir) and not resume:
+            shutil.rmtree(data_dir)
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+    return _Run(
+        command, log, os.path.join(job_dir, 'scenes.json'), data_dir,
+        cwd=cwd, seed=job['seed'], resolution=resolution,
+        subset=os.path.join(job_dir, 'subset.json'), resume=resume,
+        verbose=verbose, raw_log=_JobFile(raw_log, job['index']),
+        telemetry=_JobFile(telemetry, job['index']), governor=governor,
+        capture=capture)
+
+
+def _RunSplit(command, scenes_file, output_dir, njobs, seed, cwd=None,
+              resolution=DEFAULT_RESOLUTION, verbose=False, resume=False,
+              raw_log=None, telemetry=None, progress=60, governor=None,
+              capture=None):
+    """Run `njobs` jobs, each one on a static subpart of the scenes
+
+    The scenes are split into subsets of equivalent workload. Each job
+    writes its data in `output_dir`/jobs/<job-index>
+    and the generated scenes are finally merged in `output_dir`. The
+    directory of a failed job is kept so it can be restarted with
+    `resume` being True. Return the list of the failed jobs indices.
+
+    The progress of each job is displayed every `progress` seconds.
+
+    """
+    # in dry mode the jobs configurations are written in a temp directory
+    tmp_dir = None
+    if output_dir:
+        jobs_dir = os.path.join(output_dir, 'jobs')
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        jobs_dir = tmp_dir.name
+
+    if resume:
+        # restart the jobs not yet merged from a previous execution
+        jobs = sorted(
+            (os.path.join(jobs_dir, d) for d in os.listdir(jobs_dir)),
+            key=lambda d: int(os.path.basename(d)))
+        njobs = len(jobs)
+        print('resuming {} jobs'.format(njobs))
+    else:
+        # split the scenes into balanced subsets
+        subsets = _BalanceScenes(json.load(open(scenes_file, 'r')), njobs)
+        if njobs > len(subsets):
+            njobs = len(subsets)
+            print('reducing the number of jobs to {}'.format(njobs))
+
+        # write the configuration of each job in its own subdirectory,
+        # the scenes keep their global index and random seed so the
+        # generated data is the same as with a single job
+        jobs = []
+        for i, subset in enumerate(subsets):
+            job_dir = os.path.join(jobs_dir, str(i+1))
+            os.makedirs(job_dir)
+
+            shutil.copyfile(scenes_file, os.path.join(job_dir, 'scenes.json'))
+            open(os.path.join(job_dir, 'subset.json'), 'w').write(
+                json.dumps(subset))
+            open(os.path.join(job_dir, 'job.json'), 'w').write(
+                json.dumps({'index': i+1, 'seed': seed}, indent=4))
+
+            jobs.append(job_dir)
+
+    # the job's logger, progress and number of scenes to render
+    monitored = []
+    for job_dir in jobs:
+        index = json.load(open(os.path.join(job_dir, 'job.json')))['index']
+        monitored.append((
+            GetLogger(name='job {}'.format(index)),
+            Progress(_JobFile(telemetry, index)),
+            len(json.load(open(os.path.join(job_dir, 'subset.json'))))))
+
+    # run the subjobs in parallel
+    with _MonitorProgress(monitored, progress):
+        with ThreadPoolExecutor(max_workers=njobs) as executor:
+            returncodes = list(executor.map(
+                lambda job: _RunJob(
+                    command, job[0], job[1][0], cwd=cwd,
+                    resolution=resolution, verbose=verbose,
+                    dry_mode=output_dir is None, resume=resume,
+                    raw_log=raw_log, telemetry=telemetry,
+                    governor=governor, capture=capture),
+                zip(jobs, monitored)))
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+        failed = [i+1 for i, r in enumerate(returncodes) if r]
+    else:
+        # merge the data of the successful jobs in the output
+        # directory, keep the failed jobs for a later restart
+        failed = []
+        for job_dir, returncode in zip(jobs, returncodes):
+            job = json.load(open(os.path.join(job_dir, 'job.json'), 'r'))
+            if returncode:
+                failed.append(job['index'])
+                print('job {} failed, restart it with the --resume option'
+                      .format(job['index']))
+            else:
+                _MergeJob(os.path.join(job_dir, 'data'), output_dir)
+                shutil.rmtree(job_dir)
+
+        if not os.listdir(jobs_dir):
+            os.rmdir(jobs_dir)
+
+    return failed
+
+
+def _RunQueue(command, scenes_file, output_dir, njobs, seed, cwd=None,
+              resolution=DEFAULT_RESOLUTION, verbose=False, resume=False,
+              raw_log=None, telemetry=None, progress=60, governor=None,
+              capture=None):
+    """Run `njobs` jobs pulling the scenes from a shared queue
+
+    Each job renders the next scene available in the queue until the
+    queue is empty. The scenes have a global index so the jobs write
+    their data directly in `output_dir`. If `resume` is True the jobs
+    skip the scenes already saved. Return the list of the failed jobs
+    indices.
+
+    The progress of each job is displayed every `progress` seconds.
+
+    """
+    with tempfile.TemporaryDirectory() as queue_dir:
+        queue = os.path.join(queue_dir, 'queue.json')
+        scenes = load_scenes_json(scenes_file)
+        SceneQueue.create(queue, scenes)
+
+        # the job's logger and progress, the remaining time is
+        # estimated on the scenes shared by all the jobs
+        monitored = [
+            (GetLogger(name='job {}'.format(i)),
+             Progress(_JobFile(telemetry, i)), None)
+            for i in range(1, njobs+1)]
+
+        with _MonitorProgress(monitored, progress, nscenes=len(scenes)):
+            with ThreadPoolExecutor(max_workers=njobs) as executor:
+                returncodes = list(executor.map(
+                    lambda i: _Run(
+                        command, monitored[i-1][0], scenes_file,
+                        output_dir, cwd=cwd, seed=seed,
+                        resolution=resolution, queue=queue, resume=resume,
+                        verbose=verbose, raw_log=_JobFile(raw_log, i),
+                        telemetry=_JobFile(telemetry, i), governor=governor,
+                        capture=capture),
+                    range(1, njobs+1)))
+
+    return [i+1 for i, r in enumerate(returncodes) if r]
 
 
 def RunBinary(output_dir, scenes_file, njobs=1, seed=None,
-              resolution=DEFAULT_RESOLUTION, verbose=False):
+              resolution=DEFAULT_RESOLUTION, verbose=False, queue=False,
+              resume=False, daemon=None, raw_log=None, telemetry=None,
+              progress=60, max_memory=None, max_cpu=None, capture=None):
     """Run the intphys packaged binary as a subprocess
 
-    If `njobs` is greater than 1, split the json configuration file
-    into subparts of equivalent workload and run several jobs in
-    parallel
+    If `njobs` is greater than 1, run several jobs in parallel. If
+    `queue` is True, the jobs pull the scenes from a shared queue,
+    else the json configuration file is split into subparts of
+    equivalent workload.
+
+    If `resume` is True, the scenes already saved in `output_dir` are
+    not generated again. When resuming a split generation, the jobs
+    left unfinished in `output_dir`/jobs are restarted, when there is
+    no such jobs the remaining scenes are pulled from a shared queue.
+
+    If `daemon` is not None, the game waits for new batches of scenes
+    on that socket once the scenes in `scenes_file` (if any) are
+    rendered.
+
+    The game reports its progress in the JSON lines file `telemetry`
+    (when running several jobs, the job index is inserted before the
+    file extension). If `progress` is not 0 the frames per second,
+    scenes per hour and remaining time of each job are displayed every
+    `progress` seconds.
+
+    When running several jobs, they are started only if they fit in a
+    memory budget of `max_memory` bytes and a CPU budget of `max_cpu`
+    cores (see JobGovernor).
+
+    The `capture` options are given to the game (see
+    tools.dataset.get_capture_options).
 
     """
     if type(njobs) is not int or njobs < 1:
         raise IOError('njobs argument must be a strictly positive integer')
 
+    if daemon is not None and njobs != 1:
+        raise IOError('daemon mode cannot run several jobs')
+
     # overload binary if defined in the environment
     if 'INTPHYS_BINARY' in os.environ:
         intphys_binary = os.environ['INTPHYS_BINARY']
@@ -371,7 +1299,7 @@ def RunBinary(output_dir, scenes_file, njobs=1, seed=None,
     if not os.path.isfile(intphys_binary):
         raise IOError('No such file: {}'.format(intphys_binary))
 
-    if not os.path.isfile(scenes_file):
+    if scenes_file is not None and not os.path.isfile(scenes_file):
         raise IOError('Json file not found: {}'.format(scenes_file))
 
     print('running {}{}'.format(
@@ -383,53 +1311,71 @@ def RunBinary(output_dir, scenes_file, njobs=1, seed=None,
     # where that relative path works.
     cwd = os.path.join(INTPHYS_ROOT, 'Package/LinuxNoEditor')
 
+    res = resolution.split('x')
+    command = intphys_binary + ' -windowed ResX={} ResY={}'.format(
+        res[0], res[1])
+
     if njobs == 1:
-        res = resolution.split('x')
-        _Run(intphys_binary + ' -windowed ResX={} ResY={}'.format(res[0], res[1]),
-             GetLogger(verbose=verbose),
-             scenes_file, output_dir, seed=seed,
-             resolution=resolution, cwd=cwd)
+        log = GetLogger()
+        nscenes = None if scenes_file is None else len(
+            load_scenes_json(scenes_file))
+        with _MonitorProgress(
+                [(log, Progress(telemetry), nscenes)], progress):
+            returncode = _Run(
+                command, log, scenes_file, output_dir, seed=seed,
+                resolution=resolution, cwd=cwd, resume=resume,
+                daemon=daemon, verbose=verbose, raw_log=raw_log,
+                telemetry=telemetry, capture=capture)
+        if returncode:
+            sys.exit(returncode)
+        return
+
+    # parallel jobs must share the same seed, the scenes have their own
+    # random generator derived from it
+    seed = int(round(time.time() * 1000)) if seed is None else seed
+
+    if resume and not os.path.isdir(os.path.join(output_dir, 'jobs')):
+        queue = True
+
+    governor = None
+    if max_memory is not None or max_cpu is not None:
+        governor = JobGovernor(
+            JobFootprint(
+                resolution,
+                nimages=(capture or {}).get('stream_queue') or NIMAGES),
+            max_memory=max_memory, max_cpu=max_cpu)
+        print('estimated memory per job: {}'.format(
+            _HumanBytes(governor.footprint)))
+        governor.Start()
+
+    if queue:
+        failed = _RunQueue(
+            command, scenes_file, output_dir, njobs, seed, cwd=cwd,
+            resolution=resolution, verbose=verbose, resume=resume,
+            raw_log=raw_log, telemetry=telemetry, progress=progress,
+            governor=governor, capture=capture)
     else:
-        raise NotImplementedError('njobs option not yet implemented')
-        # # split the json configuration file into balanced subparts
-        # subconfigs, nruns, njobs = _BalanceConfig(
-        #     json.load(open(config_file, 'r')), njobs)
-
-        # # increase artificially the nruns to have margin for retries
-        # # (this can occur for test runs)
-        # nruns = [10 * r for r in nruns]
-
-        # # write them in subdirectories
-        # for i, config in enumerate(subconfigs, 1):
-        #     path = os.path.join(output_dir, str(i))
-        #     os.makedirs(path)
-        #     open(os.path.join(path, 'config.json'), 'w').write(
-        #         json.dumps(config, indent=4))
-
-        # # parallel must defines a different seed for each job
-        # seed = int(round(time.time() * 1000)) if seed is None else seed
-
-        # # define arguments list for each jobs
-        # _out = [os.path.join(output_dir, str(i)) for i in range(1, njobs+1)]
-        # _conf = [os.path.join(output_dir, str(i), 'config.json')
-        #          for i in range(1, njobs+1)]
-        # _seed = [str(seed + sum(nruns[:i])) for i in range(njobs)]
-        # _log = [GetLogger(name='job {}'.format(i))
-        #         for i in range(1, njobs+1)]
-
-        # # run the subprocesses
-        # joblib.Parallel(n_jobs=njobs, backend='threading')(
-        #     joblib.delayed(_Run)(
-        #         INTPHYS_BINARY, _log[i], _conf[i], _out[i],
-        #         seed=_seed[i], resolution=resolution)
-        #     for i in range(njobs))
+        failed = _RunSplit(
+            command, scenes_file, output_dir, njobs, seed, cwd=cwd,
+            resolution=resolution, verbose=verbose, resume=resume,
+            raw_log=raw_log, telemetry=telemetry, progress=progress,
+            governor=governor, capture=capture)
+
+    if governor:
+        governor.Stop()
+
+    if failed:
+        print('{} jobs failed: {}'.format(
+            len(failed), ', '.join(str(f) for f in failed)))
+        sys.exit(1)
 
 
 def RunEditor(output_dir, scenes_file, seed=None,
               resolution=DEFAULT_RESOLUTION, verbose=False,
-              standalone_game=False):
+              standalone_game=False, resume=False, daemon=None,
+              raw_log=None, telemetry=None, capture=None):
     """Run the intphys project within the UnrealEngine editor"""
-    log = GetLogger(verbose=verbose)
+    log = GetLogger()
 
     editor_dir = os.path.join(UE_ROOT, 'Engine', 'Binaries', 'Linux')
     if not os.path.isdir(editor_dir):
@@ -446,92 +1392,533 @@ def RunEditor(output_dir, scenes_file, seed=None,
         res = resolution.split('x')
         command += ' -game -windowed ResX={} ResY={}'.format(res[0], res[1])
 
-    _Run(command, log, scenes_file, output_dir,
-         seed=seed, resolution=resolution, cwd=editor_dir)
+    returncode = _Run(command, log, scenes_file, output_dir,
+                      seed=seed, resolution=resolution, cwd=editor_dir,
+                      resume=resume, daemon=daemon, verbose=verbose,
+                      raw_log=raw_log, telemetry=telemetry, capture=capture)
+    if returncode:
+        sys.exit(returncode)
+
+
+def _HashStatus(status_file):
+    """Return the SHA-256 digest of the status file `status_file`
+
+    The digest is computed on a canonical form of the decoded status
+    (sorted keys, no whitespace) so that it does not depend on the
+    format of the file (see tools.status). The status is decoded in
+    memory, only its canonical form is streamed to the hash function.
+    When `status_file` is a packed run, its status is hashed.
+
+    """
+    status = decode_status(*read_status(status_file))
+
+    digest = hashlib.sha256()
+    encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+    for chunk in encoder.iterencode(status):
+        digest.update(chunk.encode('utf8'))
+    return digest.hexdigest()
 
 
-def FindDuplicates(directory):
+def FindDuplicates(directory, njobs=1, index_file=None):
     """Find any duplicated scenes in `directory`
 
     Having two identical scenes is very unlikely but was a problem
     while coding the '--njobs' option...
 
-    Load and compare all 'params.json' files found in
-    `directory`. Print duplicate on stdout.
+    Hash all the status files (or the status of the 'run.pack'
+    files) found in `directory` and group the scenes having the same
+    digests. The runs of a test scene (in the '1' to '4'
+    subdirectories) are compared as a whole, so that two identical
+    runs of a same scene are not reported. The files are hashed in
+    parallel over `njobs` processes. Print duplicate on stdout and
+    return the list of duplicates, each one being a sorted list of
+    scene directories.
+
+    If `index_file` is not None, the digests are cached in that file
+    (in JSON lines format) along with the size and modification time
+    of the hashed files, so that only the new or modified files are
+    hashed on the next call. The index is rewritten with the current
+    files only, so that it does not keep the entries of the modified
+    or removed files.
 
     """
-    # load all 'params.json' files in a dict: file -> content
-    params = []
-    for root, dirs, files in os.walk("./data"):
-        for file in files:
-            if file.endswith("params.json"):
-                params.append(os.path.join(root, file))
-    params = {p: json.load(open(p, 'r')) for p in params}
-
-    # ensure each file have a different content (can't use
-    # collections.Counter because dicts are unhashable)
-    duplicate = []
-    for i, (n1, p1) in enumerate(params.items()):
-        for n2, p2 in params.items()[i+1:]:
-            if p1 == p2:
-                duplicate.append((n1, n2))
+    # list all the status and 'run.pack' files: relative path ->
+    # (size, mtime)
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        for name in (*sorted(set(STATUS_FILENAMES.values())), PACK_FILENAME):
+            if name in names:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files[os.path.relpath(path, directory)] = [
+                    stat.st_size, stat.st_mtime]
+
+    # load the digests of the files not modified since the last call
+    digests = {}
+    nentries = 0
+    if index_file and os.path.isfile(index_file):
+        for line in open(index_file, 'r'):
+            entry = json.loads(line)
+            nentries += 1
+            if files.get(entry['path']) == entry['stat']:
+                digests[entry['path']] = entry['digest']
+    is_stale = nentries != len(digests)
+
+    # hash the new files
+    new_files = sorted(f for f in files if f not in digests)
+    paths = [os.path.join(directory, f) for f in new_files]
+    if njobs > 1 and len(paths) > njobs:
+        with ProcessPoolExecutor(max_workers=njobs) as executor:
+            new_digests = list(executor.map(
+                _HashStatus, paths,
+                chunksize=max(1, min(256, len(paths) // (4 * njobs)))))
+    else:
+        new_digests = [_HashStatus(p) for p in paths]
+    digests.update(zip(new_files, new_digests))
+
+    # rewrite the index in a temporary file moved over the old one, so
+    # that an interrupted write does not corrupt it
+    if index_file and (new_files or is_stale):
+        with open(index_file + '.tmp', 'w') as index:
+            for path in sorted(digests):
+                index.write(json.dumps(
+                    {'path': path, 'stat': files[path],
+                     'digest': digests[path]}) + '\n')
+        os.replace(index_file + '.tmp', index_file)
+
+    # the digests of the runs of each scene, ordered by run: scene
+    # directory -> [digest]
+    runs = {}
+    for path in sorted(digests):
+        scene = os.path.dirname(path).split(os.sep)[0]
+        runs.setdefault(scene, []).append(digests[path])
+
+    # index the scenes by digests: digests -> scene directories
+    scenes = {}
+    for scene, scene_digests in runs.items():
+        scenes.setdefault(tuple(scene_digests), []).append(
+            os.path.join(directory, scene))
+    duplicate = sorted(sorted(s) for s in scenes.values() if len(s) > 1)
 
     if len(duplicate):
-        print('WARNING: Found {} duplicated scenes.'.format(len(duplicate)))
+        print('WARNING: Found {} duplicated scenes.'.format(
+            sum(len(d) - 1 for d in duplicate)))
         print('The following scenes are the same:')
-        for (n1, n2) in sorted(duplicate):
-            print('{}  ==  {}'.format(
-                os.path.dirname(n1), os.path.dirname(n2)))
+        for scenes in duplicate:
+            print('  ==  '.join(scenes))
 
+    return duplicate
 
-def Main():
-    # parse command-line arguments
-    args = ParseArgs()
 
-    if args.output_dir:
-        output_dir = os.path.abspath(args.output_dir)
-        if os.path.exists(output_dir):
-            if args.force:
-                shutil.rmtree(output_dir)
-            else:
-                raise IOError(
-                    'Existing output directory {}\n'
-                    'Use the --force option to overwrite it'
-                    .format(output_dir))
-        os.makedirs(output_dir)
-    else:
-        # saving disabled, run in dry mode
-        output_dir = None
+def _SaveGeneration(output_dir, scenes, seed=None):
+    """Save the scenes and seed of a new generation in `output_dir`
+
+    Those are needed to resume the generation later on. If `seed` is
+    None, a seed is drawn from the current time. Return the seed.
+
+    """
+    seed = int(round(time.time() * 1000)) if seed is None else seed
+
+    open(os.path.join(output_dir, 'generation.json'), 'w').write(
+        json.dumps({'seed': seed, 'scenes': scenes}, indent=4))
+
+    return seed
+
+
+def _ResumeGeneration(output_dir, scenes, seed=None):
+    """Return the seed of the generation to resume in `output_dir`
+
+    Raise IOError if the generation in `output_dir` cannot be resumed
+    with the given `scenes` and `seed`.
 
-    # check the scenes_file is a correct JSON file
+    """
+    try:
+        generation = json.load(
+            open(os.path.join(output_dir, 'generation.json'), 'r'))
+    except FileNotFoundError:
+        raise IOError(
+            'Cannot resume {}: generation.json not found'.format(output_dir))
+
+    if scenes != generation['scenes']:
+        raise IOError(
+            'Cannot resume {}: the scenes differ from the original ones'
+            .format(output_dir))
+
+    if seed is not None and seed != generation['seed']:
+        raise IOError(
+            'Cannot resume {}: the seed differs from the original one ({})'
+            .format(output_dir, generation['seed']))
+
+    return generation['seed']
+
+
+def _LoadScenes(scenes_file):
+    """Return the scenes loaded from `scenes_file`
+
+    Raise IOError if `scenes_file` is not a valid scenes configuration.
+
+    """
     try:
-        json.load(open(args.scenes_file, 'r'))
+        scenes = json.load(open(scenes_file, 'r'))
     except ValueError:
         raise IOError(
               'The scene configuration is not a valid JSON file: {}'
-              .format(args.scenes_file))
+              .format(scenes_file))
+
+    try:
+        expand_scenes(scenes)
+    except ValueError as err:
+        raise IOError(
+            'The scene configuration is not valid: {}: {}'
+            .format(scenes_file, err))
+
+    return scenes
+
+
+def _Pixels(resolution):
+    """Return the number of pixels in a '<width>x<height>' resolution"""
+    width, height = resolution.split('x')
+    return int(width) * int(height)
+
+
+def _HumanBytes(nbytes):
+    """Return a human readable size, e.g. '1.2 GB' for 1.2e9 bytes"""
+    for unit in ('B', 'kB', 'MB', 'GB', 'TB'):
+        if nbytes < 1000 or unit == 'TB':
+            return '{:.1f} {}'.format(nbytes, unit)
+        nbytes /= 1000
+
+
+def _ReadHistory(directories):
+    """Return the rendering speed and disk usage of previous generations
+
+    Each directory in `directories` is the output of a previous
+    generation, with its telemetry files (telemetry*.jsonl) and
+    generated scenes. Return a dict resolution -> {'frames',
+    'seconds', 'saved', 'bytes'} with the number of frames rendered,
+    the rendering time (cumulated over the jobs), the number of frames
+    saved and the bytes written on disk.
+
+    """
+    history = {}
+    for directory in directories:
+        if not os.path.isdir(directory):
+            raise IOError('No such directory: {}'.format(directory))
+
+        # read the rendering speed from the telemetry files, a file
+        # can contain several sessions (e.g. resumed generations)
+        resolution = None
+        for name in sorted(os.listdir(directory)):
+            if not re.match(r'^telemetry.*\.jsonl$', name):
+                continue
+
+            current = None
+            for line in open(os.path.join(directory, name), 'r'):
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # interrupted while writing the event
+                    continue
+
+                if event['event'] == 'start' and 'resolution' in event:
+                    resolution = event['resolution']
+                    current = history.setdefault(resolution, {
+                        'frames': 0, 'seconds': 0, 'saved': 0, 'bytes': 0})
+                elif current is not None:
+                    current['seconds'] += event['t'] - t_last
+                    if event['event'] == 'run_end':
+                        current['frames'] += event['nframes']
+                t_last = event['t']
+
+        if resolution is None:
+            print('WARNING: no telemetry found in {}, ignoring it'
+                  .format(directory))
+            continue
+
+        # read the disk usage from the generated scenes
+        for name in os.listdir(directory):
+            if not re.match('^[0-9]+_.+$', name):
+                continue
+            for root, dirs, files in os.walk(os.path.join(directory, name)):
+                history[resolution]['bytes'] += sum(
+                    os.path.getsize(os.path.join(root, f)) for f in files)
+                if os.path.basename(root) == STREAMS[0]:
+                    history[resolution]['saved'] += len(files)
+                elif PACK_FILENAME in files:
+                    history[resolution]['saved'] += RunFile(
+                        root).streams.get(STREAMS[0], 0)
+
+    return history
+
+
+def Plan(argv):
+    """Validate a scenes file and estimate the cost of its generation"""
+    args = ParsePlanArgs(argv)
+    scenes = expand_scenes(_LoadScenes(args.scenes_file))
+
+    if args.list:
+        for index, scene in enumerate(scenes):
+            description = '{} {}'.format(
+                scene['scenario'], 'train' if scene['is_train'] else (
+                    'test {} {}'.format(
+                        'occluded' if scene['is_occluded'] else 'visible',
+                        'static' if scene['is_static']
+                        else 'dynamic_{}'.format(scene['ntricks']))))
+            print('{}: {}, {} runs ({} checks)'.format(
+                get_scene_subdir(index, len(scenes), scene), description,
+                get_nruns(scene), get_nchecks(scene)))
+
+    # the check runs are rendered but not saved
+    nruns = sum(get_nruns(s) for s in scenes)
+    nchecks = sum(get_nchecks(s) for s in scenes)
+    ntrain = len([s for s in scenes if s['is_train']])
+    print('scenes: {} ({} train, {} test)'.format(
+        len(scenes), ntrain, len(scenes) - ntrain))
+    print('runs: {} ({} saved, {} checks)'.format(
+        nruns, nruns - nchecks, nchecks))
+    print('frames: {} rendered, {} saved'.format(
+        nruns * NIMAGES, (nruns - nchecks) * NIMAGES))
+
+    history = _ReadHistory(args.history)
+    pixels = _Pixels(args.resolution)
+    measured = history.get(args.resolution, {})
+
+    # disk usage per saved frame, if not measured at that resolution
+    # scale the usage per pixel measured at other resolutions, else
+    # take the size of uncompressed RGBA images as an upper bound
+    if measured.get('saved'):
+        frame_bytes = measured['bytes'] / measured['saved']
+        source = 'measured at {}'.format(args.resolution)
+    elif any(h['saved'] for h in history.values()):
+        frame_bytes = pixels * sum(h['bytes'] for h in history.values()) / (
+            sum(h['saved'] * _Pixels(r) for r, h in history.items()))
+        source = 'scaled from {}'.format(', '.join(
+            r for r, h in history.items() if h['saved']))
+    else:
+        frame_bytes = pixels * 4 * len(STREAMS)
+        source = 'upper bound, no history'
+    print('disk: {} at {} ({})'.format(
+        _HumanBytes((nruns - nchecks) * NIMAGES * frame_bytes),
+        args.resolution, source))
+
+    # rendering speed of a single job, the jobs are assumed to run
+    # at the same speed in parallel
+    if measured.get('seconds'):
+        speed = measured['frames'] / measured['seconds']
+        source = 'measured at {}'.format(args.resolution)
+    elif any(h['seconds'] for h in history.values()):
+        speed = sum(h['frames'] * _Pixels(r) for r, h in history.items()) / (
+            pixels * sum(h['seconds'] for h in history.values()))
+        source = 'scaled from {}'.format(', '.join(
+            r for r, h in history.items() if h['seconds']))
+    else:
+        print('wall time: unknown, use the --history option')
+        return
+
+    njobs = min(args.njobs, len(scenes)) or 1
+    print('wall time: {} with {} jobs at {:.1f} frames/s per job ({})'
+          .format(datetime.timedelta(seconds=int(
+              nruns * NIMAGES / speed / njobs)), njobs, speed, source))
+
+
+def _PrepareOutputDir(output_dir, scenes, seed=None, force=False,
+                      resume=False):
+    """Create or resume the generation of `scenes` in `output_dir`
+
+    Return the tuple (output_dir, seed, resume), `output_dir` being
+    an absolute path or None in dry mode and `resume` being True if
+    `output_dir` exists and is resumed.
+
+    """
+    if not output_dir:
+        # saving disabled, run in dry mode
+        return None, seed, False
+
+    output_dir = os.path.abspath(output_dir)
+    is_resumed = False
+    if os.path.exists(output_dir):
+        if force:
+            shutil.rmtree(output_dir)
+        elif resume:
+            is_resumed = True
+        else:
+            raise IOError(
+                'Existing output directory {}\n'
+                'Use the --force option to overwrite it or the '
+                '--resume option to complete it'
+                .format(output_dir))
+
+    if is_resumed:
+        seed = _ResumeGeneration(output_dir, scenes, seed)
+    else:
+        os.makedirs(output_dir)
+        seed = _SaveGeneration(output_dir, scenes, seed)
+
+    return output_dir, seed, is_resumed
+
+
+def Submit(argv):
+    """Submit a batch of scenes to a game running in daemon mode"""
+    args = ParseSubmitArgs(argv)
+
+    if args.stop:
+        message = {'command': 'stop'}
+    else:
+        scenes = _LoadScenes(args.scenes_file)
+        output_dir, seed, resume = _PrepareOutputDir(
+            args.output_dir, scenes, seed=args.seed,
+            force=args.force, resume=args.resume)
+
+        message = {'scenes': scenes, 'output_dir': output_dir,
+                   'resume': resume}
+        if seed is not None:
+            message['seed'] = seed
+
+    try:
+        answer = submit(args.socket, message)
+    except (OSError, ValueError) as err:
+        raise IOError('Cannot submit to {}: {}'.format(args.socket, err))
+
+    if answer.get('status') != 'accepted':
+        raise IOError('Submission rejected: {}'.format(
+            answer.get('error', 'unknown error')))
+
+    print('{} submitted to {}'.format(
+        'stop command' if args.stop else args.scenes_file, args.socket))
+
+
+def ParseExportArgs(argv):
+    """Defines the argument parser of the export command
+
+    Returns the arguments parsed from `argv`
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='intphys.py export',
+        description='''Convert the runs of a dataset generated with the
+        "pack" format to PNG images and status.json files''')
+
+    parser.add_argument(
+        'data_dir', metavar='<data-dir>',
+        help='the dataset to convert, as generated by intphys.py')
+
+    parser.add_argument(
+        'output_dir', metavar='<output-dir>',
+        help='''directory where to write the converted dataset, must be
+        non-existing''')
+
+    parser.add_argument(
+        '-j', '--njobs', type=int, default=1, metavar='<int>',
+        help='''number of runs to convert in parallel, default is
+        %(default)s''')
+
+    args = parser.parse_args(argv)
+    if args.njobs < 1:
+        parser.error('njobs must be a strictly positive integer')
+
+    return args
+
+
+def _ExportRun(pack_file, output_dir):
+    RunFile(pack_file).export_png(output_dir)
+
+
+def Export(argv):
+    """Convert a dataset in the "pack" format to PNG images"""
+    args = ParseExportArgs(argv)
+
+    if not os.path.isdir(args.data_dir):
+        raise IOError('No such directory: {}'.format(args.data_dir))
+    if os.path.exists(args.output_dir):
+        raise IOError('Existing output directory: {}'.format(args.output_dir))
+
+    # the runs to convert, written at the same place in output_dir
+    runs = []
+    for root, dirs, names in os.walk(args.data_dir):
+        if PACK_FILENAME in names:
+            runs.append((
+                os.path.join(root, PACK_FILENAME),
+                os.path.join(args.output_dir, os.path.relpath(
+                    root, args.data_dir))))
+    if not runs:
+        raise IOError('No packed run found in {}'.format(args.data_dir))
+
+    print('exporting {} runs to {}'.format(len(runs), args.output_dir))
+    with ProcessPoolExecutor(max_workers=args.njobs) as executor:
+        list(executor.map(_ExportRun, *zip(*runs)))
+
+
+def Main():
+    # the submit command sends scenes to a game in daemon mode, the
+    # plan command estimates the cost of a generation and the export
+    # command converts packed runs to PNG images
+    if len(sys.argv) > 1 and sys.argv[1] == 'submit':
+        Submit(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'plan':
+        Plan(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        Export(sys.argv[2:])
+        return
+
+    # parse command-line arguments
+    args = ParseArgs()
+
+    if args.scenes_file is None:
+        # daemon mode without initial scenes, the output directory is
+        # given for each submitted batch
+        if args.output_dir:
+            raise IOError(
+                'The --output-dir option requires a <json-file>, submit '
+                'it to the daemon with "intphys.py submit"')
+        output_dir, seed, resume = None, args.seed, False
+    else:
+        # check the scenes_file is a correct JSON file
+        scenes = _LoadScenes(args.scenes_file)
+        output_dir, seed, resume = _PrepareOutputDir(
+            args.output_dir, scenes, seed=args.seed,
+            force=args.force, resume=args.resume)
+
+    # the game reports its progress in telemetry files, kept in the
+    # output directory as history for the plan command (in a temporary
+    # directory in dry mode) unless specified
+    tmp_dir = tempfile.TemporaryDirectory()
+    telemetry = args.telemetry or os.path.join(
+        output_dir or tmp_dir.name, 'telemetry.jsonl')
 
     # run the simulation either in the editor or as a standalone
     # program
     if args.editor:
         RunEditor(
             output_dir, args.scenes_file,
-            seed=args.seed, resolution=args.resolution,
-            verbose=args.verbose)
+            seed=seed, resolution=args.resolution,
+            verbose=args.verbose, resume=resume, daemon=args.daemon,
+            raw_log=args.raw_log, telemetry=telemetry, capture=args.capture)
     elif args.standalone_game:
         RunEditor(
             output_dir, args.scenes_file,
-            seed=args.seed, resolution=args.resolution,
-            verbose=args.verbose, standalone_game=True)
+            seed=seed, resolution=args.resolution,
+            verbose=args.verbose, standalone_game=True, resume=resume,
+            daemon=args.daemon, raw_log=args.raw_log, telemetry=telemetry,
+            capture=args.capture)
     else:
         RunBinary(
-            output_dir, args.scenes_file, njobs=1,  # args.njobs,
-            seed=args.seed, resolution=args.resolution,
-            verbose=args.verbose)
+            output_dir, args.scenes_file, njobs=args.njobs,
+            seed=seed, resolution=args.resolution,
+            verbose=args.verbose, queue=args.queue, resume=resume,
+            daemon=args.daemon, raw_log=args.raw_log, telemetry=telemetry,
+            progress=args.progress, max_cpu=args.max_cpu,
+            max_memory=None if args.max_memory is None
+            else args.max_memory * 1e9, capture=args.capture)
+    tmp_dir.cleanup()
 
     if output_dir:
-        # check for duplicated scenes and warn if founded
-        FindDuplicates(output_dir)
+        # check for duplicated scenes and warn if founded, the digests
+        # are kept so that checking a resumed generation is faster
+        FindDuplicates(
+            output_dir, njobs=args.njobs,
+            index_file=os.path.join(output_dir, 'status_index.jsonl'))
 
 
 if __name__ == '__main__':
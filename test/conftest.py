@@ -0,0 +1,88 @@
+"""Shared fixtures of the intphys tests
+
+The tests cover the parts of intphys which do not depend on the Unreal
+Engine: the intphys.py wrapper and the Content/Scripts/tools modules
+shared with it. The game itself is replaced by stub binaries.
+
+"""
+
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+
+INTPHYS_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(INTPHYS_ROOT, 'Content', 'Scripts')
+
+sys.path.insert(0, INTPHYS_ROOT)
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture
+def scenes_file(tmp_path):
+    """A scenes file with 5 train and 4 test scenes"""
+    filename = tmp_path / 'scenes.json'
+    filename.write_text(
+        '{"scenario_O1": {"train": 5, '
+        '"test_visible": {"static": 2}, '
+        '"test_occluded": {"static": 1, "dynamic_1": 1}}}')
+    return str(filename)
+
+
+@pytest.fixture
+def stub_binary(tmp_path):
+    """A stub of the game writing dummy runs for its scenes
+
+    The stub renders the scenes of INTPHYS_SCENES listed in
+    INTPHYS_SUBSET (or all of them) into INTPHYS_OUTPUTDIR, as the
+    game does: each run has 2 dummy PNG images per stream and a
+    status.json holding the scene's global index and the seed. It
+    exits with an error if its subset file is in the directory named
+    by STUB_FAIL.
+
+    """
+    filename = tmp_path / 'intphys-stub'
+    filename.write_text(f'#!{sys.executable}\n' + textwrap.dedent(f'''\
+        import json, os, sys
+        sys.path.insert(0, {SCRIPTS_DIR!r})
+        from tools.dataset import STREAMS, get_scene_subdir
+        from tools.scenes_json import load_scenes_json
+
+        scenes = load_scenes_json(os.environ['INTPHYS_SCENES'])
+        subset = os.environ.get('INTPHYS_SUBSET')
+        indices = (
+            json.load(open(subset)) if subset else range(len(scenes)))
+
+        fail = os.environ.get('STUB_FAIL')
+        if fail and subset and os.path.dirname(subset).endswith(fail):
+            print('LogPython: Error: stub failure', flush=True)
+            sys.exit(3)
+
+        output_dir = os.environ.get('INTPHYS_OUTPUTDIR')
+        for index in indices:
+            scene = scenes[index]
+            print(f'LogPython: running scene {{index+1}}', flush=True)
+            if not output_dir:
+                continue
+            scene_dir = os.path.join(
+                output_dir, get_scene_subdir(index, len(scenes), scene))
+            runs = [''] if scene['is_train'] else ['1', '2', '3', '4']
+            for run in runs:
+                run_dir = os.path.join(scene_dir, run)
+                for stream in STREAMS:
+                    os.makedirs(os.path.join(run_dir, stream))
+                    for frame in (1, 2):
+                        open(os.path.join(
+                            run_dir, stream, f'{{stream}}_{{frame}}.png'),
+                            'wb').write(b'\\x89PNG')
+                json.dump(
+                    {{'header': {{'index': index, 'run': run,
+                                 'seed': os.environ.get('INTPHYS_SEED')}},
+                     'frames': []}},
+                    open(os.path.join(run_dir, 'status.json'), 'w'))
+        '''))
+    filename.chmod(filename.stat().st_mode | stat.S_IEXEC)
+    return str(filename)
@@ -0,0 +1,179 @@
+"""Test the admission and throttling of parallel jobs by JobGovernor"""
+
+import logging
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+import intphys
+
+
+GB = 1e9
+
+LOG = logging.getLogger('test')
+
+
+class FakeProc:
+    """Replace the processes read from /proc by a governor
+
+    `processes` is the dict pid -> (ppid, rss, ticks) returned by
+    JobGovernor._ReadProcesses, the priorities set by the governor
+    are recorded in `priorities` as pid -> priority.
+
+    """
+    def __init__(self, monkeypatch, processes=None):
+        self.processes = processes or {}
+        self.priorities = {}
+        monkeypatch.setattr(
+            intphys.JobGovernor, '_ReadProcesses',
+            staticmethod(lambda: dict(self.processes)))
+        monkeypatch.setattr(
+            intphys.JobGovernor, '_SetPriority',
+            staticmethod(self.priorities.__setitem__))
+
+
+def _admit_in_background(governor):
+    """Call governor.Admit in a thread, return an event set once admitted"""
+    admitted = threading.Event()
+
+    def admit():
+        governor.Admit(LOG)
+        admitted.set()
+
+    threading.Thread(target=admit, daemon=True).start()
+    return admitted
+
+
+def _wait_monitor(governor, condition, timeout=5):
+    """Wait until `condition` holds on the monitored jobs"""
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        with governor._condition:
+            if condition(governor._jobs):
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def test_admit_first_job(monkeypatch):
+    FakeProc(monkeypatch)
+    governor = intphys.JobGovernor(4 * GB, max_memory=1 * GB, max_cpu=0.5)
+
+    # the first job is admitted even if it does not fit in the budgets
+    assert _admit_in_background(governor).wait(1)
+
+
+def test_admit_memory(monkeypatch):
+    FakeProc(monkeypatch)
+    governor = intphys.JobGovernor(1 * GB, max_memory=2.5 * GB, interval=0.01)
+
+    governor.Admit(LOG)
+    governor.Register(100)
+    governor.Admit(LOG)
+    governor.Register(200)
+
+    # a third job would exceed the memory budget, it waits for a job
+    # to terminate
+    admitted = _admit_in_background(governor)
+    assert not admitted.wait(0.2)
+
+    governor.Release(100)
+    assert admitted.wait(1)
+
+
+def test_admit_cpu(monkeypatch):
+    FakeProc(monkeypatch)
+    governor = intphys.JobGovernor(1 * GB, max_cpu=2, interval=0.01)
+
+    governor.Admit(LOG)
+    governor.Register(100)
+    with governor._condition:
+        governor._jobs[100]['cpu'] = 1.5
+
+    # the running job and the starting one use 2.5 cores
+    admitted = _admit_in_background(governor)
+    assert not admitted.wait(0.2)
+
+    with governor._condition:
+        governor._jobs[100]['cpu'] = 0.5
+        governor._condition.notify_all()
+    assert admitted.wait(1)
+
+
+def test_monitor_memory(monkeypatch):
+    # job 100 has a subprocess 101, 200 is not a job
+    proc = FakeProc(monkeypatch, {
+        100: (1, 0.5 * GB, 0), 101: (100, 0.3 * GB, 0), 200: (1, 8 * GB, 0)})
+    governor = intphys.JobGovernor(1 * GB, max_memory=4 * GB, interval=0.01)
+    governor.Admit(LOG)
+    governor.Register(100)
+
+    governor.Start()
+    try:
+        assert _wait_monitor(
+            governor, lambda jobs: jobs[100]['rss'] == 0.8 * GB)
+
+        # the peak memory is kept when the job shrinks
+        proc.processes[100] = (1, 0.2 * GB, 0)
+        assert _wait_monitor(
+            governor, lambda jobs: jobs[100]['rss'] == 0.5 * GB)
+        assert governor._jobs[100]['peak'] == 0.8 * GB
+    finally:
+        governor.Stop()
+
+    # once terminated, the job's peak is the footprint of the next jobs
+    governor.Release(100)
+    assert governor.GetFootprint() == 0.8 * GB
+
+
+def test_throttle(monkeypatch):
+    proc = FakeProc(monkeypatch)
+    governor = intphys.JobGovernor(1 * GB, max_cpu=2)
+    for pid in (100, 200):
+        governor.Admit(LOG)
+        governor.Register(pid)
+
+    # over the budget, the most recent job is throttled first
+    governor._jobs[100]['cpu'] = 1.5
+    governor._jobs[200]['cpu'] = 1.5
+    governor._Throttle()
+    assert proc.priorities == {200: 19}
+
+    # still over the budget, the next one is throttled
+    governor._Throttle()
+    assert proc.priorities == {100: 19, 200: 19}
+
+    # back under 90% of the budget, the oldest job is restored first
+    governor._jobs[100]['cpu'] = 0.5
+    governor._jobs[200]['cpu'] = 0.5
+    governor._Throttle()
+    assert proc.priorities == {100: 0, 200: 19}
+
+
+@pytest.mark.skipif(
+    not os.path.isdir('/proc/self'), reason='requires the /proc filesystem')
+def test_measure_stub_memory(tmp_path):
+    # a stub of the game allocating 200 MB in a subprocess
+    stub = tmp_path / 'intphys-mem'
+    stub.write_text(
+        f'#!{sys.executable}\n'
+        'import subprocess, sys\n'
+        'subprocess.run([sys.executable, "-c", '
+        '"import time; data = bytearray(200 * 10**6); time.sleep(1)"])\n')
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+
+    governor = intphys.JobGovernor(0.1 * GB, max_memory=1 * GB, interval=0.1)
+    governor.Start()
+    try:
+        returncode = intphys._Run(
+            str(stub), LOG, None, None, governor=governor)
+    finally:
+        governor.Stop()
+
+    assert returncode == 0
+    assert governor.measured_footprint > 0.2 * GB
+    assert governor.GetFootprint() == governor.measured_footprint
@@ -0,0 +1,124 @@
+"""Test the parallel generation of intphys.py with a stub binary"""
+
+import json
+import os
+
+import pytest
+
+import intphys
+from tools.dataset import get_scene_subdir, is_complete_scene
+from tools.scenes_json import load_scenes_json
+
+
+def _expected_subdirs(scenes_file):
+    scenes = load_scenes_json(scenes_file)
+    return sorted(
+        get_scene_subdir(index, len(scenes), scene)
+        for index, scene in enumerate(scenes))
+
+
+@pytest.mark.parametrize('njobs', [1, 2, 3, 4, 20])
+def test_balance_scenes(scenes_file, njobs):
+    config = json.load(open(scenes_file))
+    subsets = intphys._BalanceScenes(config, njobs)
+    nscenes = len(load_scenes_json(scenes_file))
+
+    assert len(subsets) == min(njobs, nscenes)
+    assert all(subsets)
+    assert sorted(sum(subsets, [])) == list(range(nscenes))
+
+
+def test_merge_job(tmp_path):
+    data_dir = tmp_path / 'data'
+    for name in ('1_train_O1', '02_test_O1', 'generation.json', 'tmp'):
+        (data_dir / name).mkdir(parents=True)
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+
+    assert intphys._MergeJob(str(data_dir), str(output_dir)) == 2
+    assert sorted(os.listdir(output_dir)) == ['02_test_O1', '1_train_O1']
+    assert sorted(os.listdir(data_dir)) == ['generation.json', 'tmp']
+
+
+@pytest.mark.parametrize('njobs', [2, 3])
+def test_run_split(tmp_path, scenes_file, stub_binary, njobs):
+    output_dir = str(tmp_path / 'output')
+    os.makedirs(output_dir)
+
+    failed = intphys._RunSplit(
+        stub_binary, scenes_file, output_dir, njobs, seed=42, progress=0)
+    assert failed == []
+
+    # the scenes of all the jobs are merged with their global index
+    # and the jobs directory is removed
+    assert sorted(os.listdir(output_dir)) == _expected_subdirs(scenes_file)
+
+    scenes = load_scenes_json(scenes_file)
+    for index, scene in enumerate(scenes):
+        scene_dir = os.path.join(
+            output_dir, get_scene_subdir(index, len(scenes), scene))
+        assert is_complete_scene(scene_dir, scene, 2)
+
+        run_dir = scene_dir if scene['is_train'] else os.path.join(
+            scene_dir, '1')
+        header = json.load(
+            open(os.path.join(run_dir, 'status.json')))['header']
+        assert header == {
+            'index': index, 'run': '' if scene['is_train'] else '1',
+            'seed': '42'}
+
+
+def test_run_split_failed_job(tmp_path, scenes_file, stub_binary,
+                              monkeypatch):
+    output_dir = str(tmp_path / 'output')
+    os.makedirs(output_dir)
+    monkeypatch.setenv('STUB_FAIL', os.path.join('jobs', '2'))
+
+    failed = intphys._RunSplit(
+        stub_binary, scenes_file, output_dir, 3, seed=42, progress=0)
+    assert failed == [2]
+
+    # the failed job is kept for a restart, the other ones are merged
+    jobs_dir = os.path.join(output_dir, 'jobs')
+    assert os.listdir(jobs_dir) == ['2']
+    subset = json.load(open(os.path.join(jobs_dir, '2', 'subset.json')))
+    merged = sorted(d for d in os.listdir(output_dir) if d != 'jobs')
+    expected = _expected_subdirs(scenes_file)
+    assert len(merged) == len(expected) - len(subset)
+    assert set(merged) < set(expected)
+
+    # resuming restarts the failed job only, the output is then complete
+    monkeypatch.delenv('STUB_FAIL')
+    failed = intphys._RunSplit(
+        stub_binary, scenes_file, output_dir, 3, seed=42, progress=0,
+        resume=True)
+    assert failed == []
+    assert sorted(os.listdir(output_dir)) == expected
+
+
+def _write_status(run_dir, frames):
+    os.makedirs(run_dir)
+    with open(os.path.join(run_dir, 'status.json'), 'w') as fout:
+        json.dump({'header': {}, 'frames': frames}, fout)
+
+
+@pytest.mark.parametrize('njobs', [1, 2])
+def test_find_duplicates(tmp_path, njobs):
+    # the runs 1 and 2 (and 3 and 4) of a test scene can be the same
+    for scene in ('1_test_O1', '3_test_O1'):
+        for run, value in (('1', 0), ('2', 0), ('3', 1), ('4', 1)):
+            _write_status(
+                str(tmp_path / scene / run), [{'object_1': value}])
+    _write_status(str(tmp_path / '2_train_O1'), [{'object_1': 0}])
+    _write_status(str(tmp_path / '4_train_O1'), [{'object_1': 2}])
+    index_file = str(tmp_path / 'index.jsonl')
+
+    expected = [[str(tmp_path / '1_test_O1'), str(tmp_path / '3_test_O1')]]
+    assert intphys.FindDuplicates(
+        str(tmp_path), njobs=njobs, index_file=index_file) == expected
+
+    # the second call reads the digests from the index
+    os.remove(str(tmp_path / '3_test_O1' / '4' / 'status.json'))
+    assert intphys.FindDuplicates(
+        str(tmp_path), njobs=njobs, index_file=index_file) == []
+    assert len(open(index_file).readlines()) == 9
@@ -0,0 +1,81 @@
+"""Test the submission of scenes to a game running in daemon mode"""
+
+import contextlib
+import json
+import os
+import threading
+
+import pytest
+
+import intphys
+from tools.server import SceneServer, submit
+
+
+@contextlib.contextmanager
+def _polled_server(path):
+    """Yield the list of messages received by a server polled in background
+
+    The game polls the server at each tick, here a thread does it.
+
+    """
+    server = SceneServer(path)
+    messages = []
+    stop = threading.Event()
+
+    def poll():
+        while not stop.wait(0.01):
+            messages.extend(server.poll())
+
+    thread = threading.Thread(target=poll, daemon=True)
+    thread.start()
+    try:
+        yield messages
+    finally:
+        stop.set()
+        thread.join()
+        server.close()
+
+
+def test_submit_scenes(tmp_path, scenes_file, capsys):
+    path = str(tmp_path / 'intphys.sock')
+    output_dir = str(tmp_path / 'output')
+
+    with _polled_server(path) as messages:
+        intphys.Submit([path, scenes_file, '-o', output_dir, '-s', '3'])
+
+    assert 'submitted to' in capsys.readouterr().out
+    assert messages == [{
+        'scenes': json.load(open(scenes_file)),
+        'output_dir': output_dir,
+        'resume': False,
+        'seed': 3}]
+
+    # the output directory is prepared for a later --resume
+    generation = json.load(open(os.path.join(output_dir, 'generation.json')))
+    assert generation['seed'] == 3
+
+    # the socket file is removed once the server is closed
+    assert not os.path.exists(path)
+
+
+def test_submit_stop(tmp_path):
+    path = str(tmp_path / 'intphys.sock')
+    with _polled_server(path) as messages:
+        intphys.Submit([path, '--stop'])
+
+    assert messages == [{'command': 'stop'}]
+
+
+def test_submit_rejected(tmp_path):
+    path = str(tmp_path / 'intphys.sock')
+    with _polled_server(path) as messages:
+        answer = submit(path, {'foo': 'bar'}, timeout=5)
+
+    assert answer['status'] == 'rejected'
+    assert 'no scenes nor command' in answer['error']
+    assert messages == []
+
+
+def test_submit_unreachable(tmp_path):
+    with pytest.raises(IOError, match='Cannot submit'):
+        intphys.Submit([str(tmp_path / 'none.sock'), '--stop'])
@@ -0,0 +1,108 @@
+"""Test the encoding and decoding of the status of a run"""
+
+import os
+
+import pytest
+
+from tools import runfile
+from tools.status import (
+    STATUS_FORMATS, StatusWriter, decode_status, get_columns)
+
+
+HEADER = {'camera': {'location': {'x': 0, 'y': 0, 'z': 150}}}
+
+# the object_2 appears at the second frame
+FRAMES = [
+    {'object_1': {'location': {'x': 0.5, 'y': 1, 'z': 0},
+                  'mesh': 'Sphere', 'mass': 1.5}},
+    {'object_1': {'location': {'x': 1.5, 'y': 1, 'z': 0},
+                  'mesh': 'Sphere', 'mass': 1.5},
+     'object_2': {'location': {'x': -1, 'y': 2, 'z': 0},
+                  'mesh': 'Cube', 'mass': 2}},
+    {'object_1': {'location': {'x': 2.5, 'y': 1, 'z': 0},
+                  'mesh': 'Sphere', 'mass': 1.5},
+     'object_2': {'location': {'x': -2, 'y': 2, 'z': 0},
+                  'mesh': 'Cube', 'mass': 2}}]
+
+
+def _write(format, directory=None):
+    writer = StatusWriter(format, directory)
+    for frame in FRAMES:
+        writer.append(frame)
+    writer.header = HEADER
+    return writer
+
+
+@pytest.mark.parametrize('format', STATUS_FORMATS)
+def test_decode_status(tmp_path, format):
+    writer = _write(format, str(tmp_path))
+    assert writer.nframes == len(FRAMES)
+
+    filename = writer.write(str(tmp_path))
+    writer.close()
+    assert os.listdir(str(tmp_path)) == [writer.filename]
+
+    data = open(filename, 'rb').read()
+    assert decode_status(data, format == 'jsonl') == {
+        'header': HEADER, 'frames': FRAMES}
+
+
+@pytest.mark.parametrize('format', ['compact', 'jsonl'])
+def test_stream_frames(tmp_path, format):
+    # the frames are written as they are appended, in a partial file
+    # removed on close
+    writer = StatusWriter(format, str(tmp_path))
+    writer.append(FRAMES[0])
+    assert os.listdir(str(tmp_path)) == [writer.filename + '.part']
+
+    writer.close()
+    assert os.listdir(str(tmp_path)) == []
+
+    # without run directory, the frames go in a temporary file
+    writer = _write(format, str(tmp_path / 'missing'))
+    assert decode_status(writer.encode(), format == 'jsonl') == {
+        'header': HEADER, 'frames': FRAMES}
+    writer.close()
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.parametrize('format', STATUS_FORMATS)
+def test_finalize(tmp_path, format):
+    # a pack file without chunks as written by the game
+    part = str(tmp_path / runfile.PART_FILENAME)
+    with open(part, 'wb') as fout:
+        fout.write(runfile._HEADER.pack(runfile.MAGIC, runfile.VERSION, 0))
+        offset = fout.tell()
+        index = b'{"version": %d, "chunks": []}' % runfile.VERSION
+        fout.write(index)
+        fout.write(runfile._FOOTER.pack(offset, len(index), runfile.MAGIC))
+
+    writer = _write(format, str(tmp_path))
+    runfile.finalize(
+        str(tmp_path), writer.iterencode(),
+        'jsonl' if format == 'jsonl' else 'json')
+    writer.close()
+
+    data, lines = runfile.RunFile(
+        str(tmp_path / runfile.PACK_FILENAME)).read_status()
+    assert decode_status(data, lines) == {'header': HEADER, 'frames': FRAMES}
+
+
+@pytest.mark.parametrize('format', STATUS_FORMATS)
+def test_get_columns(format):
+    numpy = pytest.importorskip('numpy')
+
+    writer = _write(format)
+    header, columns = get_columns(writer.encode(), format == 'jsonl')
+    writer.close()
+
+    assert header == HEADER
+    assert sorted(columns) == ['object_1', 'object_2']
+    numpy.testing.assert_array_equal(
+        columns['object_1']['location.x'], [0.5, 1.5, 2.5])
+    numpy.testing.assert_array_equal(
+        columns['object_2']['location.x'], [numpy.nan, -1, -2])
+    numpy.testing.assert_array_equal(
+        columns['object_2']['mass'], [numpy.nan, 2, 2])
+    assert list(columns['object_1']['mesh']) == ['Sphere'] * 3
+    assert list(columns['object_2']['mesh']) == [None, 'Cube', 'Cube']